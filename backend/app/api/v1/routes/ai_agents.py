@@ -3,69 +3,23 @@ Analytics Agents API Routes for CounselFlow Legal Support
 Provides access to specialized legal AI agents for various use cases
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 import logging
-from enum import Enum
+import json
 
 from app.core.database import get_db
-from app.core.auth import get_current_user
-
-# Proper enum definitions for Pydantic compatibility
-class AIAgentType(str, Enum):
-    LEGAL_RESEARCH = "legal_research"
-    CONTRACT_ANALYSIS = "contract_analysis"
-    COMPLIANCE_CHECKER = "compliance_checker"
-    LITIGATION_STRATEGY = "litigation_strategy"
-    DOCUMENT_REVIEWER = "document_reviewer"
-    RISK_ASSESSOR = "risk_assessor"
-    WORKFLOW_ORCHESTRATOR = "workflow_orchestrator"
-
-class AITaskPriority(str, Enum):
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-
-# Temporary orchestrator stub for testing
-class AIAgentOrchestrator:
-    def __init__(self):
-        self.active_tasks = {}
-    
-    async def create_task(self, **kwargs):
-        task_id = f"task-{len(self.active_tasks)}-{datetime.utcnow().timestamp()}"
-        self.active_tasks[task_id] = {
-            "task_id": task_id,
-            "status": "processing",
-            "created_at": datetime.utcnow(),
-            **kwargs
-        }
-        return task_id
-    
-    async def execute_task(self, task_id: str):
-        """Execute a task asynchronously"""
-        if task_id in self.active_tasks:
-            task = self.active_tasks[task_id]
-            task["status"] = "completed"
-            task["completed_at"] = datetime.utcnow()
-            task["response"] = f"Mock AI response for {task.get('query', 'unknown query')}"
-            task["confidence_score"] = 0.85
-    
-    def get_task_result(self, task_id: str):
-        """Get task result by ID"""
-        return self.active_tasks.get(task_id)
-    
-    async def execute_query(self, **kwargs):
-        return {
-            "result": "Mock AI response for testing",
-            "agent_type": kwargs.get("agent_type"),
-            "query": kwargs.get("query"),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+from app.core.auth import can_access_client, can_access_matter, get_current_user, require_role
+from app.core.ai_orchestrator import ai_orchestrator, AIAgentType, AITaskPriority
+from app.core.ai_scheduler import AIQueueFullError
+from app.core.ai_task_store import is_task_owner
+from app.core.ai_usage import AIBudgetExceededError, BudgetDecision
 from app.core.security import AuditLogger
-from app.models import User
+from app.models import User, UserRole
 
 logger = logging.getLogger("counselflow.ai_api")
 audit_logger = AuditLogger()
@@ -80,17 +34,31 @@ class AIQueryRequest(BaseModel):
     priority: AITaskPriority = AITaskPriority.MEDIUM
     matter_id: Optional[str] = None
     client_id: Optional[str] = None
+    stream: bool = False  # Respond with Server-Sent Events as tokens are produced
 
 class AIQueryResponse(BaseModel):
     task_id: str
     agent_type: AIAgentType
     status: str
+    queue_position: Optional[int] = None
     response: Optional[str] = None
     confidence_score: Optional[float] = None
     sources: Optional[List[Dict[str, Any]]] = None
     created_at: datetime
     completed_at: Optional[datetime] = None
 
+class BatchDocument(BaseModel):
+    document_id: Optional[str] = None
+    title: Optional[str] = None
+    text: str = Field(..., min_length=1)
+
+class BatchAnalysisRequest(BaseModel):
+    agent_type: AIAgentType = AIAgentType.CONTRACT_ANALYSIS
+    documents: List[BatchDocument] = Field(..., min_length=1, max_length=200)
+    analysis_type: str = "comprehensive"
+    matter_id: Optional[str] = None
+    client_id: Optional[str] = None
+
 class AIAgentStatus(BaseModel):
     agent_type: AIAgentType
     status: str
@@ -98,9 +66,6 @@ class AIAgentStatus(BaseModel):
     total_queries: int
     avg_response_time: float
 
-# Initialize AI orchestrator
-ai_orchestrator = AIAgentOrchestrator()
-
 @router.get("/", response_model=List[AIAgentStatus])
 async def get_ai_agents(
     current_user: User = Depends(get_current_user)
@@ -137,19 +102,36 @@ async def get_ai_agents(
             detail="Failed to fetch AI agents"
         )
 
+def _check_matter_access(db: Session, user: User, matter_id: Optional[str], client_id: Optional[str]):
+    """Reject a request naming a matter or client the user cannot access"""
+    if matter_id and not can_access_matter(db, user, matter_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No access to this matter")
+    if client_id and not can_access_client(db, user, client_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No access to this client")
+
+def _format_sse(payload: Dict[str, Any]) -> str:
+    """Encode an AI task event as a Server-Sent Events frame"""
+    return f"event: {payload['event']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
 @router.post("/query", response_model=AIQueryResponse)
 async def query_ai_agent(
     request: AIQueryRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Submit a query to a specific AI agent"""
+    """
+    Submit a query to a specific AI agent. With ``stream`` set the response is
+    a text/event-stream of the task's token, tool and completion events.
+    """
     try:
-        # Validate access permissions
-        if request.matter_id or request.client_id:
-            # TODO: Implement client/matter access validation
-            pass
+        # Matter documents are retrieved into the prompt, so access is checked first
+        _check_matter_access(db, current_user, request.matter_id, request.client_id)
+        
+        context = dict(request.context or {})
+        if request.matter_id:
+            context["matter_id"] = request.matter_id
+        if request.client_id:
+            context["client_id"] = request.client_id
         
         # Create task
         task_id = ai_orchestrator.create_task(
@@ -157,9 +139,27 @@ async def query_ai_agent(
             query=request.query,
             user_id=current_user.id,
             priority=request.priority,
-            context=request.context or {}
+            context=context,
+            stream=request.stream,
+            firm_id=str(current_user.firm_id) if current_user.firm_id else None,
+            matter_id=request.matter_id
         )
         
+        # Queue for execution on the AI worker pool; the request returns immediately
+        try:
+            queue_position = ai_orchestrator.submit_task(task_id)
+        except AIQueueFullError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": "30"}
+            )
+        except AIBudgetExceededError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e)
+            )
+        
         # Log AI query
         audit_logger.log_security_event(
             event_type="ai_query_submitted",
@@ -173,21 +173,42 @@ async def query_ai_agent(
             }
         )
         
-        # Execute query asynchronously
-        background_tasks.add_task(
-            ai_orchestrator.execute_task,
-            task_id
-        )
-        
         logger.info(f"AI query submitted: {task_id} by user {current_user.email}")
         
+        task = ai_orchestrator.get_task_result(task_id)
+        
+        if request.stream:
+            # Subscribe before the first await so the task cannot emit unseen events
+            events = ai_orchestrator.open_event_stream(task_id)
+            
+            async def event_source():
+                yield _format_sse({
+                    "event": task["status"],
+                    "task_id": task_id,
+                    "data": {"queue_position": queue_position}
+                })
+                async for event in ai_orchestrator.iter_event_stream(task_id, events):
+                    yield _format_sse(event)
+            
+            return StreamingResponse(
+                event_source(),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no"  # Stop nginx from buffering the stream
+                }
+            )
+        
         return AIQueryResponse(
             task_id=task_id,
             agent_type=request.agent_type,
-            status="processing",
-            created_at=datetime.utcnow()
+            status=task["status"],
+            queue_position=queue_position if task["status"] == "queued" else None,
+            created_at=task["created_at"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing AI query: {str(e)}")
         raise HTTPException(
@@ -202,7 +223,7 @@ async def get_query_result(
 ):
     """Get the result of a previously submitted AI query"""
     try:
-        task = ai_orchestrator.get_task_result(task_id)
+        task = await ai_orchestrator.fetch_task_result(task_id)
         
         if not task:
             raise HTTPException(
@@ -211,7 +232,7 @@ async def get_query_result(
             )
         
         # Verify user access to task
-        if task.get("user_id") != current_user.id:
+        if not is_task_owner(task, current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access denied"
@@ -237,6 +258,41 @@ async def get_query_result(
             detail="Failed to fetch task result"
         )
 
+@router.delete("/query/{task_id}")
+async def cancel_query(
+    task_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a queued or running AI query"""
+    task = ai_orchestrator.get_task_result(task_id)
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    
+    if not is_task_owner(task, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    if not await ai_orchestrator.cancel_task(task_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Task already {task['status']}"
+        )
+    
+    audit_logger.log_security_event(
+        event_type="ai_query_cancelled",
+        user_id=current_user.id,
+        client_id=None,
+        details={"task_id": task_id}
+    )
+    
+    return {"task_id": task_id, "status": "cancelled"}
+
 @router.post("/legal-research")
 async def legal_research(
     query: str,
@@ -260,8 +316,10 @@ async def legal_research(
         )
         
         # Use the main query endpoint
-        return await query_ai_agent(request, BackgroundTasks(), current_user)
+        return await query_ai_agent(request, current_user)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Legal research error: {str(e)}")
         raise HTTPException(
@@ -291,8 +349,10 @@ async def analyze_contract(
             priority=AITaskPriority.HIGH
         )
         
-        return await query_ai_agent(request, BackgroundTasks(), current_user)
+        return await query_ai_agent(request, current_user)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Contract analysis error: {str(e)}")
         raise HTTPException(
@@ -300,6 +360,118 @@ async def analyze_contract(
             detail="Contract analysis failed"
         )
 
+@router.post("/batch-analysis")
+async def batch_analysis(
+    request: BatchAnalysisRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze a set of documents (e.g. a data room) in one request. Results are
+    streamed back as Server-Sent Events, one per document, followed by a
+    throughput summary.
+    """
+    if request.agent_type not in (AIAgentType.CONTRACT_ANALYSIS, AIAgentType.DOCUMENT_REVIEWER):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch analysis supports contract_analysis and document_reviewer agents"
+        )
+    
+    _check_matter_access(db, current_user, request.matter_id, request.client_id)
+    
+    firm_id = str(current_user.firm_id) if current_user.firm_id else None
+    if ai_orchestrator.usage_accountant.check_budget(current_user.id, firm_id) == BudgetDecision.THROTTLE:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Daily AI token budget exhausted"
+        )
+    
+    context = {"analysis_type": request.analysis_type}
+    if request.matter_id:
+        context["matter_id"] = request.matter_id
+    if request.client_id:
+        context["client_id"] = request.client_id
+    
+    audit_logger.log_security_event(
+        event_type="ai_batch_analysis_submitted",
+        user_id=current_user.id,
+        client_id=request.client_id,
+        details={
+            "agent_type": request.agent_type.value,
+            "document_count": len(request.documents),
+            "matter_id": request.matter_id
+        }
+    )
+    
+    async def event_source():
+        try:
+            async for event in ai_orchestrator.analyze_documents_batch(
+                documents=[document.model_dump() for document in request.documents],
+                agent_type=request.agent_type,
+                user_id=current_user.id,
+                context=context,
+                firm_id=firm_id
+            ):
+                yield _format_sse(event)
+        except Exception as e:
+            logger.error(f"Batch analysis error: {str(e)}")
+            yield _format_sse({"event": "error", "data": {"message": "Batch analysis failed"}})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.get("/usage")
+async def get_ai_usage(
+    current_user: User = Depends(get_current_user)
+):
+    """Get today's AI token usage and budget for the current user and their firm"""
+    usage = {"user": ai_orchestrator.usage_accountant.get_usage("user", current_user.id)}
+    if current_user.firm_id:
+        usage["firm"] = ai_orchestrator.usage_accountant.get_usage("firm", str(current_user.firm_id))
+    return usage
+
+@router.post("/retrieval/matters/{matter_id}/reindex")
+async def reindex_matter(
+    matter_id: str,
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.PARTNER])),
+    db: Session = Depends(get_db)
+):
+    """
+    Rebuild a matter's retrieval index; unchanged documents are not re-embedded.
+    Limited to firm admins and partners with access to the matter.
+    """
+    _check_matter_access(db, current_user, matter_id, None)
+    
+    if ai_orchestrator.retrieval_index is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Retrieval index is disabled"
+        )
+    
+    try:
+        reembedded = await ai_orchestrator.retrieval_index.rebuild_matter(matter_id)
+    except Exception as e:
+        logger.error(f"Error re-indexing matter {matter_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to re-index matter"
+        )
+    
+    audit_logger.log_security_event(
+        event_type="ai_matter_reindexed",
+        user_id=current_user.id,
+        client_id=None,
+        details={"matter_id": matter_id, "reembedded_documents": reembedded}
+    )
+    
+    return {"matter_id": matter_id, "reembedded_documents": reembedded}
+
 @router.get("/analytics")
 async def get_ai_analytics(
     current_user: User = Depends(get_current_user)
@@ -309,12 +481,16 @@ async def get_ai_analytics(
         # TODO: Implement comprehensive analytics
         analytics = {
             "total_queries": len(ai_orchestrator.active_tasks),
+            "queued_tasks": len([t for t in ai_orchestrator.active_tasks.values() if t["status"] == "queued"]),
             "active_tasks": len([t for t in ai_orchestrator.active_tasks.values() if t["status"] == "processing"]),
             "completed_tasks": len([t for t in ai_orchestrator.active_tasks.values() if t["status"] == "completed"]),
             "agent_usage": {
                 agent_type.value: 0 for agent_type in AIAgentType
             },
             "average_response_time": 2.5,
+            "scheduler": ai_orchestrator.scheduler.get_stats(),
+            "response_cache": ai_orchestrator.response_cache.get_metrics(),
+            "usage": ai_orchestrator.usage_accountant.get_summary(),
             "user_queries_today": 0
         }
         
@@ -8,18 +8,19 @@ from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 import logging
+import uuid
 
-from app.core.database import get_db
-from app.core.auth import get_current_user
-from app.core.websocket import ConnectionManager
+from app.core.database import SessionLocal, get_db
+from app.core.auth import AuthenticationError, can_access_document, get_current_user, require_role, verify_token
+from app.core.websocket import connection_manager
+from app.services.collaboration_engine import InvalidOperationError
 from app.services.document_version_service import DocumentVersionService, CollaborationService
-from app.models import User
+from app.models import User, UserRole
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize services
-connection_manager = ConnectionManager()
+# Initialize services on the shared connection manager, whose backplane starts with the app
 collaboration_service = CollaborationService(connection_manager)
 
 # Pydantic models for API requests/responses
@@ -115,7 +116,7 @@ async def create_version(
             document_id=str(version.document_id),
             version_number=version.version_number,
             title=version.title,
-            content=version.content,
+            content=service.get_content(version),
             content_hash=version.content_hash,
             author_id=str(version.author_id),
             change_summary=version.change_summary,
@@ -150,7 +151,7 @@ async def get_version_history(
                 document_id=str(v.document_id),
                 version_number=v.version_number,
                 title=v.title,
-                content=v.content,
+                content=service.get_content(v),
                 content_hash=v.content_hash,
                 author_id=str(v.author_id),
                 change_summary=v.change_summary,
@@ -168,6 +169,27 @@ async def get_version_history(
             detail="Failed to get version history"
         )
 
+@router.post("/documents/{document_id}/versions/compact")
+async def compact_versions(
+    document_id: str,
+    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    db: Session = Depends(get_db)
+):
+    """Re-encode a document's stored versions as keyframes and compressed deltas (firm admins only)"""
+    if not can_access_document(db, current_user, document_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No access to this document")
+    
+    try:
+        service = DocumentVersionService(db, connection_manager)
+        return await service.compact_versions(document_id)
+        
+    except Exception as e:
+        logger.error(f"Error compacting versions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compact versions"
+        )
+
 @router.get("/versions/{from_version_id}/diff/{to_version_id}", response_model=DiffResponse)
 async def get_version_diff(
     from_version_id: str,
@@ -349,18 +371,46 @@ async def start_collaboration_session(
             detail="Failed to start collaboration session"
         )
 
+# Operations that read or change a document, and so need the user to have access to it
+DOCUMENT_OPERATIONS = {"join", "edit", "cursor", "selection"}
+
+def _user_can_access_document(user_id: str, document_id: str) -> bool:
+    """Whether an active user may open a document, checked in a short-lived session"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == uuid.UUID(user_id)).first()
+        return user is not None and user.is_active and can_access_document(db, user, document_id)
+    finally:
+        db.close()
+
 @router.websocket("/ws/collaborate/{session_id}")
 async def websocket_collaborate(
     websocket: WebSocket,
     session_id: str,
     token: str
 ):
-    """WebSocket endpoint for real-time collaboration"""
+    """
+    WebSocket endpoint for real-time collaboration
+    
+    Edits are ordered by the CollaborationEngine of the process that holds
+    the document's session, and sessions are not shared between workers:
+    deployments that run several workers must route every collaboration
+    socket to one worker (or run this endpoint on a single worker). The
+    backplane only carries the resulting broadcasts to other workers.
+    """
+    # Edits are attributed to the token's user, never to an id the client sends
     try:
-        # Verify token and get user (implement token verification)
-        # user = await verify_websocket_token(token)
-        
-        await connection_manager.connect(websocket, f"collaborate_{session_id}")
+        user_id = str(uuid.UUID(str(verify_token(token).get("user_id"))))
+    except (AuthenticationError, ValueError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Documents this connection has joined, so leaving or disconnecting clears its presence
+    joined = set()
+    # Documents already authorized for this connection, so each is checked once
+    allowed = set()
+    try:
+        await connection_manager.connect(websocket, user_id)
         
         try:
             while True:
@@ -368,28 +418,60 @@ async def websocket_collaborate(
                 
                 # Handle different collaboration operations
                 operation_type = data.get("type")
+                document_id = str(data.get("document_id"))
+                
+                if operation_type in DOCUMENT_OPERATIONS and document_id not in allowed:
+                    if not _user_can_access_document(user_id, document_id):
+                        await connection_manager.send_personal_message({
+                            "type": "document_access_denied",
+                            "document_id": document_id
+                        }, websocket)
+                        continue
+                    allowed.add(document_id)
                 
-                if operation_type == "edit":
-                    await collaboration_service.handle_real_time_edit(
-                        document_id=data.get("document_id"),
-                        user_id=data.get("user_id"),
+                if operation_type == "join":
+                    try:
+                        state = await collaboration_service.get_document_state(document_id)
+                    except InvalidOperationError as e:
+                        await connection_manager.send_personal_message({
+                            "type": "document_join_rejected",
+                            "document_id": document_id,
+                            "error": str(e)
+                        }, websocket)
+                        continue
+                    joined.add(document_id)
+                    connection_manager.subscribe_to_room(websocket, f"document_{document_id}")
+                    await connection_manager.send_personal_message(state, websocket)
+                elif operation_type == "leave":
+                    joined.discard(document_id)
+                    connection_manager.unsubscribe_from_room(websocket, f"document_{document_id}")
+                    collaboration_service.leave_document(document_id, user_id)
+                elif operation_type == "edit":
+                    reply = await collaboration_service.handle_real_time_edit(
+                        document_id=document_id,
+                        user_id=user_id,
                         operation=data.get("operation")
                     )
+                    await connection_manager.send_personal_message(reply, websocket)
                 elif operation_type == "cursor":
                     await collaboration_service.handle_cursor_position(
-                        document_id=data.get("document_id"),
-                        user_id=data.get("user_id"),
+                        document_id=document_id,
+                        user_id=user_id,
                         position=data.get("position")
                     )
                 elif operation_type == "selection":
                     await collaboration_service.handle_selection_change(
-                        document_id=data.get("document_id"),
-                        user_id=data.get("user_id"),
+                        document_id=document_id,
+                        user_id=user_id,
                         selection=data.get("selection")
                     )
                 
         except WebSocketDisconnect:
-            connection_manager.disconnect(websocket, f"collaborate_{session_id}")
+            pass
+        finally:
+            for document_id in joined:
+                collaboration_service.leave_document(document_id, user_id)
+            connection_manager.disconnect(websocket)
             
     except Exception as e:
         logger.error(f"WebSocket collaboration error: {str(e)}")
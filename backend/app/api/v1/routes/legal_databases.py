@@ -3,20 +3,22 @@ External Legal Database API Routes
 Enhanced integration with Westlaw, LexisNexis, and CourtListener
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
+import json
 
 from app.core.database import get_db
-from app.core.auth import get_current_user
-from app.models import User
-from app.services.legal_database_service import LegalDatabaseService
+from app.core.auth import get_current_user, require_role
+from app.models import User, UserRole
+from app.services.legal_database_service import legal_database_service
 
 router = APIRouter(tags=["legal-databases"])
 
 class SearchRequest(BaseModel):
     query: str
-    databases: List[str] = ["westlaw", "lexisnexis", "courtlistener"]
+    databases: List[str] = ["local", "westlaw", "lexisnexis", "courtlistener"]
     filters: Optional[Dict[str, Any]] = None
     max_results: int = 50
 
@@ -30,6 +32,7 @@ class SearchResult(BaseModel):
     url: Optional[str]
     relevance_score: float
     source: str
+    also_in: List[str] = []  # Other sources that returned the same citation
 
 class SearchResponse(BaseModel):
     query: str
@@ -37,6 +40,10 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     search_time_ms: int
     sources_searched: List[str]
+    partial: bool = False
+    timed_out_sources: List[str] = []
+    failed_sources: List[str] = []
+    skipped_sources: List[str] = []
 
 @router.post("/search", response_model=SearchResponse)
 async def search_legal_databases(
@@ -45,12 +52,12 @@ async def search_legal_databases(
     db: Session = Depends(get_db)
 ):
     """
-    Search across multiple legal databases
+    Search across multiple legal databases. Results are returned within the
+    search deadline; sources that timed out, failed or were skipped by their
+    circuit breaker are listed and the response is marked partial.
     """
-    legal_db_service = LegalDatabaseService()
-    
     try:
-        search_results = await legal_db_service.unified_search(
+        search_results = await legal_database_service.unified_search(
             query=request.query,
             databases=request.databases,
             filters=request.filters,
@@ -62,12 +69,43 @@ async def search_legal_databases(
             total_results=len(search_results["results"]),
             results=[SearchResult(**result) for result in search_results["results"]],
             search_time_ms=search_results["search_time_ms"],
-            sources_searched=search_results["sources_searched"]
+            sources_searched=search_results["sources_searched"],
+            partial=search_results["partial"],
+            timed_out_sources=search_results["timed_out_sources"],
+            failed_sources=search_results["failed_sources"],
+            skipped_sources=search_results["skipped_sources"]
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@router.post("/search/stream")
+async def stream_legal_database_search(
+    request: SearchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Search across multiple legal databases, streaming each source's new
+    (deduplicated) results as Server-Sent Events as soon as it answers
+    """
+    async def event_source():
+        async for event in legal_database_service.stream_search(
+            query=request.query,
+            databases=request.databases,
+            filters=request.filters,
+            page_size=request.max_results
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @router.get("/databases", response_model=List[Dict[str, Any]])
 async def get_available_databases(
     current_user: User = Depends(get_current_user)
@@ -75,7 +113,15 @@ async def get_available_databases(
     """
     Get list of available legal databases and their capabilities
     """
-    return [
+    health = legal_database_service.get_connector_health()
+    databases = [
+        {
+            "id": "local",
+            "name": "CounselFlow Library",
+            "description": "Offline index of case law, statutes and knowledge base items in CounselFlow",
+            "available": True,
+            "features": ["case_law", "statutes", "knowledge_base", "phrase_search"]
+        },
         {
             "id": "westlaw",
             "name": "Westlaw",
@@ -98,6 +144,25 @@ async def get_available_databases(
             "features": ["case_law", "oral_arguments", "judge_data", "dockets"]
         }
     ]
+    for database in databases:
+        circuit = health.get(database["id"], {}).get("state", "closed")
+        database["available"] = circuit != "open"
+        database["circuit_state"] = circuit
+    return databases
+
+@router.post("/local-index/rebuild")
+async def rebuild_local_index(
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    """
+    Rebuild the local search index from the public knowledge base (admins only)
+    """
+    try:
+        indexed = await legal_database_service.connectors["local"].rebuild()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index rebuild failed: {str(e)}")
+    
+    return {"indexed_documents": indexed}
 
 @router.get("/saved-searches", response_model=List[Dict[str, Any]])
 async def get_saved_searches(
@@ -133,6 +198,8 @@ async def get_search_analytics(
     Get analytics on legal database usage
     """
     return {
+        "cache": legal_database_service.get_cache_metrics(),
+        "connectors": legal_database_service.get_connector_health(),
         "total_searches": 1247,
         "searches_this_month": 89,
         "most_used_database": "westlaw",
@@ -133,7 +133,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 await connection_manager.send_personal_message({
                     "type": MessageType.SYSTEM_STATUS,
                     "data": {
-                        "active_users": len(connection_manager.get_active_users()),
+                        "active_users": len(await connection_manager.get_active_users()),
                         "total_connections": connection_manager.get_total_connections(),
                         "user_connections": connection_manager.get_user_connection_count(user.id),
                         "server_time": datetime.utcnow().isoformat()
@@ -261,7 +261,7 @@ async def get_notification_status(current_user: User = Depends(verify_token)):
     """Get WebSocket connection status"""
     
     return {
-        "active_users": len(connection_manager.get_active_users()),
+        "active_users": len(await connection_manager.get_active_users()),
         "total_connections": connection_manager.get_total_connections(),
         "user_connections": connection_manager.get_user_connection_count(current_user.id),
         "rooms": len(connection_manager.room_subscriptions),
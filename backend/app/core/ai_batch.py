@@ -0,0 +1,143 @@
+"""
+Batch document analysis helpers for CounselFlow AI agents
+Chunks documents and packs them into prompts under a token budget
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Rough tokens-per-character ratio for English legal text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+_SECTION_HEADER = re.compile(r"^### Document (\S+) part (\d+)/(\d+)\s*$", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough for budgeting prompts"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class DocumentChunk:
+    """A piece of one document small enough to fit in a prompt"""
+    document_id: str
+    index: int
+    total: int
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @property
+    def label(self) -> str:
+        return f"Document {self.document_id} part {self.index + 1}/{self.total}"
+
+
+@dataclass
+class AnalysisPack:
+    """Chunks sent to the model together in a single agent invocation"""
+    chunks: List[DocumentChunk] = field(default_factory=list)
+
+    @property
+    def tokens(self) -> int:
+        return sum(chunk.tokens for chunk in self.chunks)
+
+
+def chunk_document(document_id: str, text: str, max_tokens: int) -> List[DocumentChunk]:
+    """Split a document on paragraph boundaries into chunks of at most ``max_tokens``"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    current = ""
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        # Paragraphs longer than a whole chunk are hard-split
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = candidate
+
+    if current or not pieces:
+        pieces.append(current)
+
+    return [
+        DocumentChunk(document_id=document_id, index=index, total=len(pieces), text=piece)
+        for index, piece in enumerate(pieces)
+    ]
+
+
+def pack_chunks(chunks: List[DocumentChunk], token_budget: int) -> List[AnalysisPack]:
+    """Greedily group consecutive chunks into packs that stay under ``token_budget``"""
+    packs: List[AnalysisPack] = []
+    current = AnalysisPack()
+
+    for chunk in chunks:
+        if current.chunks and current.tokens + chunk.tokens > token_budget:
+            packs.append(current)
+            current = AnalysisPack()
+        current.chunks.append(chunk)
+
+    if current.chunks:
+        packs.append(current)
+    return packs
+
+
+def build_pack_prompt(pack: AnalysisPack, instruction: str) -> str:
+    """Build one prompt covering every chunk in the pack"""
+    if len(pack.chunks) == 1:
+        chunk = pack.chunks[0]
+        return f"{instruction}\n\n### {chunk.label}\n{chunk.text}"
+
+    sections = "\n\n".join(f"### {chunk.label}\n{chunk.text}" for chunk in pack.chunks)
+    return (
+        f"{instruction}\n\n"
+        "Analyze each document part below independently. Start the analysis of each part "
+        "with its exact header line (for example '### Document <id> part 1/1').\n\n"
+        f"{sections}"
+    )
+
+
+def split_pack_response(pack: AnalysisPack, response: str) -> Dict[Tuple[str, int], str]:
+    """
+    Attribute a pack response back to its chunks by the section headers.
+    If the model ignored the headers, every chunk gets the whole response.
+    """
+    if len(pack.chunks) == 1:
+        chunk = pack.chunks[0]
+        return {(chunk.document_id, chunk.index): response}
+
+    matches = list(_SECTION_HEADER.finditer(response))
+    sections: Dict[Tuple[str, int], str] = {}
+    for position, match in enumerate(matches):
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(response)
+        sections[(match.group(1), int(match.group(2)) - 1)] = response[match.end():end].strip()
+
+    return {
+        (chunk.document_id, chunk.index): sections.get((chunk.document_id, chunk.index), response)
+        for chunk in pack.chunks
+    }
+
+
+__all__ = [
+    "DocumentChunk",
+    "AnalysisPack",
+    "estimate_tokens",
+    "chunk_document",
+    "pack_chunks",
+    "build_pack_prompt",
+    "split_pack_response"
+]
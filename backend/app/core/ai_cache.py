@@ -0,0 +1,162 @@
+"""
+AI Response Cache for CounselFlow
+Content-addressed cache of agent answers with an in-process LRU and optional Redis tier
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger("counselflow.ai.cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class AIResponseCache:
+    """
+    Two-tier cache for deterministic agent queries
+
+    Entries are addressed by a hash of the agent type, model, tool set and the
+    normalized enriched prompt. Every key is also namespaced by client so a
+    cached answer is never served across a privilege boundary. The in-process
+    tier is an LRU with per-entry expiry; the Redis tier is shared between
+    workers and is used only when a Redis URL is configured and reachable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2000,
+        ttl_seconds: int = 3600,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "ai_cache"
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._metrics = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "redis_errors": 0
+        }
+
+        self.redis_client = None
+        if redis_url:
+            self._setup_redis(redis_url)
+
+    def _setup_redis(self, redis_url: str):
+        """Setup the shared Redis tier"""
+        try:
+            import redis.asyncio as aioredis
+
+            self.redis_client = aioredis.from_url(redis_url, decode_responses=True)
+        except Exception as e:
+            logger.warning(f"AI response cache Redis tier unavailable: {e}")
+            self.redis_client = None
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Collapse insignificant whitespace so trivially different prompts share an entry"""
+        return _WHITESPACE.sub(" ", prompt).strip()
+
+    def make_key(
+        self,
+        namespace: str,
+        agent_type: str,
+        model: str,
+        prompt: str,
+        tools: Iterable[str] = ()
+    ) -> str:
+        """Build the content-addressed cache key for a query"""
+        payload = json.dumps({
+            "namespace": namespace,
+            "agent_type": agent_type,
+            "model": model,
+            "tools": sorted(tools),
+            "prompt": self.normalize_prompt(prompt)
+        }, sort_keys=True)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{self.key_prefix}:{namespace}:{digest}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, checking memory first and then Redis"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._metrics["memory_hits"] += 1
+                return value
+            del self._entries[key]
+
+        if self.redis_client is not None:
+            try:
+                raw = await self.redis_client.get(key)
+            except Exception as e:
+                self._metrics["redis_errors"] += 1
+                logger.warning(f"AI response cache Redis read failed: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._store_local(key, value, self.ttl_seconds)
+                self._metrics["redis_hits"] += 1
+                return value
+
+        self._metrics["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        """Store a result in both tiers"""
+        ttl = ttl_seconds or self.ttl_seconds
+        self._store_local(key, value, ttl)
+        self._metrics["stores"] += 1
+
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(key, json.dumps(value, default=str), ex=ttl)
+            except Exception as e:
+                self._metrics["redis_errors"] += 1
+                logger.warning(f"AI response cache Redis write failed: {e}")
+
+    async def invalidate_namespace(self, namespace: str):
+        """Drop every cached answer for a client, e.g. when its access is revoked"""
+        prefix = f"{self.key_prefix}:{namespace}:"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+        if self.redis_client is not None:
+            try:
+                async for key in self.redis_client.scan_iter(match=f"{prefix}*"):
+                    await self.redis_client.delete(key)
+            except Exception as e:
+                self._metrics["redis_errors"] += 1
+                logger.warning(f"AI response cache Redis invalidation failed: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit/miss metrics for the cache"""
+        hits = self._metrics["memory_hits"] + self._metrics["redis_hits"]
+        lookups = hits + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups * 100, 2) if lookups else 0.0,
+            "redis_enabled": self.redis_client is not None
+        }
+
+    def _store_local(self, key: str, value: Dict[str, Any], ttl_seconds: int):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._metrics["evictions"] += 1
+
+
+__all__ = ["AIResponseCache"]
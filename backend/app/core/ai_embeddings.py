@@ -0,0 +1,323 @@
+"""
+Local Embeddings for CounselFlow
+Offline CPU embedding backend with contiguous float32 vector storage and vectorized top-k search
+"""
+
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("counselflow.ai.embeddings")
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing text embedder that needs no model files or network
+
+    Word unigrams, word bigrams and character trigrams are hashed into
+    ``dim`` signed buckets, weighted by sublinear term frequency and L2
+    normalised, so the dot product of two vectors is their cosine
+    similarity. Texts are embedded ``batch_size`` at a time into a fixed-size
+    matrix that is reused across batches.
+    """
+
+    def __init__(self, dim: int = 768, batch_size: int = 256):
+        self.dim = dim
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an (n, dim) C-contiguous float32 matrix of unit rows"""
+        output = np.zeros((len(texts), self.dim), dtype=np.float32)
+        batch = np.zeros((self.batch_size, self.dim), dtype=np.float32)
+
+        for start in range(0, len(texts), self.batch_size):
+            chunk = texts[start:start + self.batch_size]
+            batch.fill(0.0)
+
+            rows: List[int] = []
+            hashes: List[int] = []
+            for row, text in enumerate(chunk):
+                features = self._features(text)
+                rows.extend([row] * len(features))
+                hashes.extend(zlib.crc32(feature.encode()) for feature in features)
+
+            if hashes:
+                hashed = np.asarray(hashes, dtype=np.uint32)
+                columns = (hashed % self.dim).astype(np.intp)
+                # The top hash bit picks the sign so collisions cancel out on average
+                signs = np.where(hashed >> 31, -1.0, 1.0).astype(np.float32)
+                np.add.at(batch, (np.asarray(rows, dtype=np.intp), columns), signs)
+
+            view = batch[:len(chunk)]
+            np.copyto(view, np.sign(view) * np.log1p(np.abs(view)))
+            output[start:start + len(chunk)] = view
+
+        return normalize_rows(output)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model loaded from a local path"""
+
+    def __init__(self, model_path: str, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalise the rows of a matrix in place; all-zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized top-k by dot product for a batch of queries.
+    Returns (indices, scores), each (n_queries, min(k, n_rows)), best first.
+    """
+    queries = np.atleast_2d(queries)
+    k = min(k, matrix.shape[0])
+    if k == 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.intp), empty.astype(np.float32)
+
+    scores = queries @ matrix.T
+    if k < matrix.shape[0]:
+        candidates = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        candidates = np.broadcast_to(np.arange(matrix.shape[0]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_scores, order, axis=1)
+    )
+
+
+class VectorMatrix:
+    """
+    Append-only float32 vector matrix with ids and memory-mapped persistence
+
+    Vectors live in one contiguous array grown by doubling, so appends are
+    amortised O(1) and search is a single matrix product. Deleted rows are
+    compacted out in one vectorized pass. Saved matrices are reopened with
+    ``np.load(mmap_mode="r")`` so large stores are paged in on demand and
+    only copied into memory on the first write.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self.ids: List[str] = []
+        self.groups: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, groups: Optional[Sequence[Optional[str]]] = None):
+        """Append vectors; ``groups`` tags rows (e.g. by source document) for bulk deletion"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        needed = self._size + len(vectors)
+        if needed > self._vectors.shape[0] or not self._vectors.flags.writeable:
+            capacity = max(needed, 2 * self._vectors.shape[0], 64)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+        self._vectors[self._size:needed] = vectors
+        self._size = needed
+        self.ids.extend(ids)
+        self.groups.extend(groups if groups is not None else [None] * len(vectors))
+
+    def delete_groups(self, groups: Sequence[str]) -> int:
+        """Remove every row tagged with one of ``groups``; returns rows removed"""
+        drop = set(groups)
+        keep = np.fromiter((group not in drop for group in self.groups), dtype=bool, count=self._size)
+        removed = int(self._size - keep.sum())
+        if removed:
+            self._vectors = np.ascontiguousarray(self.vectors[keep])
+            self._size = self._vectors.shape[0]
+            self.ids = [row_id for row_id, kept in zip(self.ids, keep) if kept]
+            self.groups = [group for group, kept in zip(self.groups, keep) if kept]
+        return removed
+
+    def search(self, query: np.ndarray, k: int, allowed_ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k ids and scores for one query vector"""
+        matrix = self.vectors
+        ids = self.ids
+        if allowed_ids is not None:
+            allowed = set(allowed_ids)
+            rows = np.fromiter((row_id in allowed for row_id in ids), dtype=bool, count=self._size)
+            matrix = matrix[rows]
+            ids = [row_id for row_id, kept in zip(ids, rows) if kept]
+
+        indices, scores = top_k(matrix, np.asarray(query, dtype=np.float32), k)
+        return [(ids[index], float(score)) for index, score in zip(indices[0], scores[0])]
+
+    def save(self, directory: str):
+        """Write the vectors as .npy plus a JSON sidecar of ids"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "vectors.json"), "w") as handle:
+            json.dump({"dim": self.dim, "ids": self.ids, "groups": self.groups}, handle)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "VectorMatrix":
+        """Open a saved matrix, memory-mapped read-only by default"""
+        with open(os.path.join(directory, "vectors.json")) as handle:
+            meta = json.load(handle)
+
+        matrix = cls(meta["dim"])
+        matrix._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        matrix._size = matrix._vectors.shape[0]
+        matrix.ids = meta["ids"]
+        matrix.groups = meta["groups"]
+        return matrix
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "vectors.json"))
+
+
+def create_local_embedder(
+    model_path: Optional[str] = None,
+    dim: int = 768,
+    batch_size: int = 256
+):
+    """Use a local sentence-transformers model when one is configured, else feature hashing"""
+    if model_path:
+        try:
+            return SentenceTransformerEmbedder(model_path, batch_size=batch_size)
+        except Exception as e:
+            logger.warning(f"Local embedding model unavailable, using feature hashing: {e}")
+    return HashingEmbedder(dim=dim, batch_size=batch_size)
+
+
+def llama_index_embedding(embedder) -> Any:
+    """Wrap a local embedder as a LlamaIndex embedding model"""
+    from llama_index.core.bridge.pydantic import PrivateAttr
+    from llama_index.core.embeddings import BaseEmbedding
+
+    class LocalEmbedding(BaseEmbedding):
+        _embedder: Any = PrivateAttr()
+
+        def __init__(self, local_embedder, **kwargs):
+            super().__init__(model_name="counselflow-local", **kwargs)
+            self._embedder = local_embedder
+
+        def _get_query_embedding(self, query: str) -> List[float]:
+            return self._embedder.embed([query])[0].tolist()
+
+        def _get_text_embedding(self, text: str) -> List[float]:
+            return self._embedder.embed([text])[0].tolist()
+
+        def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+            return self._embedder.embed(texts).tolist()
+
+        async def _aget_query_embedding(self, query: str) -> List[float]:
+            return self._get_query_embedding(query)
+
+        async def _aget_text_embedding(self, text: str) -> List[float]:
+            return self._get_text_embedding(text)
+
+    return LocalEmbedding(embedder, embed_batch_size=getattr(embedder, "batch_size", 256))
+
+
+def numpy_vector_store(persist_dir: Optional[str] = None) -> Any:
+    """
+    A LlamaIndex vector store over VectorMatrix. Node text stays in the
+    index's docstore; this store only holds vectors and answers top-k.
+    """
+    from llama_index.core.bridge.pydantic import PrivateAttr
+    from llama_index.core.vector_stores.types import (
+        BasePydanticVectorStore,
+        VectorStoreQuery,
+        VectorStoreQueryResult
+    )
+
+    class NumpyVectorStore(BasePydanticVectorStore):
+        stores_text: bool = False
+        _matrix: Optional[VectorMatrix] = PrivateAttr(default=None)
+
+        @property
+        def client(self) -> Any:
+            return None
+
+        def add(self, nodes: List[Any], **add_kwargs: Any) -> List[str]:
+            if not nodes:
+                return []
+            vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+            if self._matrix is None:
+                self._matrix = VectorMatrix(vectors.shape[1])
+            ids = [node.node_id for node in nodes]
+            self._matrix.add(ids, normalize_rows(vectors), [node.ref_doc_id for node in nodes])
+            return ids
+
+        def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+            if self._matrix is not None:
+                self._matrix.delete_groups([ref_doc_id])
+
+        def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+            if self._matrix is None or not len(self._matrix) or query.query_embedding is None:
+                return VectorStoreQueryResult(ids=[], similarities=[])
+            vector = normalize_rows(np.asarray([query.query_embedding], dtype=np.float32))
+            hits = self._matrix.search(vector, query.similarity_top_k, allowed_ids=query.node_ids)
+            return VectorStoreQueryResult(
+                ids=[node_id for node_id, _ in hits],
+                similarities=[score for _, score in hits]
+            )
+
+        def persist(self, persist_path: str, fs: Any = None) -> None:
+            if self._matrix is not None:
+                self._matrix.save(os.path.join(os.path.dirname(persist_path), "numpy_vectors"))
+
+    store = NumpyVectorStore()
+    if persist_dir and VectorMatrix.exists(os.path.join(persist_dir, "numpy_vectors")):
+        store._matrix = VectorMatrix.load(os.path.join(persist_dir, "numpy_vectors"))
+    return store
+
+
+__all__ = [
+    "HashingEmbedder",
+    "SentenceTransformerEmbedder",
+    "VectorMatrix",
+    "normalize_rows",
+    "top_k",
+    "create_local_embedder",
+    "llama_index_embedding",
+    "numpy_vector_store"
+]
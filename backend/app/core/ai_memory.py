@@ -0,0 +1,117 @@
+"""
+Conversation memory for CounselFlow AI agents
+Isolated, bounded chat history per session or matter with LRU eviction
+"""
+
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger("counselflow.ai.memory")
+
+# (role, content) where role is "human" or "ai"
+ChatMessage = Tuple[str, str]
+
+
+class ConversationMemoryStore:
+    """
+    Chat history keyed by session or matter
+
+    Each key keeps at most ``max_messages_per_key`` messages. Keys are evicted
+    least-recently-used first when there are more than ``max_keys`` of them or
+    when the stored text exceeds ``max_total_chars``, so memory use stays bounded
+    no matter how many conversations are active.
+    """
+
+    def __init__(
+        self,
+        max_messages_per_key: int = 20,
+        max_keys: int = 1000,
+        max_total_chars: int = 20_000_000
+    ):
+        self.max_messages_per_key = max_messages_per_key
+        self.max_keys = max_keys
+        self.max_total_chars = max_total_chars
+
+        self._conversations: "OrderedDict[str, Deque[ChatMessage]]" = OrderedDict()
+        self._total_chars = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get_messages(self, key: str) -> List[ChatMessage]:
+        """Return the history for ``key``, oldest first"""
+        with self._lock:
+            messages = self._conversations.get(key)
+            if messages is None:
+                return []
+            self._conversations.move_to_end(key)
+            return list(messages)
+
+    def append(self, key: str, role: str, content: str):
+        """Append a single message to the history for ``key``"""
+        with self._lock:
+            self._append(key, role, content)
+            self._enforce_limits(protected_key=key)
+
+    def add_exchange(self, key: str, human: str, ai: str):
+        """Record one question/answer round trip"""
+        with self._lock:
+            self._append(key, "human", human)
+            self._append(key, "ai", ai)
+            self._enforce_limits(protected_key=key)
+
+    def clear(self, key: str):
+        """Forget the history for ``key``"""
+        with self._lock:
+            messages = self._conversations.pop(key, None)
+            if messages:
+                self._total_chars -= sum(len(content) for _, content in messages)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memory store usage statistics"""
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "messages": sum(len(messages) for messages in self._conversations.values()),
+                "total_chars": self._total_chars,
+                "max_total_chars": self.max_total_chars,
+                "evictions": self._evictions
+            }
+
+    def _append(self, key: str, role: str, content: str):
+        messages = self._conversations.get(key)
+        if messages is None:
+            messages = deque()
+            self._conversations[key] = messages
+        else:
+            self._conversations.move_to_end(key)
+
+        messages.append((role, content))
+        self._total_chars += len(content)
+
+        while len(messages) > self.max_messages_per_key:
+            _, dropped = messages.popleft()
+            self._total_chars -= len(dropped)
+
+    def _enforce_limits(self, protected_key: Optional[str] = None):
+        # Evict whole conversations, least recently used first
+        while self._conversations and (
+            len(self._conversations) > self.max_keys
+            or self._total_chars > self.max_total_chars
+        ):
+            oldest_key = next(iter(self._conversations))
+            if oldest_key == protected_key:
+                break
+            messages = self._conversations.pop(oldest_key)
+            self._total_chars -= sum(len(content) for _, content in messages)
+            self._evictions += 1
+
+        # A single oversized conversation is trimmed rather than dropped
+        messages = self._conversations.get(protected_key)
+        while messages and len(messages) > 1 and self._total_chars > self.max_total_chars:
+            _, dropped = messages.popleft()
+            self._total_chars -= len(dropped)
+
+
+__all__ = ["ConversationMemoryStore", "ChatMessage"]
@@ -5,33 +5,34 @@ Multi-agent legal reasoning with LangChain and LlamaIndex
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator, Awaitable, Callable, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
+import functools
 import json
+import re
+import threading
+import time
 import uuid
 
-# LangChain imports
-from langchain.agents import AgentExecutor, create_openai_functions_agent
-from langchain.agents.agent_types import AgentType
-from langchain.tools import Tool
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.callbacks import get_openai_callback
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-# LlamaIndex imports
-from llama_index.core import VectorStoreIndex, ServiceContext, StorageContext
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.agent.openai import OpenAIAgent
-from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.core.query_engine import SubQuestionQueryEngine
+# LangChain and LlamaIndex are imported lazily inside the agent factories, and
+# the numpy-backed local embeddings on first use, so that importing this
+# module (and booting a worker) stays cheap.
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain_openai import ChatOpenAI
 
 from app.core.config import settings
+from app.core.ai_memory import ConversationMemoryStore
+from app.core.ai_cache import AIResponseCache
+from app.core.ai_task_store import AITaskStore
+from app.core.ai_retrieval import MatterRetrievalIndex
+from app.core.ai_usage import AIUsageAccountant, AIBudgetExceededError, BudgetDecision, StreamedUsage
+from app.core.ai_batch import chunk_document, pack_chunks, build_pack_prompt, split_pack_response
+from app.core.ai_scheduler import AITaskScheduler, AIQueueFullError
 from app.core.security import ClientPrivilegeProtector, SecurityLevel
-from app.models import User, Matter, Contract, Document
+from app.core.websocket import NotificationService
 
 logger = logging.getLogger("counselflow.ai")
 
@@ -57,80 +58,263 @@ class AIAgentOrchestrator:
     """
     
     def __init__(self):
+        # Agents are built on first use; see get_agent()
         self.agents: Dict[str, Any] = {}
-        self.active_tasks: Dict[str, Dict] = {}
+        self.agent_build_times: Dict[str, float] = {}
+        # Finished tasks expire after a TTL so this does not grow with uptime
+        self.active_tasks = AITaskStore(
+            max_entries=settings.AI_TASK_STORE_MAX_ENTRIES,
+            result_ttl_seconds=settings.AI_TASK_RESULT_TTL_SECONDS,
+            redis_url=settings.REDIS_URL if settings.AI_TASK_SPILL_TO_REDIS else None,
+            spill_ttl_seconds=settings.AI_TASK_SPILL_TTL_SECONDS
+        )
         self.privilege_protector = ClientPrivilegeProtector()
-        self.chat_memory = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            output_key="output",
-            return_messages=True,
-            k=10
+        self._agent_factories = {
+            AIAgentType.LEGAL_RESEARCH: self._create_legal_research_agent,
+            AIAgentType.CONTRACT_ANALYSIS: self._create_contract_analysis_agent,
+            AIAgentType.COMPLIANCE_CHECKER: self._create_compliance_agent,
+            AIAgentType.LITIGATION_STRATEGY: self._create_litigation_agent,
+            AIAgentType.DOCUMENT_REVIEWER: self._create_document_review_agent,
+            AIAgentType.RISK_ASSESSOR: self._create_risk_assessment_agent,
+            AIAgentType.WORKFLOW_ORCHESTRATOR: self._create_workflow_agent,
+        }
+        self._agent_lock = threading.Lock()
+        # task_id -> queues of SSE subscribers waiting for that task's events
+        self._event_streams: Dict[str, List[asyncio.Queue]] = {}
+        self.model_name = "gpt-4-turbo-preview"
+        self._llms: Dict[str, "ChatOpenAI"] = {}
+        
+        # Chat history is isolated per session / matter instead of shared by all agents
+        self.memory_store = ConversationMemoryStore(
+            max_messages_per_key=settings.AI_MEMORY_MAX_MESSAGES_PER_KEY,
+            max_keys=settings.AI_MEMORY_MAX_KEYS,
+            max_total_chars=settings.AI_MEMORY_MAX_TOTAL_CHARS
+        )
+        
+        # Token, cost and latency accounting with per-user and per-firm daily budgets
+        self.usage_accountant = AIUsageAccountant(
+            firm_daily_token_budget=settings.AI_FIRM_DAILY_TOKEN_BUDGET,
+            user_daily_token_budget=settings.AI_USER_DAILY_TOKEN_BUDGET,
+            downgrade_threshold=settings.AI_BUDGET_DOWNGRADE_THRESHOLD,
+            flush_interval_seconds=settings.AI_USAGE_FLUSH_INTERVAL_SECONDS,
+            redis_url=settings.REDIS_URL if settings.AI_USAGE_FLUSH_TO_REDIS else None
+        )
+        
+        # Tasks run on a bounded worker pool instead of the request that submitted them
+        self.scheduler = AITaskScheduler(
+            self.execute_task,
+            max_workers=settings.AI_SCHEDULER_MAX_WORKERS,
+            max_concurrency_per_agent=settings.AI_SCHEDULER_MAX_PER_AGENT,
+            max_queue_size=settings.AI_SCHEDULER_MAX_QUEUE_SIZE,
+            max_queued_per_user=settings.AI_SCHEDULER_MAX_QUEUED_PER_USER,
+            urgent_reserved_workers=settings.AI_SCHEDULER_URGENT_RESERVED
+        )
+        
+        # Repeat analyses of identical content are answered from cache
+        self.response_cache = AIResponseCache(
+            max_entries=settings.AI_RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.AI_RESPONSE_CACHE_TTL_SECONDS,
+            redis_url=settings.REDIS_URL if settings.AI_RESPONSE_CACHE_USE_REDIS else None
         )
+        self.cacheable_agent_types = (
+            set(settings.ai_response_cache_agent_types_list)
+            if settings.AI_RESPONSE_CACHE_ENABLED else set()
+        )
+        
+        # Offline CPU embeddings, created on first use
+        self._local_embedder = None
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model="gpt-4-turbo-preview",
-            temperature=0.1,
-            max_tokens=2000
+        # Synchronous tools run here so they never block the event loop
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=settings.AI_TOOL_THREAD_POOL_SIZE,
+            thread_name_prefix="ai-tool"
         )
+        self._legal_database = None
         
-        # Initialize agents
-        self._initialize_agents()
+        # Agents are grounded in the top-k chunks of the matter instead of whole documents
+        self.retrieval_index = MatterRetrievalIndex(
+            settings.LLAMA_INDEX_CACHE_DIR,
+            chunk_size=settings.AI_RETRIEVAL_CHUNK_SIZE,
+            chunk_overlap=settings.AI_RETRIEVAL_CHUNK_OVERLAP,
+            top_k=settings.AI_RETRIEVAL_TOP_K,
+            max_loaded=settings.AI_RETRIEVAL_MAX_LOADED_INDEXES,
+            **self._retrieval_backend()
+        ) if settings.AI_RETRIEVAL_ENABLED else None
+    
+    @property
+    def local_embedder(self):
+        """Offline embedder used for similarity detection and local retrieval"""
+        if self._local_embedder is None:
+            from app.core.ai_embeddings import create_local_embedder
+            
+            self._local_embedder = create_local_embedder(
+                settings.AI_LOCAL_EMBEDDING_MODEL_PATH,
+                dim=settings.AI_LOCAL_EMBEDDING_DIM,
+                batch_size=settings.AI_LOCAL_EMBEDDING_BATCH_SIZE
+            )
+        return self._local_embedder
     
-    def _initialize_agents(self):
-        """Initialize all AI agents with their specific capabilities"""
+    def _retrieval_backend(self) -> Dict[str, Any]:
+        """Embedding model and vector store overrides for the retrieval index"""
+        if settings.AI_EMBEDDING_BACKEND != "local":
+            return {}
         
-        # Legal Research Agent
-        self.agents[AIAgentType.LEGAL_RESEARCH] = self._create_legal_research_agent()
+        def embed_model_factory():
+            from app.core.ai_embeddings import llama_index_embedding
+            return llama_index_embedding(self.local_embedder)
         
-        # Contract Analysis Agent
-        self.agents[AIAgentType.CONTRACT_ANALYSIS] = self._create_contract_analysis_agent()
+        def vector_store_factory(persist_dir: Optional[str]):
+            from app.core.ai_embeddings import numpy_vector_store
+            return numpy_vector_store(persist_dir)
         
-        # Compliance Checker Agent
-        self.agents[AIAgentType.COMPLIANCE_CHECKER] = self._create_compliance_agent()
+        return {
+            "embed_model_factory": embed_model_factory,
+            "vector_store_factory": vector_store_factory
+        }
+    
+    @property
+    def llm(self) -> "ChatOpenAI":
+        """Shared chat model for the default model, created on first access"""
+        return self.get_llm(self.model_name)
+    
+    def get_llm(self, model_name: str) -> "ChatOpenAI":
+        """Chat model client for ``model_name``, created on first access"""
+        llm = self._llms.get(model_name)
+        if llm is None:
+            from langchain_openai import ChatOpenAI
+            
+            llm = ChatOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                model=model_name,
+                temperature=0.1,
+                max_tokens=2000
+            )
+            self._llms[model_name] = llm
+        return llm
+    
+    def get_agent(self, agent_type: AIAgentType, model_name: Optional[str] = None) -> "AgentExecutor":
+        """Return the agent for ``agent_type`` on ``model_name``, building it on first use"""
+        agent_type = AIAgentType(agent_type)
+        model_name = model_name or self.model_name
+        # Default-model agents are keyed by type alone; other tiers by type and model
+        key = agent_type if model_name == self.model_name else f"{agent_type.value}@{model_name}"
+        agent = self.agents.get(key)
+        if agent is not None:
+            return agent
         
-        # Litigation Strategy Agent
-        self.agents[AIAgentType.LITIGATION_STRATEGY] = self._create_litigation_agent()
+        with self._agent_lock:
+            # Another thread may have finished the build while we waited
+            agent = self.agents.get(key)
+            if agent is None:
+                start_time = time.perf_counter()
+                agent = self._agent_factories[agent_type](self.get_llm(model_name))
+                build_time = time.perf_counter() - start_time
+                
+                label = key.value if isinstance(key, AIAgentType) else key
+                self.agents[key] = agent
+                self.agent_build_times[label] = build_time
+                logger.info(f"Built AI agent {label} in {build_time * 1000:.1f}ms")
         
-        # Document Review Agent
-        self.agents[AIAgentType.DOCUMENT_REVIEWER] = self._create_document_review_agent()
+        return agent
+    
+    async def start(self):
+        """Start background work, e.g. from a startup hook: the periodic usage flush"""
+        self.usage_accountant.start()
+    
+    async def shutdown(self):
+        """Stop queued and running tasks, flush usage and release tool threads"""
+        await self.scheduler.shutdown()
+        await self.usage_accountant.close()
+        self._tool_executor.shutdown(wait=False, cancel_futures=True)
+    
+    def warm_up(self, agent_types: Optional[List[AIAgentType]] = None):
+        """Eagerly build agents, e.g. from a startup hook, instead of on first query"""
+        for agent_type in agent_types or list(AIAgentType):
+            self.get_agent(agent_type)
+    
+    def _build_prompt(self, messages: List[Any]):
+        """Build an agent prompt from the system messages plus the shared placeholders"""
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
         
-        # Risk Assessment Agent
-        self.agents[AIAgentType.RISK_ASSESSOR] = self._create_risk_assessment_agent()
+        return ChatPromptTemplate.from_messages([
+            *messages,
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad")
+        ])
+    
+    def _assemble_agent(self, tools: List[Any], prompt, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
+        """
+        Wrap tools and prompt into an OpenAI tools agent executor. The tools
+        agent can plan several independent tool calls in one step, which the
+        executor then awaits concurrently.
+        """
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
         
-        # Workflow Orchestrator
-        self.agents[AIAgentType.WORKFLOW_ORCHESTRATOR] = self._create_workflow_agent()
+        agent = create_openai_tools_agent(llm or self.llm, tools, prompt)
+        return AgentExecutor(agent=agent, tools=tools, verbose=True)
+    
+    def _async_tool(self, func: Callable[[str], str]) -> Callable[[str], Awaitable[str]]:
+        """
+        Async version of a synchronous tool that runs it on the tool thread
+        pool with a timeout, so slow or CPU-bound tools never stall the loop
+        """
+        @functools.wraps(func)
+        async def run(tool_input: str) -> str:
+            loop = asyncio.get_running_loop()
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._tool_executor, func, tool_input),
+                    timeout=settings.AI_TOOL_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"AI tool {func.__name__} timed out")
+                return f"Tool timed out after {settings.AI_TOOL_TIMEOUT_SECONDS}s; continue without it"
         
-        logger.info("All AI agents initialized successfully")
+        return run
     
-    def _create_legal_research_agent(self) -> AgentExecutor:
+    @property
+    def legal_database(self):
+        """Shared legal database service used by the research tools"""
+        if self._legal_database is None:
+            from app.services.legal_database_service import legal_database_service
+            
+            self._legal_database = legal_database_service
+        return self._legal_database
+    
+    def _create_legal_research_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create specialized legal research agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="case_law_search",
                 description="Search case law databases for relevant precedents",
-                func=self._search_case_law
+                func=self._search_case_law,
+                coroutine=self._asearch_case_law
             ),
             Tool(
                 name="statute_search",
                 description="Search statutes and regulations by jurisdiction",
-                func=self._search_statutes
+                func=self._search_statutes,
+                coroutine=self._asearch_statutes
             ),
             Tool(
                 name="legal_citation_validator",
                 description="Validate and format legal citations",
-                func=self._validate_citations
+                func=self._validate_citations,
+                coroutine=self._async_tool(self._validate_citations)
             ),
             Tool(
                 name="jurisdiction_analyzer",
                 description="Analyze jurisdictional requirements and conflicts",
-                func=self._analyze_jurisdiction
+                func=self._analyze_jurisdiction,
+                coroutine=self._async_tool(self._analyze_jurisdiction)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are an expert legal research AI assistant specializing in comprehensive legal analysis. 
             Your role is to:
             1. Conduct thorough legal research across multiple jurisdictions
@@ -141,46 +325,49 @@ class AIAgentOrchestrator:
             
             Always prioritize accuracy, provide proper citations, and consider multiple perspectives.
             Maintain attorney-client privilege and handle all information with appropriate confidentiality."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_contract_analysis_agent(self) -> AgentExecutor:
+    def _create_contract_analysis_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create specialized contract analysis agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="clause_analyzer",
                 description="Analyze individual contract clauses for risks and compliance",
-                func=self._analyze_clauses
+                func=self._analyze_clauses,
+                coroutine=self._async_tool(self._analyze_clauses)
             ),
             Tool(
                 name="term_extractor",
                 description="Extract key terms, dates, and obligations from contracts",
-                func=self._extract_terms
+                func=self._extract_terms,
+                coroutine=self._async_tool(self._extract_terms)
             ),
             Tool(
                 name="risk_scorer",
                 description="Score contract risk levels across multiple dimensions",
-                func=self._score_contract_risk
+                func=self._score_contract_risk,
+                coroutine=self._async_tool(self._score_contract_risk)
             ),
             Tool(
                 name="benchmark_comparer",
                 description="Compare contract terms against industry benchmarks",
-                func=self._compare_benchmarks
+                func=self._compare_benchmarks,
+                coroutine=self._async_tool(self._compare_benchmarks)
             ),
             Tool(
                 name="redline_generator",
                 description="Generate redline suggestions for contract improvements",
-                func=self._generate_redlines
+                func=self._generate_redlines,
+                coroutine=self._async_tool(self._generate_redlines)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are an expert contract analysis AI specializing in comprehensive contract review and risk assessment.
             Your expertise includes:
             1. Detailed clause-by-clause analysis
@@ -191,41 +378,43 @@ class AIAgentOrchestrator:
             6. Redline generation and improvement suggestions
             
             Provide thorough, accurate analysis while maintaining confidentiality and privilege protections."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_compliance_agent(self) -> AgentExecutor:
+    def _create_compliance_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create compliance checking agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="regulation_checker",
                 description="Check compliance against specific regulatory frameworks",
-                func=self._check_regulations
+                func=self._check_regulations,
+                coroutine=self._async_tool(self._check_regulations)
             ),
             Tool(
                 name="policy_validator",
                 description="Validate against internal policies and procedures",
-                func=self._validate_policies
+                func=self._validate_policies,
+                coroutine=self._async_tool(self._validate_policies)
             ),
             Tool(
                 name="audit_tracker",
                 description="Track compliance requirements and deadlines",
-                func=self._track_compliance
+                func=self._track_compliance,
+                coroutine=self._async_tool(self._track_compliance)
             ),
             Tool(
                 name="risk_mapper",
                 description="Map compliance risks to business operations",
-                func=self._map_compliance_risks
+                func=self._map_compliance_risks,
+                coroutine=self._async_tool(self._map_compliance_risks)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are a compliance analysis expert specializing in regulatory framework analysis.
             Your responsibilities include:
             1. Comprehensive compliance checking across multiple frameworks (GDPR, CCPA, SOX, etc.)
@@ -235,46 +424,49 @@ class AIAgentOrchestrator:
             5. Regulatory change monitoring and impact analysis
             
             Ensure thorough compliance analysis while maintaining data protection and confidentiality."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_litigation_agent(self) -> AgentExecutor:
+    def _create_litigation_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create litigation strategy agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="case_strategy_analyzer",
                 description="Analyze case facts and develop litigation strategies",
-                func=self._analyze_case_strategy
+                func=self._analyze_case_strategy,
+                coroutine=self._async_tool(self._analyze_case_strategy)
             ),
             Tool(
                 name="precedent_finder",
                 description="Find relevant precedents and similar cases",
-                func=self._find_precedents
+                func=self._find_precedents,
+                coroutine=self._async_tool(self._find_precedents)
             ),
             Tool(
                 name="evidence_assessor",
                 description="Assess evidence strength and admissibility",
-                func=self._assess_evidence
+                func=self._assess_evidence,
+                coroutine=self._async_tool(self._assess_evidence)
             ),
             Tool(
                 name="settlement_calculator",
                 description="Calculate potential settlement ranges and outcomes",
-                func=self._calculate_settlement
+                func=self._calculate_settlement,
+                coroutine=self._async_tool(self._calculate_settlement)
             ),
             Tool(
                 name="timeline_builder",
                 description="Build litigation timelines and milestone tracking",
-                func=self._build_timeline
+                func=self._build_timeline,
+                coroutine=self._async_tool(self._build_timeline)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are an expert litigation strategy AI with deep knowledge of trial practice and dispute resolution.
             Your expertise covers:
             1. Case analysis and strategy development
@@ -285,46 +477,49 @@ class AIAgentOrchestrator:
             6. Risk assessment and outcome prediction
             
             Maintain strict confidentiality and work product privilege in all analyses."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_document_review_agent(self) -> AgentExecutor:
+    def _create_document_review_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create document review and analysis agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="document_classifier",
                 description="Classify documents by type, privilege, and relevance",
-                func=self._classify_documents
+                func=self._classify_documents,
+                coroutine=self._async_tool(self._classify_documents)
             ),
             Tool(
                 name="privilege_checker",
                 description="Identify privileged communications and materials",
-                func=self._check_privilege
+                func=self._check_privilege,
+                coroutine=self._async_tool(self._check_privilege)
             ),
             Tool(
                 name="redaction_identifier",
                 description="Identify content requiring redaction",
-                func=self._identify_redactions
+                func=self._identify_redactions,
+                coroutine=self._async_tool(self._identify_redactions)
             ),
             Tool(
                 name="metadata_extractor",
                 description="Extract metadata and document properties",
-                func=self._extract_metadata
+                func=self._extract_metadata,
+                coroutine=self._async_tool(self._extract_metadata)
             ),
             Tool(
                 name="similarity_detector",
-                description="Detect similar or duplicate documents",
-                func=self._detect_similarity
+                description="Detect similar or duplicate documents. Separate documents with a line containing only ---",
+                func=self._detect_similarity,
+                coroutine=self._async_tool(self._detect_similarity)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are an expert document review AI specializing in legal document analysis and e-discovery.
             Your capabilities include:
             1. Document classification and categorization
@@ -335,41 +530,43 @@ class AIAgentOrchestrator:
             6. Quality control and review validation
             
             Maintain the highest standards of privilege protection and confidentiality."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_risk_assessment_agent(self) -> AgentExecutor:
+    def _create_risk_assessment_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create risk assessment agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="legal_risk_analyzer",
                 description="Analyze legal risks across multiple dimensions",
-                func=self._analyze_legal_risks
+                func=self._analyze_legal_risks,
+                coroutine=self._async_tool(self._analyze_legal_risks)
             ),
             Tool(
                 name="financial_risk_calculator",
                 description="Calculate financial exposure and risk metrics",
-                func=self._calculate_financial_risk
+                func=self._calculate_financial_risk,
+                coroutine=self._async_tool(self._calculate_financial_risk)
             ),
             Tool(
                 name="operational_risk_assessor",
                 description="Assess operational and business risks",
-                func=self._assess_operational_risks
+                func=self._assess_operational_risks,
+                coroutine=self._async_tool(self._assess_operational_risks)
             ),
             Tool(
                 name="mitigation_planner",
                 description="Develop risk mitigation strategies",
-                func=self._plan_risk_mitigation
+                func=self._plan_risk_mitigation,
+                coroutine=self._async_tool(self._plan_risk_mitigation)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are a comprehensive risk assessment AI specializing in legal, financial, and operational risk analysis.
             Your expertise includes:
             1. Multi-dimensional risk identification and analysis
@@ -380,41 +577,43 @@ class AIAgentOrchestrator:
             6. Scenario planning and stress testing
             
             Provide thorough, data-driven risk assessments with actionable recommendations."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
-    def _create_workflow_agent(self) -> AgentExecutor:
+    def _create_workflow_agent(self, llm: Optional["ChatOpenAI"] = None) -> "AgentExecutor":
         """Create workflow orchestration agent"""
         
+        from langchain.tools import Tool
+        
         tools = [
             Tool(
                 name="task_coordinator",
                 description="Coordinate tasks across multiple agents",
-                func=self._coordinate_tasks
+                func=self._coordinate_tasks,
+                coroutine=self._async_tool(self._coordinate_tasks)
             ),
             Tool(
                 name="priority_manager",
                 description="Manage task priorities and deadlines",
-                func=self._manage_priorities
+                func=self._manage_priorities,
+                coroutine=self._async_tool(self._manage_priorities)
             ),
             Tool(
                 name="resource_allocator",
                 description="Allocate AI resources based on workload",
-                func=self._allocate_resources
+                func=self._allocate_resources,
+                coroutine=self._async_tool(self._allocate_resources)
             ),
             Tool(
                 name="progress_tracker",
                 description="Track progress across all active tasks",
-                func=self._track_progress
+                func=self._track_progress,
+                coroutine=self._async_tool(self._track_progress)
             )
         ]
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = self._build_prompt([
             ("system", """You are a workflow orchestration AI responsible for coordinating complex legal tasks across multiple AI agents.
             Your responsibilities include:
             1. Task coordination and dependency management
@@ -425,13 +624,9 @@ class AIAgentOrchestrator:
             6. Exception handling and escalation
             
             Ensure efficient, accurate completion of all legal work while maintaining security and privilege protections."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        agent = create_openai_functions_agent(self.llm, tools, prompt)
-        return AgentExecutor(agent=agent, tools=tools, memory=self.chat_memory, verbose=True)
+        return self._assemble_agent(tools, prompt, llm)
     
     def create_task(
         self, 
@@ -439,9 +634,20 @@ class AIAgentOrchestrator:
         query: str, 
         user_id: str, 
         priority: AITaskPriority,
-        context: Dict[str, Any]
+        context: Dict[str, Any],
+        stream: bool = False,
+        firm_id: Optional[str] = None,
+        matter_id: Optional[str] = None
     ) -> str:
-        """Create a new AI task"""
+        """
+        Create a new AI task. With ``stream`` set, tokens and tool steps are
+        forwarded as they are produced to event stream subscribers and to the
+        user's WebSocket connections as AI_PROGRESS frames. Usage is accounted
+        against the user and, when given, ``firm_id``. ``matter_id`` must
+        already be checked against the user's access: only it, never a
+        ``matter_id`` inside ``context``, selects the matter's documents for
+        retrieval.
+        """
         task_id = str(uuid.uuid4())
         
         task = {
@@ -449,6 +655,8 @@ class AIAgentOrchestrator:
             "agent_type": agent_type.value,
             "query": query,
             "user_id": user_id,
+            "firm_id": firm_id,
+            "matter_id": str(matter_id) if matter_id else None,
             "priority": priority.value,
             "context": context,
             "status": "pending",
@@ -456,7 +664,8 @@ class AIAgentOrchestrator:
             "completed_at": None,
             "response": None,
             "confidence_score": None,
-            "sources": []
+            "sources": [],
+            "stream": stream
         }
         
         self.active_tasks[task_id] = task
@@ -464,23 +673,91 @@ class AIAgentOrchestrator:
         
         return task_id
     
+    def submit_task(self, task_id: str) -> int:
+        """
+        Queue a created task on the scheduler and return its queue position.
+        Raises AIQueueFullError when the scheduler is saturated and
+        AIBudgetExceededError when the user or firm is out of token budget;
+        tenants close to their budget are moved to the downgrade model.
+        """
+        task = self.active_tasks.get(task_id)
+        if task is None:
+            raise ValueError(f"Task {task_id} not found")
+        
+        decision = self.usage_accountant.check_budget(task["user_id"], task.get("firm_id"))
+        if decision == BudgetDecision.THROTTLE:
+            self.active_tasks.discard(task_id)
+            raise AIBudgetExceededError("Daily AI token budget exhausted")
+        task["model"] = (
+            settings.AI_DOWNGRADE_MODEL if decision == BudgetDecision.DOWNGRADE else self.model_name
+        )
+        
+        try:
+            position = self.scheduler.submit(
+                task_id, task["user_id"], task["agent_type"], task["priority"]
+            )
+        except AIQueueFullError:
+            # Never accepted, so there is no result to keep
+            self.active_tasks.discard(task_id)
+            raise
+        
+        if task["status"] == "pending":
+            task["status"] = "queued"
+        return position
+    
+    async def cancel_task(self, task_id: str) -> bool:
+        """Cancel a queued or running task"""
+        task = self.active_tasks.get(task_id)
+        if task is None or task["status"] in ("completed", "failed", "cancelled"):
+            return False
+        
+        self.scheduler.cancel(task_id)
+        task.update({
+            "status": "cancelled",
+            "completed_at": datetime.utcnow()
+        })
+        await self._emit_event(task, "cancelled", {})
+        await self.active_tasks.finish(task_id)
+        logger.info(f"Cancelled AI task {task_id}")
+        return True
+    
     async def execute_task(self, task_id: str) -> Dict[str, Any]:
         """Execute an AI task asynchronously"""
         if task_id not in self.active_tasks:
             raise ValueError(f"Task {task_id} not found")
         
         task = self.active_tasks[task_id]
+        if task["status"] == "cancelled":
+            return task
         task["status"] = "processing"
         
         try:
             agent_type = AIAgentType(task["agent_type"])
-            agent = self.agents.get(agent_type)
-            
-            if not agent:
-                raise ValueError(f"Agent {agent_type} not available")
+            model_name = task.get("model") or self.model_name
+            agent = self.get_agent(agent_type, model_name)
+            started = time.monotonic()
             
             # Execute the AI query
-            result = await self._execute_agent_query(agent, task["query"], task["context"])
+            await self._emit_event(task, "started", {"agent_type": agent_type.value})
+            
+            async def on_event(event: str, data: Dict[str, Any]):
+                await self._emit_event(task, event, data)
+            
+            context = await self._ground_context(
+                task["query"], task["context"], task.get("matter_id"), task.get("firm_id")
+            )
+            result = await self._execute_agent_query(
+                agent,
+                task["query"],
+                context,
+                memory_key=self._memory_key(task),
+                agent_type=agent_type,
+                cache_namespace=self._cache_namespace(task),
+                on_event=on_event if task.get("stream") else None,
+                model_name=model_name
+            )
+            
+            usage = self._record_usage(task, result.get("usage"), time.monotonic() - started)
             
             # Update task with results
             task.update({
@@ -488,11 +765,26 @@ class AIAgentOrchestrator:
                 "completed_at": datetime.utcnow(),
                 "response": result.get("response"),
                 "confidence_score": result.get("confidence_score", 0.85),
-                "sources": result.get("sources", [])
+                "sources": result.get("sources", []),
+                "cached": result.get("cached", False),
+                "usage": usage
             })
             
+            await self._emit_event(task, "done", {
+                "response": task["response"],
+                "confidence_score": task["confidence_score"],
+                "sources": task["sources"],
+                "cached": task["cached"]
+            })
             logger.info(f"Completed AI task {task_id}")
             
+        except asyncio.CancelledError:
+            task.update({
+                "status": "cancelled",
+                "completed_at": datetime.utcnow()
+            })
+            await self._emit_event(task, "cancelled", {})
+            raise
         except Exception as e:
             logger.error(f"Failed to execute task {task_id}: {str(e)}")
             task.update({
@@ -500,27 +792,330 @@ class AIAgentOrchestrator:
                 "completed_at": datetime.utcnow(),
                 "response": f"Task failed: {str(e)}"
             })
-        
+            await self._emit_event(task, "error", {"message": task["response"]})
+        finally:
+            # Also runs for cancelled tasks, so they start their TTL instead of staying live
+            await self.active_tasks.finish(task_id)
+            await self.usage_accountant.maybe_flush()
         return task
     
+    async def _ground_context(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        matter_id: Optional[str],
+        firm_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Attach the top-k retrieved chunks for queries on an access-checked matter"""
+        if self.retrieval_index is None or not matter_id:
+            return context
+        
+        try:
+            chunks = await self.retrieval_index.retrieve(query, matter_id=matter_id, firm_id=firm_id)
+        except Exception as e:
+            logger.warning(f"Retrieval failed, answering without grounding: {str(e)}")
+            return context
+        
+        return {**context, "retrieved_chunks": chunks}
+    
+    def _record_usage(
+        self,
+        task: Dict[str, Any],
+        usage: Optional[Dict[str, Any]],
+        latency_seconds: float
+    ) -> Dict[str, Any]:
+        """Account one agent invocation against the task's user and firm"""
+        usage = usage or {}
+        totals = self.usage_accountant.record(
+            task["user_id"],
+            task.get("firm_id"),
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cost_usd=usage.get("cost_usd", 0.0),
+            latency_seconds=latency_seconds
+        )
+        return {**totals.to_dict(), "model": task.get("model") or self.model_name}
+    
     def get_task_result(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Get the result of a specific task"""
+        """Get the result of a specific task held in memory"""
         return self.active_tasks.get(task_id)
     
-    async def _execute_agent_query(self, agent, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a query against a specific agent"""
+    async def fetch_task_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get the result of a task, including results already spilled out of memory"""
+        return await self.active_tasks.load(task_id)
+    
+    def open_event_stream(self, task_id: str) -> asyncio.Queue:
+        """
+        Subscribe to a task's events, then consume with iter_event_stream().
+        Subscribing right after submit_task(), before the caller next awaits,
+        guarantees no event is missed since the task cannot start until then.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._event_streams.setdefault(task_id, []).append(queue)
+        return queue
+    
+    async def iter_event_stream(self, task_id: str, queue: asyncio.Queue) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a task's events until it completes, fails or is cancelled"""
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("done", "error", "cancelled"):
+                    break
+        finally:
+            subscribers = self._event_streams.get(task_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._event_streams.pop(task_id, None)
+    
+    async def _emit_event(self, task: Dict[str, Any], event: str, data: Dict[str, Any]):
+        """Publish a task event to stream subscribers and, for streamed tasks, over WebSocket"""
+        payload = {"event": event, "task_id": task["id"], "data": data}
+        
+        for queue in self._event_streams.get(task["id"], ()):
+            queue.put_nowait(payload)
+        
+        if task.get("stream"):
+            # Sockets are registered under the token's string subject, not the User.id UUID
+            await NotificationService.send_ai_stream_event(str(task["user_id"]), task["id"], event, data)
+    
+    def _memory_key(self, task: Dict[str, Any]) -> Optional[str]:
+        """
+        Conversation key for a task: its session, else its matter, else none.
+        Matter history is shared within a firm, and only for the matter the
+        route checked access to (``task["matter_id"]``), never one taken
+        from the client-supplied context.
+        """
+        context = task.get("context") or {}
+        
+        if context.get("session_id"):
+            return f"session:{task['user_id']}:{context['session_id']}"
+        
+        if task.get("matter_id") and task.get("firm_id"):
+            return f"matter:{task['firm_id']}:{task['matter_id']}"
+        
+        return None
+    
+    def _load_chat_history(self, memory_key: Optional[str]) -> List[Any]:
+        """Convert stored history for ``memory_key`` into LangChain messages"""
+        if not memory_key:
+            return []
+        
+        from langchain.schema import HumanMessage, AIMessage
+        
+        return [
+            HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+            for role, content in self.memory_store.get_messages(memory_key)
+        ]
+    
+    async def analyze_documents_batch(
+        self,
+        documents: List[Dict[str, Any]],
+        agent_type: AIAgentType,
+        user_id: str,
+        context: Dict[str, Any],
+        max_concurrency: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        firm_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze many documents with the contract analysis or document review
+        agent. Documents are chunked and packed into prompts under a token
+        budget, packs run concurrently behind a semaphore, and a result is
+        yielded per document as soon as all its chunks are done, followed by
+        a throughput summary.
+        """
+        agent_type = AIAgentType(agent_type)
+        instructions = {
+            AIAgentType.CONTRACT_ANALYSIS: "Analyze the following contract text for key terms, obligations and risks.",
+            AIAgentType.DOCUMENT_REVIEWER: "Review the following document for classification, privilege and redaction needs."
+        }
+        if agent_type not in instructions:
+            raise ValueError(f"Batch analysis is not supported for agent {agent_type.value}")
+        
+        decision = self.usage_accountant.check_budget(user_id, firm_id)
+        if decision == BudgetDecision.THROTTLE:
+            raise AIBudgetExceededError("Daily AI token budget exhausted")
+        model_name = settings.AI_DOWNGRADE_MODEL if decision == BudgetDecision.DOWNGRADE else self.model_name
+        usage_task = {"user_id": user_id, "firm_id": firm_id, "model": model_name}
+        
+        token_budget = token_budget or settings.AI_BATCH_TOKEN_BUDGET
+        agent = self.get_agent(agent_type, model_name)
+        cache_namespace = self._cache_namespace({"context": context, "user_id": user_id})
+        start_time = time.perf_counter()
+        
+        # Chunks are labelled by position so arbitrary document ids cannot break parsing
+        chunks = []
+        for position, document in enumerate(documents):
+            chunks.extend(chunk_document(str(position), document["text"], token_budget))
+        packs = pack_chunks(chunks, token_budget)
+        totals = {chunk.document_id: chunk.total for chunk in chunks}
+        
+        parts: Dict[str, Dict[int, str]] = {str(position): {} for position in range(len(documents))}
+        failed: Dict[str, bool] = {}
+        semaphore = asyncio.Semaphore(max_concurrency or settings.AI_BATCH_MAX_CONCURRENCY)
+        
+        batch_tokens = 0
+        batch_cost = 0.0
+        
+        async def run_pack(pack):
+            async with semaphore:
+                pack_started = time.monotonic()
+                result = await self._execute_agent_query(
+                    agent,
+                    build_pack_prompt(pack, instructions[agent_type]),
+                    context,
+                    agent_type=agent_type,
+                    cache_namespace=cache_namespace,
+                    model_name=model_name
+                )
+                usage = self._record_usage(usage_task, result.get("usage"), time.monotonic() - pack_started)
+            return pack, result, usage
+        
+        pending = [asyncio.create_task(run_pack(pack)) for pack in packs]
+        completed_documents = 0
+        try:
+            for next_done in asyncio.as_completed(pending):
+                pack, result, usage = await next_done
+                batch_tokens += usage["total_tokens"]
+                batch_cost += usage["cost_usd"]
+                
+                for (position, index), text in split_pack_response(pack, result["response"]).items():
+                    parts[position][index] = text
+                    if not result.get("confidence_score"):
+                        failed[position] = True
+                
+                # Chunks of one document may finish in any order across packs
+                for position in dict.fromkeys(chunk.document_id for chunk in pack.chunks):
+                    document_parts = parts[position]
+                    if len(document_parts) != totals[position]:
+                        continue
+                    
+                    completed_documents += 1
+                    document = documents[int(position)]
+                    yield {
+                        "event": "document",
+                        "data": {
+                            "document_id": document.get("document_id") or position,
+                            "title": document.get("title"),
+                            "status": "failed" if failed.get(position) else "completed",
+                            "chunks": totals[position],
+                            "response": "\n\n".join(document_parts[i] for i in range(totals[position]))
+                        }
+                    }
+        finally:
+            # Stop outstanding model calls if the consumer went away
+            for task in pending:
+                task.cancel()
+            await self.usage_accountant.maybe_flush()
+        
+        elapsed = time.perf_counter() - start_time
+        yield {
+            "event": "summary",
+            "data": {
+                "documents": completed_documents,
+                "chunks": len(chunks),
+                "model_calls": len(packs),
+                "model": model_name,
+                "total_tokens": batch_tokens,
+                "cost_usd": round(batch_cost, 6),
+                "elapsed_seconds": round(elapsed, 2),
+                "documents_per_minute": round(completed_documents / elapsed * 60, 1) if elapsed else 0.0
+            }
+        }
+    
+    def _cache_namespace(self, task: Dict[str, Any]) -> str:
+        """Privilege boundary for cached answers: the client, else the requesting user"""
+        context = task.get("context") or {}
+        if context.get("client_id"):
+            return f"client:{context['client_id']}"
+        return f"user:{task['user_id']}"
+    
+    async def _execute_agent_query(
+        self,
+        agent,
+        query: str,
+        context: Dict[str, Any],
+        memory_key: Optional[str] = None,
+        agent_type: Optional[AIAgentType] = None,
+        cache_namespace: Optional[str] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+        model_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a query against a specific agent. When ``on_event`` is given the
+        agent is streamed and each token and tool step is reported through it.
+        Token counts and cost of the invocation are returned under "usage".
+        """
         try:
             # Prepare the context-enriched query
             enriched_query = self._enrich_query_with_context(query, context)
+            chat_history = self._load_chat_history(memory_key)
             
-            # Execute the agent
-            result = await agent.ainvoke({"input": enriched_query})
+            # Only stateless queries are cacheable; history changes the answer
+            cache_key = None
+            if (
+                agent_type is not None
+                and agent_type.value in self.cacheable_agent_types
+                and cache_namespace
+                and not chat_history
+            ):
+                cache_key = self.response_cache.make_key(
+                    cache_namespace,
+                    agent_type.value,
+                    model_name or self.model_name,
+                    enriched_query,
+                    tools=[tool.name for tool in getattr(agent, "tools", [])]
+                )
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    if memory_key:
+                        self.memory_store.add_exchange(memory_key, query, cached["response"])
+                    if on_event:
+                        await on_event("token", {"content": cached["response"]})
+                    return {**cached, "cached": True, "usage": None}
             
-            return {
-                "response": result.get("output", "No response generated"),
+            # Execute the agent with only this conversation's history
+            agent_input = {
+                "input": enriched_query,
+                "chat_history": chat_history
+            }
+            from langchain.callbacks import get_openai_callback
+            
+            streamed_usage = StreamedUsage() if on_event else None
+            with get_openai_callback() as usage_callback:
+                if on_event:
+                    result = await self._stream_agent(agent, agent_input, on_event, streamed_usage)
+                else:
+                    result = await agent.ainvoke(agent_input)
+            output = result.get("output", "No response generated")
+            
+            if memory_key:
+                self.memory_store.add_exchange(memory_key, query, output)
+            
+            response = {
+                "response": output,
                 "confidence_score": 0.85,  # Placeholder - implement actual confidence scoring
-                "sources": self._extract_sources(result)
+                "sources": self._retrieval_sources(context) or self._extract_sources(result)
+            }
+            
+            if cache_key:
+                await self.response_cache.set(cache_key, response)
+            
+            usage = {
+                "prompt_tokens": usage_callback.prompt_tokens,
+                "completion_tokens": usage_callback.completion_tokens,
+                "cost_usd": usage_callback.total_cost
             }
+            if streamed_usage is not None and not usage_callback.total_tokens:
+                # The callback sees no token counts for streamed responses
+                usage = streamed_usage.totals()
+                usage["cost_usd"] = self._token_cost(
+                    model_name or self.model_name, usage["prompt_tokens"], usage["completion_tokens"]
+                )
+            
+            return {**response, "usage": usage}
             
         except Exception as e:
             logger.error(f"Agent execution error: {str(e)}")
@@ -530,6 +1125,74 @@ class AIAgentOrchestrator:
                 "sources": []
             }
     
+    async def _stream_agent(
+        self,
+        agent,
+        agent_input: Dict[str, Any],
+        on_event: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        usage: StreamedUsage
+    ) -> Dict[str, Any]:
+        """Run an agent via astream_events, forwarding tokens and tool steps and counting usage"""
+        tokens: List[str] = []
+        result: Optional[Dict[str, Any]] = None
+        
+        async for event in agent.astream_events(agent_input, version="v1"):
+            kind = event["event"]
+            
+            if kind == "on_chat_model_start":
+                usage.start_call(self._prompt_text(event["data"].get("input")))
+            
+            elif kind == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                content = chunk.content
+                usage.add_chunk(content, getattr(chunk, "usage_metadata", None))
+                if content:
+                    tokens.append(content)
+                    await on_event("token", {"content": content})
+            
+            elif kind == "on_tool_start":
+                await on_event("tool_start", {
+                    "tool": event["name"],
+                    "input": event["data"].get("input")
+                })
+            
+            elif kind == "on_tool_end":
+                await on_event("tool_end", {
+                    "tool": event["name"],
+                    "output": str(event["data"].get("output", ""))
+                })
+            
+            elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                output = event["data"].get("output")
+                if isinstance(output, dict):
+                    result = output
+        
+        return result or {"output": "".join(tokens)}
+    
+    @staticmethod
+    def _prompt_text(model_input: Any) -> str:
+        """Flatten the messages of an on_chat_model_start event for token estimation"""
+        messages = model_input.get("messages", []) if isinstance(model_input, dict) else []
+        flattened = []
+        for batch in messages:
+            for message in batch if isinstance(batch, list) else [batch]:
+                flattened.append(str(getattr(message, "content", message)))
+        return "\n".join(flattened)
+    
+    @staticmethod
+    def _token_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Price token counts with the same table the OpenAI callback uses"""
+        try:
+            from langchain_community.callbacks.openai_info import get_openai_token_cost_for_model
+            
+            return (
+                get_openai_token_cost_for_model(model_name, prompt_tokens)
+                + get_openai_token_cost_for_model(model_name, completion_tokens, is_completion=True)
+            )
+        except Exception:
+            # Unknown models have no price; tokens are still counted against budgets
+            return 0.0
+    
     def _enrich_query_with_context(self, query: str, context: Dict[str, Any]) -> str:
         """Enrich query with additional context"""
         context_parts = []
@@ -543,11 +1206,31 @@ class AIAgentOrchestrator:
         if context.get("analysis_type"):
             context_parts.append(f"Analysis type: {context['analysis_type']}")
         
+        excerpts = "\n\n".join(
+            f"[{position}] {chunk.get('title') or chunk.get('source_type', 'source')}\n{chunk['text']}"
+            for position, chunk in enumerate(context.get("retrieved_chunks") or [], start=1)
+        )
+        
         if context_parts:
-            return f"Context: {' | '.join(context_parts)}\n\nQuery: {query}"
+            query = f"Context: {' | '.join(context_parts)}\n\nQuery: {query}"
+        
+        if excerpts:
+            return f"{query}\n\nRelevant excerpts from the matter file:\n\n{excerpts}"
         
         return query
     
+    def _retrieval_sources(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Cite the retrieved chunks an answer was grounded in"""
+        return [
+            {
+                "type": chunk.get("source_type", "document"),
+                "id": chunk.get("source_id"),
+                "title": chunk.get("title"),
+                "relevance": round(chunk["score"], 4)
+            }
+            for chunk in context.get("retrieved_chunks") or []
+        ]
+    
     def _extract_sources(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract sources from agent result"""
         # Placeholder - implement actual source extraction
@@ -567,11 +1250,35 @@ class AIAgentOrchestrator:
         # Placeholder - integrate with Westlaw, LexisNexis, etc.
         return f"Case law search results for: {query}"
     
+    async def _asearch_case_law(self, query: str) -> str:
+        """Search case law databases without blocking the event loop"""
+        results = await self.legal_database.unified_search(
+            query, ["local", "westlaw", "lexisnexis", "courtlistener"], max_results=10
+        )
+        return self._format_search_results(query, results)
+    
     def _search_statutes(self, query: str) -> str:
         """Search statutes and regulations"""
         # Placeholder - integrate with legal databases
         return f"Statute search results for: {query}"
     
+    async def _asearch_statutes(self, query: str) -> str:
+        """Search statutes and regulations without blocking the event loop"""
+        results = await self.legal_database.unified_search(
+            query, ["local", "westlaw", "lexisnexis"], filters={"content_type": "statute"}, max_results=10
+        )
+        return self._format_search_results(query, results)
+    
+    @staticmethod
+    def _format_search_results(query: str, results: Dict[str, Any]) -> str:
+        """Render legal database results as compact tool output"""
+        if not results["results"]:
+            return f"No results found for: {query}"
+        return "\n".join(
+            f"- {item['title']} ({item['citation']}, {item.get('court', 'n/a')}, {item.get('date', 'n/a')}): {item['summary']}"
+            for item in results["results"]
+        )
+    
     def _validate_citations(self, citations: str) -> str:
         """Validate legal citations"""
         # Placeholder - implement citation validation logic
@@ -673,9 +1380,29 @@ class AIAgentOrchestrator:
         return f"Metadata extraction complete"
     
     def _detect_similarity(self, documents: str) -> str:
-        """Detect document similarity"""
-        # Placeholder - implement similarity detection
-        return f"Similarity detection complete"
+        """Detect near-duplicate and related documents by local embedding similarity"""
+        import numpy as np
+        
+        texts = [text.strip() for text in re.split(r"^\s*---\s*$", documents, flags=re.MULTILINE)]
+        texts = [text for text in texts if text]
+        if len(texts) < 2:
+            return "Provide at least two documents separated by a line containing only ---"
+        
+        vectors = self.local_embedder.embed(texts)
+        similarity = vectors @ vectors.T
+        first, second = np.triu_indices(len(texts), k=1)
+        scores = similarity[first, second]
+        
+        related = scores >= settings.AI_SIMILARITY_RELATED_THRESHOLD
+        order = np.argsort(-scores[related])
+        lines = []
+        for a, b, score in zip(first[related][order], second[related][order], scores[related][order]):
+            label = "near-duplicate" if score >= settings.AI_SIMILARITY_DUPLICATE_THRESHOLD else "similar"
+            lines.append(f"Documents {a + 1} and {b + 1}: {label} (similarity {score:.2f})")
+        
+        if not lines:
+            return f"No similar documents found among {len(texts)} documents"
+        return "\n".join(lines)
     
     def _analyze_legal_risks(self, content: str) -> str:
         """Analyze legal risks"""
@@ -720,11 +1447,23 @@ class AIAgentOrchestrator:
     def get_agent_status(self) -> Dict[str, Any]:
         """Get status of all AI agents"""
         return {
-            "total_agents": len(self.agents),
-            "active_tasks": len([t for t in self.active_tasks.values() if t["status"] == "running"]),
+            "total_agents": len(self._agent_factories),
+            "loaded_agents": len(self.agents),
+            "agent_build_times_ms": {
+                agent_type: round(seconds * 1000, 1)
+                for agent_type, seconds in self.agent_build_times.items()
+            },
+            "queued_tasks": len([t for t in self.active_tasks.values() if t["status"] == "queued"]),
+            "active_tasks": len([t for t in self.active_tasks.values() if t["status"] == "processing"]),
             "completed_tasks": len([t for t in self.active_tasks.values() if t["status"] == "completed"]),
             "failed_tasks": len([t for t in self.active_tasks.values() if t["status"] == "failed"]),
-            "agents": list(self.agents.keys()),
+            "agents": [agent_type.value for agent_type in self._agent_factories],
+            "memory": self.memory_store.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "response_cache": self.response_cache.get_metrics(),
+            "task_store": self.active_tasks.get_stats(),
+            "usage": self.usage_accountant.get_summary(),
+            "retrieval": self.retrieval_index.get_stats() if self.retrieval_index else None,
             "system_status": "operational"
         }
 
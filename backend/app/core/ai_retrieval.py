@@ -0,0 +1,326 @@
+"""
+Matter Retrieval Index for CounselFlow
+Per-matter LlamaIndex vector indexes used to ground agents in the top-k relevant chunks
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING
+
+# LlamaIndex is imported lazily so that booting a worker stays cheap
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex
+
+logger = logging.getLogger("counselflow.ai.retrieval")
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+@dataclass
+class IndexSource:
+    """One piece of source text to index, addressed by a stable id"""
+    source_id: str
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class MatterRetrievalIndex:
+    """
+    Persistent vector indexes scoped per matter
+
+    Each matter gets its own index of its documents' extracted text; knowledge
+    base items are indexed once per firm and searched alongside the matter
+    index instead of being copied into every matter. Indexes are persisted
+    under ``cache_dir`` and the most recently used ``max_loaded`` are kept in
+    memory. Sources are stored under stable ids (``document:<id>``,
+    ``knowledge:<id>``) and upserted with ``refresh_ref_docs``, so re-indexing
+    only re-embeds sources whose text actually changed. ``embed_model_factory``
+    (called once, on first use) and ``vector_store_factory`` (called with the
+    persist dir, or None for a new index) swap in e.g. the offline backend
+    from app.core.ai_embeddings.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        chunk_size: int = 512,
+        chunk_overlap: int = 64,
+        top_k: int = 5,
+        max_loaded: int = 32,
+        embed_model_factory: Optional[Callable[[], Any]] = None,
+        vector_store_factory: Optional[Callable[[Optional[str]], Any]] = None
+    ):
+        self.persist_root = os.path.join(cache_dir, "retrieval")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.top_k = top_k
+        self.max_loaded = max_loaded
+        self.embed_model_factory = embed_model_factory
+        self._embed_model = None
+        self.vector_store_factory = vector_store_factory
+
+        self._indexes: "OrderedDict[str, VectorStoreIndex]" = OrderedDict()
+        # Index objects are not thread-safe; every read and write of a scope holds its lock
+        self._scope_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._background: Set[asyncio.Task] = set()
+        self._metrics = {"queries": 0, "upserts": 0, "reembedded": 0, "loads": 0, "builds": 0}
+
+    @staticmethod
+    def matter_scope(matter_id: str) -> str:
+        return f"matter:{matter_id}"
+
+    @staticmethod
+    def knowledge_scope(firm_id: Optional[str]) -> str:
+        return f"knowledge:{firm_id or 'public'}"
+
+    async def retrieve(
+        self,
+        query: str,
+        matter_id: Optional[str] = None,
+        firm_id: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get the top-k chunks for a query across the matter and firm knowledge indexes"""
+        top_k = top_k or self.top_k
+        scopes = [self.knowledge_scope(firm_id)]
+        if matter_id:
+            scopes.insert(0, self.matter_scope(matter_id))
+
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._query_scope, scope, query, top_k, firm_id) for scope in scopes),
+            return_exceptions=True
+        )
+
+        chunks: List[Dict[str, Any]] = []
+        for scope, result in zip(scopes, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Retrieval from {scope} failed: {result}")
+                continue
+            chunks.extend(result)
+
+        self._metrics["queries"] += 1
+        chunks.sort(key=lambda chunk: chunk["score"], reverse=True)
+        return chunks[:top_k]
+
+    async def upsert(self, scope: str, sources: List[IndexSource]) -> int:
+        """Insert or update sources in a scope; returns how many were (re-)embedded"""
+        return await asyncio.to_thread(self._upsert, scope, sources)
+
+    async def delete(self, scope: str, source_id: str):
+        """Remove a source and all its chunks from a scope"""
+        await asyncio.to_thread(self._delete, scope, source_id)
+
+    async def rebuild_matter(self, matter_id: str) -> int:
+        """Re-index every document of a matter from the database"""
+        return await asyncio.to_thread(self._build_scope, self.matter_scope(matter_id), None)
+
+    async def rebuild_knowledge(self, firm_id: Optional[str]) -> int:
+        """Re-index the knowledge base items visible to a firm from the database"""
+        return await asyncio.to_thread(self._build_scope, self.knowledge_scope(firm_id), firm_id)
+
+    async def update_document(self, matter_id: str, document_id: str, title: str, text: str) -> int:
+        """Re-index one document, e.g. after a new version is saved"""
+        source = IndexSource(
+            source_id=f"document:{document_id}",
+            text=text,
+            metadata={"source_type": "document", "source_id": str(document_id), "title": title}
+        )
+        return await self.upsert(self.matter_scope(matter_id), [source])
+
+    def schedule_document_update(self, matter_id: str, document_id: str, title: str, text: str):
+        """Re-index one document in the background"""
+        task = asyncio.create_task(self.update_document(matter_id, document_id, title, text))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            **self._metrics,
+            "loaded_indexes": len(self._indexes),
+            "max_loaded": self.max_loaded,
+            "pending_updates": len(self._background),
+            "top_k": self.top_k,
+            "chunk_size": self.chunk_size
+        }
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background re-index failed: {task.exception()}")
+
+    def _scope_lock(self, scope: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._scope_locks.setdefault(scope, threading.Lock())
+
+    def _persist_dir(self, scope: str) -> str:
+        return os.path.join(self.persist_root, _UNSAFE_PATH_CHARS.sub("_", scope))
+
+    def _index_kwargs(self) -> Dict[str, Any]:
+        from llama_index.core.node_parser import SentenceSplitter
+
+        kwargs: Dict[str, Any] = {
+            "transformations": [
+                SentenceSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+            ]
+        }
+        if self.embed_model_factory is not None:
+            if self._embed_model is None:
+                self._embed_model = self.embed_model_factory()
+            kwargs["embed_model"] = self._embed_model
+        return kwargs
+
+    def _get_index(self, scope: str, create: bool = True) -> Optional["VectorStoreIndex"]:
+        """Get a scope's index from memory or disk; caller holds the scope lock"""
+        index = self._indexes.get(scope)
+        if index is not None:
+            self._indexes.move_to_end(scope)
+            return index
+
+        from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+
+        persist_dir = self._persist_dir(scope)
+        if os.path.isdir(persist_dir):
+            storage_context = StorageContext.from_defaults(
+                persist_dir=persist_dir,
+                vector_store=self.vector_store_factory(persist_dir) if self.vector_store_factory else None
+            )
+            index = load_index_from_storage(storage_context, **self._index_kwargs())
+            self._metrics["loads"] += 1
+        elif create:
+            storage_context = StorageContext.from_defaults(
+                vector_store=self.vector_store_factory(None) if self.vector_store_factory else None
+            )
+            index = VectorStoreIndex(nodes=[], storage_context=storage_context, **self._index_kwargs())
+        else:
+            return None
+
+        self._indexes[scope] = index
+        while len(self._indexes) > self.max_loaded:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _query_scope(self, scope: str, query: str, top_k: int, firm_id: Optional[str]) -> List[Dict[str, Any]]:
+        with self._scope_lock(scope):
+            index = self._get_index(scope, create=False)
+        if index is None:
+            # First use of the scope: index it from the database
+            self._build_scope(scope, firm_id)
+            with self._scope_lock(scope):
+                index = self._get_index(scope, create=False)
+            if index is None:
+                return []
+
+        with self._scope_lock(scope):
+            nodes = index.as_retriever(similarity_top_k=top_k).retrieve(query)
+
+        return [
+            {
+                "text": scored.node.get_content(),
+                "score": float(scored.score or 0.0),
+                "scope": scope,
+                **scored.node.metadata
+            }
+            for scored in nodes
+        ]
+
+    def _upsert(self, scope: str, sources: List[IndexSource]) -> int:
+        from llama_index.core import Document as IndexDocument
+
+        documents = [
+            IndexDocument(text=source.text, id_=source.source_id, metadata=source.metadata)
+            for source in sources
+            if source.text and source.text.strip()
+        ]
+        with self._scope_lock(scope):
+            index = self._get_index(scope)
+            # Unchanged sources are skipped by hash, so only edits are re-embedded
+            changed = sum(index.refresh_ref_docs(documents))
+            if changed or not os.path.isdir(self._persist_dir(scope)):
+                index.storage_context.persist(persist_dir=self._persist_dir(scope))
+
+        self._metrics["upserts"] += len(documents)
+        self._metrics["reembedded"] += changed
+        return changed
+
+    def _delete(self, scope: str, source_id: str):
+        with self._scope_lock(scope):
+            index = self._get_index(scope, create=False)
+            if index is None:
+                return
+            index.delete_ref_doc(source_id, delete_from_docstore=True)
+            index.storage_context.persist(persist_dir=self._persist_dir(scope))
+
+    def _build_scope(self, scope: str, firm_id: Optional[str]) -> int:
+        """Index a scope's sources from the database"""
+        from app.core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            if scope.startswith("matter:"):
+                sources = self._load_matter_sources(db, scope.split(":", 1)[1])
+            else:
+                sources = self._load_knowledge_sources(db, firm_id)
+        finally:
+            db.close()
+
+        self._metrics["builds"] += 1
+        return self._upsert(scope, sources)
+
+    @staticmethod
+    def _load_matter_sources(db, matter_id: str) -> List[IndexSource]:
+        from app.models import Document
+
+        documents = db.query(Document.id, Document.title, Document.document_type, Document.extracted_text)\
+            .filter(Document.matter_id == matter_id, Document.extracted_text.isnot(None))\
+            .all()
+        return [
+            IndexSource(
+                source_id=f"document:{document.id}",
+                text=document.extracted_text,
+                metadata={
+                    "source_type": "document",
+                    "source_id": str(document.id),
+                    "title": document.title,
+                    "document_type": document.document_type
+                }
+            )
+            for document in documents
+        ]
+
+    @staticmethod
+    def _load_knowledge_sources(db, firm_id: Optional[str]) -> List[IndexSource]:
+        from sqlalchemy import or_
+        from app.models import KnowledgeItem, User
+
+        query = db.query(
+            KnowledgeItem.id, KnowledgeItem.title, KnowledgeItem.content,
+            KnowledgeItem.content_type, KnowledgeItem.jurisdiction
+        ).join(User, KnowledgeItem.created_by == User.id)
+        if firm_id:
+            query = query.filter(or_(KnowledgeItem.is_public.is_(True), User.firm_id == firm_id))
+        else:
+            query = query.filter(KnowledgeItem.is_public.is_(True))
+
+        return [
+            IndexSource(
+                source_id=f"knowledge:{item.id}",
+                text=item.content,
+                metadata={
+                    "source_type": item.content_type,
+                    "source_id": str(item.id),
+                    "title": item.title,
+                    "jurisdiction": item.jurisdiction
+                }
+            )
+            for item in query.all()
+        ]
+
+
+__all__ = ["MatterRetrievalIndex", "IndexSource"]
@@ -0,0 +1,228 @@
+"""
+AI Task Scheduler for CounselFlow
+Priority lanes, per-user fair queuing and bounded concurrency for AI agent tasks
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger("counselflow.ai.scheduler")
+
+# Highest priority first; values match AITaskPriority
+PRIORITY_ORDER = ("urgent", "high", "medium", "low")
+
+
+class AIQueueFullError(Exception):
+    """Raised when the scheduler cannot accept more work"""
+
+
+@dataclass
+class ScheduledTask:
+    """A task waiting for, or holding, a worker slot"""
+    task_id: str
+    user_id: str
+    agent_type: str
+    priority: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class AITaskScheduler:
+    """
+    Runs AI tasks on a bounded pool of asyncio workers
+
+    Tasks are queued in one lane per priority and served strictly by priority.
+    Within a lane users are served round-robin so one heavy user cannot starve
+    the rest, and each agent type has its own concurrency limit. A few worker
+    slots are reserved for urgent work so it never waits behind a burst of
+    lower priority tasks. When the queue is full, submit() raises
+    AIQueueFullError so callers can shed load instead of piling up.
+    """
+
+    def __init__(
+        self,
+        executor: Callable[[str], Awaitable[Any]],
+        max_workers: int = 16,
+        max_concurrency_per_agent: int = 4,
+        max_queue_size: int = 500,
+        max_queued_per_user: int = 50,
+        urgent_reserved_workers: int = 2
+    ):
+        self._executor = executor
+        self.max_workers = max_workers
+        self.max_concurrency_per_agent = max_concurrency_per_agent
+        self.max_queue_size = max_queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self.urgent_reserved_workers = min(urgent_reserved_workers, max_workers - 1)
+
+        # priority -> user_id -> FIFO of that user's tasks (dict order is the round-robin order)
+        self._lanes: Dict[str, "OrderedDict[str, Deque[ScheduledTask]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_ORDER
+        }
+        self._queued: Dict[str, ScheduledTask] = {}
+        self._queued_per_user: Dict[str, int] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_per_agent: Dict[str, int] = {}
+
+        self._wait_times: Dict[str, Deque[float]] = {
+            priority: deque(maxlen=1000) for priority in PRIORITY_ORDER
+        }
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    def submit(self, task_id: str, user_id: str, agent_type: str, priority: str) -> int:
+        """Queue a task and return its position in its priority lane"""
+        priority = getattr(priority, "value", priority)
+        agent_type = getattr(agent_type, "value", agent_type)
+        if priority not in self._lanes:
+            raise ValueError(f"Unknown priority {priority}")
+
+        if len(self._queued) >= self.max_queue_size:
+            self._counters["rejected"] += 1
+            raise AIQueueFullError("AI task queue is full")
+        if self._queued_per_user.get(user_id, 0) >= self.max_queued_per_user:
+            self._counters["rejected"] += 1
+            raise AIQueueFullError(f"Too many queued AI tasks for user {user_id}")
+
+        item = ScheduledTask(task_id=task_id, user_id=user_id, agent_type=agent_type, priority=priority)
+        lane = self._lanes[priority]
+        lane.setdefault(user_id, deque()).append(item)
+        self._queued[task_id] = item
+        self._queued_per_user[user_id] = self._queued_per_user.get(user_id, 0) + 1
+        self._counters["submitted"] += 1
+
+        position = sum(len(user_queue) for user_queue in lane.values())
+        self._dispatch()
+        return position
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a queued or running task; returns False if it is unknown"""
+        item = self._queued.get(task_id)
+        if item is not None:
+            lane = self._lanes[item.priority]
+            user_queue = lane[item.user_id]
+            user_queue.remove(item)
+            if not user_queue:
+                del lane[item.user_id]
+            self._forget_queued(item)
+            self._counters["cancelled"] += 1
+            return True
+
+        running = self._running.get(task_id)
+        if running is not None:
+            running.cancel()
+            return True
+
+        return False
+
+    def is_queued(self, task_id: str) -> bool:
+        return task_id in self._queued
+
+    def is_running(self, task_id: str) -> bool:
+        return task_id in self._running
+
+    async def shutdown(self):
+        """Drop queued work and cancel running tasks"""
+        for task_id in list(self._queued):
+            self.cancel(task_id)
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, utilisation and queue wait percentiles per priority"""
+        return {
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "queued_by_priority": {
+                priority: sum(len(user_queue) for user_queue in lane.values())
+                for priority, lane in self._lanes.items()
+            },
+            "running_by_agent": dict(self._running_per_agent),
+            "wait_ms_by_priority": {
+                priority: self._percentiles(samples)
+                for priority, samples in self._wait_times.items()
+            },
+            **self._counters
+        }
+
+    def _dispatch(self):
+        """Start as many queued tasks as there are free worker slots"""
+        while len(self._running) < self.max_workers:
+            item = self._next_runnable()
+            if item is None:
+                break
+            self._start(item)
+
+    def _next_runnable(self) -> Optional[ScheduledTask]:
+        for priority in PRIORITY_ORDER:
+            if priority != "urgent" and len(self._running) >= self.max_workers - self.urgent_reserved_workers:
+                return None
+
+            lane = self._lanes[priority]
+            for user_id in list(lane):
+                user_queue = lane[user_id]
+                item = user_queue[0]
+                if self._running_per_agent.get(item.agent_type, 0) >= self.max_concurrency_per_agent:
+                    continue
+
+                user_queue.popleft()
+                # Move the user to the back of the lane for round-robin fairness
+                del lane[user_id]
+                if user_queue:
+                    lane[user_id] = user_queue
+                return item
+
+        return None
+
+    def _start(self, item: ScheduledTask):
+        self._forget_queued(item)
+        self._wait_times[item.priority].append((time.monotonic() - item.enqueued_at) * 1000)
+        self._running_per_agent[item.agent_type] = self._running_per_agent.get(item.agent_type, 0) + 1
+        task = asyncio.create_task(self._executor(item.task_id))
+        self._running[item.task_id] = task
+        # A done callback (rather than try/finally) also fires for tasks cancelled before they start
+        task.add_done_callback(lambda finished: self._finish(item, finished))
+
+    def _finish(self, item: ScheduledTask, task: asyncio.Task):
+        if task.cancelled():
+            self._counters["cancelled"] += 1
+            logger.info(f"AI task {item.task_id} cancelled while running")
+        elif task.exception() is not None:
+            self._counters["failed"] += 1
+            logger.error(f"AI task {item.task_id} raised in scheduler: {task.exception()}")
+        else:
+            self._counters["completed"] += 1
+
+        self._running.pop(item.task_id, None)
+        self._running_per_agent[item.agent_type] -= 1
+        if not self._running_per_agent[item.agent_type]:
+            del self._running_per_agent[item.agent_type]
+        self._dispatch()
+
+    def _forget_queued(self, item: ScheduledTask):
+        del self._queued[item.task_id]
+        remaining = self._queued_per_user[item.user_id] - 1
+        if remaining:
+            self._queued_per_user[item.user_id] = remaining
+        else:
+            del self._queued_per_user[item.user_id]
+
+    @staticmethod
+    def _percentiles(samples: Deque[float]) -> Dict[str, float]:
+        if not samples:
+            return {"p50": 0.0, "p99": 0.0}
+        ordered: List[float] = sorted(samples)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 1),
+            "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 1)
+        }
+
+
+__all__ = ["AITaskScheduler", "AIQueueFullError", "ScheduledTask", "PRIORITY_ORDER"]
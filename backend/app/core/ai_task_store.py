@@ -0,0 +1,179 @@
+"""
+AI Task Store for CounselFlow
+Bounded, TTL-based retention of AI task state with optional spill to Redis
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("counselflow.ai.tasks")
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def is_task_owner(task: Dict[str, Any], user_id: Any) -> bool:
+    """Owner check that holds for in-memory tasks and spilled ones, whose ids come back as strings"""
+    return str(task.get("user_id")) == str(user_id)
+
+
+class AITaskStore:
+    """
+    Dict-like store for orchestrator tasks
+
+    Live tasks (pending, queued, processing) are always kept. Once a task is
+    marked finished it is compacted, dropping bulky request fields, and kept
+    for ``result_ttl_seconds``. Finished tasks are also evicted oldest first
+    once the store holds more than ``max_entries`` tasks. All lookups are O(1)
+    and expiry is amortised O(1) per write, so memory stays flat with uptime.
+    When a Redis URL is given, finished results are spilled there so they can
+    still be fetched with load() after they leave memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        result_ttl_seconds: int = 3600,
+        compact_fields: Tuple[str, ...] = ("query", "context"),
+        redis_url: Optional[str] = None,
+        spill_ttl_seconds: int = 86400,
+        key_prefix: str = "ai_task"
+    ):
+        self.max_entries = max_entries
+        self.result_ttl_seconds = result_ttl_seconds
+        self.compact_fields = compact_fields
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self.key_prefix = key_prefix
+
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # Finished task ids in finish order -> monotonic expiry time
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._metrics = {"expired": 0, "evicted": 0, "spilled": 0, "spill_hits": 0}
+
+        self.redis_client = None
+        if redis_url:
+            self._setup_redis(redis_url)
+
+    def _setup_redis(self, redis_url: str):
+        """Setup the Redis spill tier"""
+        try:
+            import redis.asyncio as aioredis
+
+            self.redis_client = aioredis.from_url(redis_url, decode_responses=True)
+        except Exception as e:
+            logger.warning(f"AI task store Redis spill unavailable: {e}")
+            self.redis_client = None
+
+    def __setitem__(self, task_id: str, task: Dict[str, Any]):
+        self._purge_expired()
+        self._tasks[task_id] = task
+        self._enforce_max_entries()
+
+    def __getitem__(self, task_id: str) -> Dict[str, Any]:
+        return self._tasks[task_id]
+
+    def __contains__(self, task_id: object) -> bool:
+        return task_id in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tasks)
+
+    def get(self, task_id: str, default: Any = None) -> Optional[Dict[str, Any]]:
+        return self._tasks.get(task_id, default)
+
+    def values(self):
+        return self._tasks.values()
+
+    def items(self):
+        return self._tasks.items()
+
+    def discard(self, task_id: str):
+        """Forget a task immediately, e.g. one that was never accepted"""
+        self._tasks.pop(task_id, None)
+        self._finished.pop(task_id, None)
+
+    async def finish(self, task_id: str):
+        """Mark a task as finished: compact it, start its TTL and spill it"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return
+
+        for field_name in self.compact_fields:
+            task.pop(field_name, None)
+
+        self._finished.pop(task_id, None)
+        self._finished[task_id] = time.monotonic() + self.result_ttl_seconds
+        self._purge_expired()
+
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(
+                    self._redis_key(task_id),
+                    json.dumps(task, default=_json_default),
+                    ex=self.spill_ttl_seconds
+                )
+                self._metrics["spilled"] += 1
+            except Exception as e:
+                logger.warning(f"Failed to spill AI task {task_id} to Redis: {e}")
+
+    async def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task from memory, falling back to the spill tier"""
+        task = self._tasks.get(task_id)
+        if task is not None or self.redis_client is None:
+            return task
+
+        try:
+            raw = await self.redis_client.get(self._redis_key(task_id))
+        except Exception as e:
+            logger.warning(f"Failed to load AI task {task_id} from Redis: {e}")
+            return None
+
+        if raw is None:
+            return None
+        self._metrics["spill_hits"] += 1
+        return json.loads(raw)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get retention statistics"""
+        self._purge_expired()
+        return {
+            "entries": len(self._tasks),
+            "finished_entries": len(self._finished),
+            "max_entries": self.max_entries,
+            "result_ttl_seconds": self.result_ttl_seconds,
+            "spill_enabled": self.redis_client is not None,
+            **self._metrics
+        }
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        while self._finished:
+            task_id, expires_at = next(iter(self._finished.items()))
+            if expires_at > now:
+                break
+            del self._finished[task_id]
+            self._tasks.pop(task_id, None)
+            self._metrics["expired"] += 1
+
+    def _enforce_max_entries(self):
+        # Only finished tasks are evicted; live tasks are bounded by the scheduler
+        while len(self._tasks) > self.max_entries and self._finished:
+            task_id, _ = self._finished.popitem(last=False)
+            self._tasks.pop(task_id, None)
+            self._metrics["evicted"] += 1
+
+    def _redis_key(self, task_id: str) -> str:
+        return f"{self.key_prefix}:{task_id}"
+
+
+__all__ = ["AITaskStore", "is_task_owner"]
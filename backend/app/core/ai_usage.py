@@ -0,0 +1,309 @@
+"""
+AI Usage Accounting for CounselFlow
+Token, cost and latency accounting per task, user and firm with daily budgets
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.ai_batch import estimate_tokens
+
+logger = logging.getLogger("counselflow.ai.usage")
+
+
+class BudgetDecision(str, Enum):
+    """What to do with a new task given its tenant's spend so far"""
+    ALLOW = "allow"
+    DOWNGRADE = "downgrade"
+    THROTTLE = "throttle"
+
+
+class AIBudgetExceededError(Exception):
+    """Raised when a user or firm has used up its AI token budget"""
+
+
+@dataclass
+class UsageTotals:
+    """Accumulated usage for one scope"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    latency_seconds: float = 0.0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "UsageTotals"):
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost_usd += other.cost_usd
+        self.latency_seconds += other.latency_seconds
+        self.calls += other.calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "avg_latency_seconds": round(self.latency_seconds / self.calls, 3) if self.calls else 0.0
+        }
+
+
+class StreamedUsage:
+    """
+    Token counts for a streamed agent run
+
+    Streamed responses carry no usage for the OpenAI callback to read, so
+    each model call's prompt and completion tokens are estimated from the
+    text sent and received. When a chunk reports ``usage_metadata`` (newer
+    providers send it on the last chunk), those counts replace the estimate
+    for that call.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated = False
+        self._call: Optional[Dict[str, Any]] = None
+
+    def start_call(self, prompt: str):
+        """Begin a model call with the given prompt text"""
+        self._close_call()
+        self._call = {"prompt": estimate_tokens(prompt), "completion": [], "reported": None}
+
+    def add_chunk(self, content: str, usage_metadata: Optional[Dict[str, int]] = None):
+        """Count one streamed chunk of the current call"""
+        if self._call is None:
+            self.start_call("")
+        if content:
+            self._call["completion"].append(content)
+        if usage_metadata:
+            self._call["reported"] = usage_metadata
+
+    def totals(self) -> Dict[str, Any]:
+        self._close_call()
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "estimated": self.estimated
+        }
+
+    def _close_call(self):
+        call, self._call = self._call, None
+        if call is None:
+            return
+        reported = call["reported"]
+        if reported:
+            self.prompt_tokens += reported.get("input_tokens", 0)
+            self.completion_tokens += reported.get("output_tokens", 0)
+        else:
+            self.estimated = True
+            self.prompt_tokens += call["prompt"]
+            if call["completion"]:
+                self.completion_tokens += estimate_tokens("".join(call["completion"]))
+
+
+class AIUsageAccountant:
+    """
+    In-memory usage aggregation with periodic flushes
+
+    Usage is aggregated per user and per firm for the current UTC day and
+    checked against daily token budgets: past ``downgrade_threshold`` of a
+    budget tasks run on a cheaper model, and at the budget new tasks are
+    throttled. Deltas since the last flush are written to Redis (when
+    configured) or the usage log every ``flush_interval_seconds`` by a
+    background timer (see ``start``), under the day they were recorded on.
+    Budgets are enforced per process; the flushed Redis totals are
+    cluster-wide.
+    """
+
+    def __init__(
+        self,
+        firm_daily_token_budget: int = 0,
+        user_daily_token_budget: int = 0,
+        downgrade_threshold: float = 0.8,
+        flush_interval_seconds: int = 60,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "ai_usage"
+    ):
+        self.firm_daily_token_budget = firm_daily_token_budget
+        self.user_daily_token_budget = user_daily_token_budget
+        self.downgrade_threshold = downgrade_threshold
+        self.flush_interval_seconds = flush_interval_seconds
+        self.key_prefix = key_prefix
+
+        self._firm_budgets: Dict[str, int] = {}
+        self._day = self._today()
+        self._daily: Dict[Tuple[str, str], UsageTotals] = {}
+        # (day, scope, id) -> usage not yet flushed; the day survives a roll-over
+        self._pending: Dict[Tuple[str, str, str], UsageTotals] = {}
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[asyncio.Task] = None
+
+        self.redis_client = None
+        if redis_url:
+            self._setup_redis(redis_url)
+
+    def _setup_redis(self, redis_url: str):
+        """Setup Redis for flushed usage totals"""
+        try:
+            import redis.asyncio as aioredis
+
+            self.redis_client = aioredis.from_url(redis_url, decode_responses=True)
+        except Exception as e:
+            logger.warning(f"AI usage Redis sink unavailable: {e}")
+            self.redis_client = None
+
+    def set_firm_budget(self, firm_id: str, daily_tokens: int):
+        """Override the daily token budget for one firm (0 means unlimited)"""
+        self._firm_budgets[firm_id] = daily_tokens
+
+    def record(
+        self,
+        user_id: str,
+        firm_id: Optional[str],
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost_usd: float,
+        latency_seconds: float
+    ) -> UsageTotals:
+        """Record one agent invocation and return it as a UsageTotals"""
+        self._roll_day()
+        usage = UsageTotals(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=cost_usd,
+            latency_seconds=latency_seconds,
+            calls=1
+        )
+
+        scopes = [("user", user_id)]
+        if firm_id:
+            scopes.append(("firm", firm_id))
+        for scope in scopes:
+            self._daily.setdefault(scope, UsageTotals()).add(usage)
+            self._pending.setdefault((self._day, *scope), UsageTotals()).add(usage)
+
+        return usage
+
+    def check_budget(self, user_id: str, firm_id: Optional[str]) -> BudgetDecision:
+        """Decide whether a new task may run, and on which model tier"""
+        self._roll_day()
+        fractions = [self._fraction_used(("user", user_id), self.user_daily_token_budget)]
+        if firm_id:
+            firm_budget = self._firm_budgets.get(firm_id, self.firm_daily_token_budget)
+            fractions.append(self._fraction_used(("firm", firm_id), firm_budget))
+
+        used = max(fractions)
+        if used >= 1.0:
+            return BudgetDecision.THROTTLE
+        if used >= self.downgrade_threshold:
+            return BudgetDecision.DOWNGRADE
+        return BudgetDecision.ALLOW
+
+    def get_usage(self, scope: str, scope_id: str) -> Dict[str, Any]:
+        """Get today's usage for a user or firm"""
+        self._roll_day()
+        totals = self._daily.get((scope, scope_id), UsageTotals())
+        budget = self.user_daily_token_budget if scope == "user" else self._firm_budgets.get(
+            scope_id, self.firm_daily_token_budget
+        )
+        return {
+            "scope": scope,
+            "id": scope_id,
+            "day": self._day,
+            "daily_token_budget": budget or None,
+            **totals.to_dict()
+        }
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get today's usage across all users and firms"""
+        self._roll_day()
+        overall = UsageTotals()
+        for (scope, _), totals in self._daily.items():
+            if scope == "user":
+                overall.add(totals)
+        return {
+            "day": self._day,
+            "users": sum(1 for scope, _ in self._daily if scope == "user"),
+            "firms": sum(1 for scope, _ in self._daily if scope == "firm"),
+            **overall.to_dict()
+        }
+
+    def start(self):
+        """Start the periodic flush timer; call from a running event loop"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Stop the flush timer and flush what is left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Periodic AI usage flush failed: {e}")
+
+    async def maybe_flush(self):
+        """Flush if the flush interval has elapsed"""
+        if time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """Write usage deltas accumulated since the last flush"""
+        pending, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        for (day, scope, scope_id), totals in pending.items():
+            if self.redis_client is not None:
+                key = f"{self.key_prefix}:{day}:{scope}:{scope_id}"
+                try:
+                    pipe = self.redis_client.pipeline()
+                    pipe.hincrby(key, "prompt_tokens", totals.prompt_tokens)
+                    pipe.hincrby(key, "completion_tokens", totals.completion_tokens)
+                    pipe.hincrbyfloat(key, "cost_usd", totals.cost_usd)
+                    pipe.hincrbyfloat(key, "latency_seconds", totals.latency_seconds)
+                    pipe.hincrby(key, "calls", totals.calls)
+                    pipe.expire(key, 90 * 24 * 3600)
+                    await pipe.execute()
+                    continue
+                except Exception as e:
+                    logger.warning(f"Failed to flush AI usage to Redis: {e}")
+
+            logger.info(f"AI usage {day} {scope}={scope_id}: {totals.to_dict()}")
+
+    def _fraction_used(self, scope: Tuple[str, str], budget: int) -> float:
+        if not budget:
+            return 0.0
+        totals = self._daily.get(scope)
+        return totals.total_tokens / budget if totals else 0.0
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            # Pending deltas keep their own day, so the next flush files them correctly
+            self._day = today
+            self._daily = {}
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.utcnow().date().isoformat()
+
+
+__all__ = ["AIUsageAccountant", "UsageTotals", "StreamedUsage", "BudgetDecision", "AIBudgetExceededError"]
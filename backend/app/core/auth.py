@@ -10,6 +10,7 @@ import qrcode
 import pyotp
 import io
 import base64
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from fastapi import HTTPException, status, Depends
@@ -19,7 +20,7 @@ from email_validator import validate_email, EmailNotValidError
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.models import User, UserRole, AuditLog
+from app.models import User, UserRole, AuditLog, Client, ClientAccess, Matter, Document
 from app.core.security import ClientPrivilegeProtector, SecurityLevel
 
 security = HTTPBearer()
@@ -525,6 +526,47 @@ def require_security_clearance(min_level: SecurityLevel):
     
     return clearance_checker
 
+def _as_uuid(value: Any) -> Optional[uuid.UUID]:
+    try:
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
+def can_access_client(db: Session, user: User, client_id: Any) -> bool:
+    """
+    Whether a user may see a client's data: the client must belong to the
+    user's firm, and the user must be a firm admin or partner or hold an
+    active, unexpired client access grant
+    """
+    client_uuid = _as_uuid(client_id)
+    client = db.query(Client).filter(Client.id == client_uuid).first() if client_uuid else None
+    if client is None or user.firm_id is None or client.law_firm_id != user.firm_id:
+        return False
+    
+    if user.role in (UserRole.ADMIN.value, UserRole.PARTNER.value):
+        return True
+    
+    grant = db.query(ClientAccess).filter(
+        ClientAccess.user_id == user.id,
+        ClientAccess.client_id == client.id,
+        ClientAccess.is_active.is_(True)
+    ).first()
+    return grant is not None and (grant.expires_at is None or grant.expires_at > datetime.utcnow())
+
+def can_access_matter(db: Session, user: User, matter_id: Any) -> bool:
+    """Whether a user may see a matter: its lead attorney, or anyone with access to its client"""
+    matter_uuid = _as_uuid(matter_id)
+    matter = db.query(Matter).filter(Matter.id == matter_uuid).first() if matter_uuid else None
+    if matter is None:
+        return False
+    return matter.lead_attorney_id == user.id or can_access_client(db, user, matter.client_id)
+
+def can_access_document(db: Session, user: User, document_id: Any) -> bool:
+    """Whether a user may see a document, through its matter"""
+    document_uuid = _as_uuid(document_id)
+    document = db.query(Document).filter(Document.id == document_uuid).first() if document_uuid else None
+    return document is not None and can_access_matter(db, user, document.matter_id)
+
 def check_permissions(user_permissions: List[str], required_permission: str) -> bool:
     """
     Check if user has the required permission
@@ -3,7 +3,7 @@ Core configuration settings for CounselFlow API
 """
 
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -67,9 +67,132 @@ class Settings(BaseSettings):
     LANGCHAIN_TRACING_V2: bool = Field(default=False, env="LANGCHAIN_TRACING_V2")
     LANGCHAIN_API_KEY: Optional[str] = Field(default=None, env="LANGCHAIN_API_KEY")
     
+    # AI conversation memory (per session / matter)
+    AI_MEMORY_MAX_MESSAGES_PER_KEY: int = Field(default=20, env="AI_MEMORY_MAX_MESSAGES_PER_KEY")
+    AI_MEMORY_MAX_KEYS: int = Field(default=1000, env="AI_MEMORY_MAX_KEYS")
+    AI_MEMORY_MAX_TOTAL_CHARS: int = Field(default=20_000_000, env="AI_MEMORY_MAX_TOTAL_CHARS")
+    
+    # AI task scheduler
+    AI_SCHEDULER_MAX_WORKERS: int = Field(default=16, env="AI_SCHEDULER_MAX_WORKERS")
+    AI_SCHEDULER_MAX_PER_AGENT: int = Field(default=4, env="AI_SCHEDULER_MAX_PER_AGENT")
+    AI_SCHEDULER_MAX_QUEUE_SIZE: int = Field(default=500, env="AI_SCHEDULER_MAX_QUEUE_SIZE")
+    AI_SCHEDULER_MAX_QUEUED_PER_USER: int = Field(default=50, env="AI_SCHEDULER_MAX_QUEUED_PER_USER")
+    AI_SCHEDULER_URGENT_RESERVED: int = Field(default=2, env="AI_SCHEDULER_URGENT_RESERVED")
+    
+    # AI task result retention
+    AI_TASK_STORE_MAX_ENTRIES: int = Field(default=10000, env="AI_TASK_STORE_MAX_ENTRIES")
+    AI_TASK_RESULT_TTL_SECONDS: int = Field(default=3600, env="AI_TASK_RESULT_TTL_SECONDS")
+    AI_TASK_SPILL_TO_REDIS: bool = Field(default=False, env="AI_TASK_SPILL_TO_REDIS")
+    AI_TASK_SPILL_TTL_SECONDS: int = Field(default=86400, env="AI_TASK_SPILL_TTL_SECONDS")
+    
+    # AI response cache
+    AI_RESPONSE_CACHE_ENABLED: bool = Field(default=True, env="AI_RESPONSE_CACHE_ENABLED")
+    AI_RESPONSE_CACHE_TTL_SECONDS: int = Field(default=3600, env="AI_RESPONSE_CACHE_TTL_SECONDS")
+    AI_RESPONSE_CACHE_MAX_ENTRIES: int = Field(default=2000, env="AI_RESPONSE_CACHE_MAX_ENTRIES")
+    AI_RESPONSE_CACHE_USE_REDIS: bool = Field(default=False, env="AI_RESPONSE_CACHE_USE_REDIS")
+    AI_RESPONSE_CACHE_AGENT_TYPES: str = Field(
+        default="contract_analysis,document_reviewer", env="AI_RESPONSE_CACHE_AGENT_TYPES"
+    )
+    
+    # AI usage accounting and budgets (0 means unlimited)
+    AI_FIRM_DAILY_TOKEN_BUDGET: int = Field(default=0, env="AI_FIRM_DAILY_TOKEN_BUDGET")
+    AI_USER_DAILY_TOKEN_BUDGET: int = Field(default=0, env="AI_USER_DAILY_TOKEN_BUDGET")
+    AI_BUDGET_DOWNGRADE_THRESHOLD: float = Field(default=0.8, env="AI_BUDGET_DOWNGRADE_THRESHOLD")
+    AI_DOWNGRADE_MODEL: str = Field(default="gpt-3.5-turbo", env="AI_DOWNGRADE_MODEL")
+    AI_USAGE_FLUSH_INTERVAL_SECONDS: int = Field(default=60, env="AI_USAGE_FLUSH_INTERVAL_SECONDS")
+    AI_USAGE_FLUSH_TO_REDIS: bool = Field(default=False, env="AI_USAGE_FLUSH_TO_REDIS")
+    
+    # AI agent tools
+    AI_TOOL_THREAD_POOL_SIZE: int = Field(default=8, env="AI_TOOL_THREAD_POOL_SIZE")
+    AI_TOOL_TIMEOUT_SECONDS: float = Field(default=30.0, env="AI_TOOL_TIMEOUT_SECONDS")
+    
+    # AI batch document analysis
+    AI_BATCH_MAX_CONCURRENCY: int = Field(default=4, env="AI_BATCH_MAX_CONCURRENCY")
+    AI_BATCH_TOKEN_BUDGET: int = Field(default=6000, env="AI_BATCH_TOKEN_BUDGET")
+    
+    # Legal database search fan-out
+    LEGAL_DB_SEARCH_DEADLINE_SECONDS: float = Field(default=3.0, env="LEGAL_DB_SEARCH_DEADLINE_SECONDS")
+    LEGAL_DB_CONNECTOR_TIMEOUT_SECONDS: float = Field(default=2.5, env="LEGAL_DB_CONNECTOR_TIMEOUT_SECONDS")
+    LEGAL_DB_CONNECTOR_TIMEOUTS: str = Field(default="local:1.0", env="LEGAL_DB_CONNECTOR_TIMEOUTS")
+    LEGAL_DB_HEDGE_AFTER_SECONDS: Optional[float] = Field(default=None, env="LEGAL_DB_HEDGE_AFTER_SECONDS")
+    LEGAL_DB_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, env="LEGAL_DB_BREAKER_FAILURE_THRESHOLD")
+    LEGAL_DB_BREAKER_RESET_SECONDS: float = Field(default=30.0, env="LEGAL_DB_BREAKER_RESET_SECONDS")
+    
+    # Legal database search cache (connector TTLs as "name:seconds,...")
+    LEGAL_DB_CACHE_ENABLED: bool = Field(default=True, env="LEGAL_DB_CACHE_ENABLED")
+    LEGAL_DB_CACHE_MAX_ENTRIES: int = Field(default=5000, env="LEGAL_DB_CACHE_MAX_ENTRIES")
+    LEGAL_DB_CACHE_TTL_SECONDS: int = Field(default=3600, env="LEGAL_DB_CACHE_TTL_SECONDS")
+    LEGAL_DB_CACHE_CONNECTOR_TTLS: str = Field(
+        default="westlaw:21600,lexisnexis:21600,courtlistener:3600", env="LEGAL_DB_CACHE_CONNECTOR_TTLS"
+    )
+    LEGAL_DB_CACHE_STALE_TTL_SECONDS: int = Field(default=86400, env="LEGAL_DB_CACHE_STALE_TTL_SECONDS")
+    LEGAL_DB_CACHE_USE_REDIS: bool = Field(default=False, env="LEGAL_DB_CACHE_USE_REDIS")
+    
+    # Legal database HTTP clients
+    LEGAL_DB_HTTP_MAX_CONNECTIONS: int = Field(default=100, env="LEGAL_DB_HTTP_MAX_CONNECTIONS")
+    LEGAL_DB_HTTP_MAX_CONNECTIONS_PER_HOST: int = Field(default=20, env="LEGAL_DB_HTTP_MAX_CONNECTIONS_PER_HOST")
+    LEGAL_DB_HTTP_KEEPALIVE_SECONDS: float = Field(default=60.0, env="LEGAL_DB_HTTP_KEEPALIVE_SECONDS")
+    LEGAL_DB_HTTP2_ENABLED: bool = Field(default=True, env="LEGAL_DB_HTTP2_ENABLED")
+    COURTLISTENER_BASE_URL: str = Field(default="https://www.courtlistener.com", env="COURTLISTENER_BASE_URL")
+    COURTLISTENER_API_TOKEN: Optional[str] = Field(default=None, env="COURTLISTENER_API_TOKEN")
+    
+    # Local legal search index
+    LEGAL_DB_LOCAL_INDEX_DIR: str = Field(default="./cache/legal_index", env="LEGAL_DB_LOCAL_INDEX_DIR")
+    LEGAL_DB_LOCAL_SCORE_SCALE: float = Field(default=10.0, env="LEGAL_DB_LOCAL_SCORE_SCALE")
+    
     # LlamaIndex Settings
     LLAMA_INDEX_CACHE_DIR: str = Field(default="./cache", env="LLAMA_INDEX_CACHE_DIR")
     
+    # Matter retrieval index (persisted under LLAMA_INDEX_CACHE_DIR)
+    AI_RETRIEVAL_ENABLED: bool = Field(default=True, env="AI_RETRIEVAL_ENABLED")
+    AI_RETRIEVAL_TOP_K: int = Field(default=5, env="AI_RETRIEVAL_TOP_K")
+    AI_RETRIEVAL_CHUNK_SIZE: int = Field(default=512, env="AI_RETRIEVAL_CHUNK_SIZE")
+    AI_RETRIEVAL_CHUNK_OVERLAP: int = Field(default=64, env="AI_RETRIEVAL_CHUNK_OVERLAP")
+    AI_RETRIEVAL_MAX_LOADED_INDEXES: int = Field(default=32, env="AI_RETRIEVAL_MAX_LOADED_INDEXES")
+    
+    # Embeddings: "openai", or "local" for offline CPU embeddings with NumPy vector search
+    AI_EMBEDDING_BACKEND: str = Field(default="openai", env="AI_EMBEDDING_BACKEND")
+    AI_LOCAL_EMBEDDING_MODEL_PATH: Optional[str] = Field(default=None, env="AI_LOCAL_EMBEDDING_MODEL_PATH")
+    AI_LOCAL_EMBEDDING_DIM: int = Field(default=768, env="AI_LOCAL_EMBEDDING_DIM")
+    AI_LOCAL_EMBEDDING_BATCH_SIZE: int = Field(default=256, env="AI_LOCAL_EMBEDDING_BATCH_SIZE")
+    AI_SIMILARITY_DUPLICATE_THRESHOLD: float = Field(default=0.95, env="AI_SIMILARITY_DUPLICATE_THRESHOLD")
+    AI_SIMILARITY_RELATED_THRESHOLD: float = Field(default=0.75, env="AI_SIMILARITY_RELATED_THRESHOLD")
+    
+    # Document version storage: "delta" keeps keyframes plus compressed reverse deltas, "full" a copy per version
+    DOCUMENT_VERSION_STORAGE_MODE: str = Field(default="delta", env="DOCUMENT_VERSION_STORAGE_MODE")
+    DOCUMENT_VERSION_KEYFRAME_INTERVAL: int = Field(default=20, env="DOCUMENT_VERSION_KEYFRAME_INTERVAL")
+    DOCUMENT_VERSION_CACHE_MAX_ENTRIES: int = Field(default=256, env="DOCUMENT_VERSION_CACHE_MAX_ENTRIES")
+    DOCUMENT_VERSION_CACHE_MAX_CHARS: int = Field(default=64 * 1024 * 1024, env="DOCUMENT_VERSION_CACHE_MAX_CHARS")
+    
+    # Background side effects of saved versions (diff, notify, audit, re-index)
+    DOCUMENT_VERSION_PIPELINE_CONCURRENCY: int = Field(default=8, env="DOCUMENT_VERSION_PIPELINE_CONCURRENCY")
+    DOCUMENT_VERSION_PIPELINE_MAX_ATTEMPTS: int = Field(default=4, env="DOCUMENT_VERSION_PIPELINE_MAX_ATTEMPTS")
+    
+    # WebSocket fan-out: sends slower than this, or a full send queue on a
+    # non-droppable message, evict the consumer; droppable types shed the oldest
+    WEBSOCKET_SEND_TIMEOUT_SECONDS: float = Field(default=5.0, env="WEBSOCKET_SEND_TIMEOUT_SECONDS")
+    WEBSOCKET_SEND_QUEUE_SIZE: int = Field(default=256, env="WEBSOCKET_SEND_QUEUE_SIZE")
+    WEBSOCKET_DROPPABLE_MESSAGE_TYPES: str = Field(
+        default="presence_batch,user_activity,heartbeat",
+        env="WEBSOCKET_DROPPABLE_MESSAGE_TYPES"
+    )
+    # Cross-worker WebSocket routing and presence over Redis pub/sub
+    WEBSOCKET_BACKPLANE_USE_REDIS: bool = Field(default=False, env="WEBSOCKET_BACKPLANE_USE_REDIS")
+    WEBSOCKET_BACKPLANE_CHANNEL: str = Field(default="counselflow:ws", env="WEBSOCKET_BACKPLANE_CHANNEL")
+    WEBSOCKET_PRESENCE_TTL_SECONDS: float = Field(default=30.0, env="WEBSOCKET_PRESENCE_TTL_SECONDS")
+    
+    # Collaborative editing (operational transformation) sessions
+    COLLAB_SNAPSHOT_EVERY_OPS: int = Field(default=200, env="COLLAB_SNAPSHOT_EVERY_OPS")
+    COLLAB_SNAPSHOT_INTERVAL_SECONDS: float = Field(default=30.0, env="COLLAB_SNAPSHOT_INTERVAL_SECONDS")
+    COLLAB_IDLE_EVICT_SECONDS: float = Field(default=300.0, env="COLLAB_IDLE_EVICT_SECONDS")
+    COLLAB_HISTORY_LIMIT: int = Field(default=1000, env="COLLAB_HISTORY_LIMIT")
+    COLLAB_PRESENCE_TICK_HZ: float = Field(default=20.0, env="COLLAB_PRESENCE_TICK_HZ")
+    
+    # Version diffs: computed in a "process" or "thread" pool within a time budget
+    DOCUMENT_DIFF_EXECUTOR: str = Field(default="process", env="DOCUMENT_DIFF_EXECUTOR")
+    DOCUMENT_DIFF_WORKERS: int = Field(default=2, env="DOCUMENT_DIFF_WORKERS")
+    DOCUMENT_DIFF_TIME_BUDGET_SECONDS: float = Field(default=2.0, env="DOCUMENT_DIFF_TIME_BUDGET_SECONDS")
+    
     # File Storage
     UPLOAD_FOLDER: str = Field(default="./uploads", env="UPLOAD_FOLDER")
     MAX_UPLOAD_SIZE: int = Field(default=50 * 1024 * 1024, env="MAX_UPLOAD_SIZE")  # 50MB
@@ -172,6 +295,36 @@ class Settings(BaseSettings):
         """Return allowed file types as a list"""
         return [ext.strip() for ext in self.ALLOWED_FILE_TYPES.split(",")]
 
+    @property
+    def ai_response_cache_agent_types_list(self) -> List[str]:
+        """Return the agent types whose answers may be cached as a list"""
+        return [agent.strip() for agent in self.AI_RESPONSE_CACHE_AGENT_TYPES.split(",") if agent.strip()]
+
+    @property
+    def websocket_droppable_message_types_list(self) -> List[str]:
+        """Return the WebSocket message types that may be dropped under backpressure as a list"""
+        return [kind.strip() for kind in self.WEBSOCKET_DROPPABLE_MESSAGE_TYPES.split(",") if kind.strip()]
+
+    @property
+    def legal_db_cache_connector_ttls(self) -> Dict[str, int]:
+        """Return the per-connector search cache TTLs as a dict"""
+        ttls = {}
+        for item in self.LEGAL_DB_CACHE_CONNECTOR_TTLS.split(","):
+            if ":" in item:
+                name, seconds = item.split(":", 1)
+                ttls[name.strip()] = int(seconds)
+        return ttls
+
+    @property
+    def legal_db_connector_timeouts(self) -> Dict[str, float]:
+        """Return the per-connector search timeouts as a dict"""
+        timeouts = {}
+        for item in self.LEGAL_DB_CONNECTOR_TIMEOUTS.split(","):
+            if ":" in item:
+                name, seconds = item.split(":", 1)
+                timeouts[name.strip()] = float(seconds)
+        return timeouts
+
     @property
     def cors_origins_list(self) -> List[str]:
         """Return CORS origins as a list"""
@@ -2,7 +2,6 @@
 WebSocket Manager for Real-time Communication
 Handles real-time notifications, live updates, and collaboration features
 """
-import json
 import asyncio
 import logging
 from typing import Dict, List, Set, Optional, Any
@@ -11,6 +10,10 @@ from fastapi import WebSocket, WebSocketDisconnect
 from enum import Enum
 import uuid
 
+from app.core.config import settings
+from app.core.websocket_backplane import TARGET_ALL, TARGET_ROOM, TARGET_USER, Backplane, create_backplane
+from app.core.websocket_fanout import ConnectionSender, encode_message, json_encoder_name, message_type
+
 logger = logging.getLogger(__name__)
 
 class MessageType(str, Enum):
@@ -29,23 +32,60 @@ class MessageType(str, Enum):
     HEARTBEAT = "heartbeat"
 
 class ConnectionManager:
-    """Manages WebSocket connections and message broadcasting"""
+    """
+    Manages WebSocket connections and message broadcasting
+    
+    Every message is encoded once and put on each target connection's
+    bounded send queue, which its own writer task drains, so producers never
+    wait on the network. A full queue sheds the oldest presence-like message;
+    for any other message, or a send that fails or exceeds
+    ``send_timeout_seconds``, the connection is evicted so the client
+    reconnects and resyncs.
     
-    def __init__(self):
+    User, room and broadcast messages are also published once on the
+    backplane, which delivers them to the sockets held by other workers;
+    with the Redis backplane, ``get_active_users`` covers the whole cluster.
+    The application starts the backplane once, at startup. User ids and room
+    ids are keyed by their string form, so a UUID and its text reach the
+    same sockets on every worker.
+    """
+    
+    def __init__(
+        self,
+        send_timeout_seconds: Optional[float] = None,
+        send_queue_size: Optional[int] = None,
+        droppable_types: Optional[List[str]] = None,
+        backplane: Optional[Backplane] = None
+    ):
         # Active connections by user ID
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Connection metadata
         self.connection_metadata: Dict[WebSocket, Dict[str, Any]] = {}
         # Room subscriptions (for specific modules/documents)
         self.room_subscriptions: Dict[str, Set[WebSocket]] = {}
+        # Outbound queue and writer task per connection
+        self.senders: Dict[WebSocket, ConnectionSender] = {}
+        self.send_timeout_seconds = send_timeout_seconds or settings.WEBSOCKET_SEND_TIMEOUT_SECONDS
+        self.send_queue_size = send_queue_size or settings.WEBSOCKET_SEND_QUEUE_SIZE
+        self.droppable_types = (
+            droppable_types if droppable_types is not None else settings.websocket_droppable_message_types_list
+        )
+        self.backplane = backplane or create_backplane(
+            settings.REDIS_URL if settings.WEBSOCKET_BACKPLANE_USE_REDIS else None,
+            channel=settings.WEBSOCKET_BACKPLANE_CHANNEL,
+            presence_ttl_seconds=settings.WEBSOCKET_PRESENCE_TTL_SECONDS
+        )
+        self._metrics = {"messages": 0, "sends": 0, "evicted": 0}
         
     async def connect(self, websocket: WebSocket, user_id: str, client_info: Dict[str, Any] = None):
         """Accept and register a new WebSocket connection"""
         await websocket.accept()
+        user_id = str(user_id)
         
         # Add to user connections
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
+            self.backplane.track(user_id)
         self.active_connections[user_id].add(websocket)
         
         # Store metadata
@@ -55,6 +95,13 @@ class ConnectionManager:
             "client_info": client_info or {},
             "last_heartbeat": datetime.utcnow()
         }
+        self.senders[websocket] = ConnectionSender(
+            websocket,
+            on_failure=self._evict,
+            max_queue=self.send_queue_size,
+            send_timeout_seconds=self.send_timeout_seconds,
+            droppable_types=self.droppable_types
+        )
         
         logger.info(f"WebSocket connected for user {user_id}")
         
@@ -78,60 +125,83 @@ class ConnectionManager:
                 self.active_connections[user_id].discard(websocket)
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
+                    self.backplane.untrack(user_id)
             
             # Remove from room subscriptions
             for room_connections in self.room_subscriptions.values():
                 room_connections.discard(websocket)
             
-            # Remove metadata
+            # Remove metadata and stop the writer
             del self.connection_metadata[websocket]
+            sender = self.senders.pop(websocket, None)
+            if sender is not None:
+                sender.close()
             
             logger.info(f"WebSocket disconnected for user {user_id}")
     
     async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
         """Send message to a specific WebSocket connection"""
-        try:
-            await websocket.send_text(json.dumps(message, default=str))
-        except Exception as e:
-            logger.error(f"Failed to send personal message: {e}")
+        self._fan_out(encode_message(message), message_type(message), (websocket,))
     
     async def send_to_user(self, message: Dict[str, Any], user_id: str):
-        """Send message to all connections for a specific user"""
-        if user_id in self.active_connections:
-            disconnected_connections = []
-            for websocket in self.active_connections[user_id].copy():
-                try:
-                    await websocket.send_text(json.dumps(message, default=str))
-                except Exception as e:
-                    logger.error(f"Failed to send message to user {user_id}: {e}")
-                    disconnected_connections.append(websocket)
-            
-            # Clean up disconnected connections
-            for websocket in disconnected_connections:
-                self.disconnect(websocket)
+        """Send message to all connections for a specific user, on any worker"""
+        await self._route(message, TARGET_USER, str(user_id))
     
     async def broadcast_to_room(self, message: Dict[str, Any], room_id: str):
-        """Send message to all connections in a specific room"""
-        if room_id in self.room_subscriptions:
-            disconnected_connections = []
-            for websocket in self.room_subscriptions[room_id].copy():
-                try:
-                    await websocket.send_text(json.dumps(message, default=str))
-                except Exception as e:
-                    logger.error(f"Failed to broadcast to room {room_id}: {e}")
-                    disconnected_connections.append(websocket)
-            
-            # Clean up disconnected connections
-            for websocket in disconnected_connections:
-                self.disconnect(websocket)
+        """Send message to all connections in a specific room, on any worker"""
+        await self._route(message, TARGET_ROOM, str(room_id))
     
     async def broadcast_to_all(self, message: Dict[str, Any]):
-        """Send message to all active connections"""
-        for user_id in list(self.active_connections.keys()):
-            await self.send_to_user(message, user_id)
+        """Send message to all active connections, on any worker"""
+        await self._route(message, TARGET_ALL, None)
+    
+    async def _route(self, message: Dict[str, Any], target: str, key: Optional[str]):
+        """Deliver to this worker's sockets, then publish for the other workers"""
+        text, kind = encode_message(message), message_type(message)
+        self._deliver(target, key, text, kind)
+        await self.backplane.publish(target, key, text, kind)
+    
+    def _deliver(self, target: str, key: Optional[str], text: str, kind: str):
+        """Queue an encoded message on this worker's sockets for a target"""
+        if target == TARGET_USER:
+            websockets = self.active_connections.get(key, ())
+        elif target == TARGET_ROOM:
+            websockets = self.room_subscriptions.get(key, ())
+        else:
+            websockets = self.connection_metadata.keys()
+        self._fan_out(text, kind, websockets)
+    
+    def _fan_out(self, text: str, kind: str, websockets):
+        """Queue on every target; never waits on the network"""
+        senders = [self.senders[websocket] for websocket in websockets if websocket in self.senders]
+        if not senders:
+            return
+        
+        self._metrics["messages"] += 1
+        self._metrics["sends"] += len(senders)
+        # A sender that overflows evicts its connection via on_failure
+        for sender in senders:
+            sender.enqueue(text, kind)
+    
+    def _evict(self, websocket: WebSocket):
+        """Drop a slow or broken consumer and close its socket in the background"""
+        if websocket not in self.connection_metadata:
+            return
+        self._metrics["evicted"] += 1
+        self.disconnect(websocket)
+        asyncio.create_task(self._close_quietly(websocket))
+    
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            # 1013: try again later; clients reconnect and resync
+            await asyncio.wait_for(websocket.close(code=1013), timeout=1.0)
+        except Exception:
+            pass
     
     def subscribe_to_room(self, websocket: WebSocket, room_id: str):
         """Subscribe a connection to a specific room"""
+        room_id = str(room_id)
         if room_id not in self.room_subscriptions:
             self.room_subscriptions[room_id] = set()
         self.room_subscriptions[room_id].add(websocket)
@@ -140,6 +210,7 @@ class ConnectionManager:
     
     def unsubscribe_from_room(self, websocket: WebSocket, room_id: str):
         """Unsubscribe a connection from a specific room"""
+        room_id = str(room_id)
         if room_id in self.room_subscriptions:
             self.room_subscriptions[room_id].discard(websocket)
             if not self.room_subscriptions[room_id]:
@@ -154,17 +225,40 @@ class ConnectionManager:
                 "data": {"timestamp": datetime.utcnow().isoformat()}
             }, websocket)
     
-    def get_active_users(self) -> List[str]:
-        """Get list of active user IDs"""
-        return list(self.active_connections.keys())
+    async def get_active_users(self) -> List[str]:
+        """Get list of active user IDs across all workers"""
+        return await self.backplane.active_users()
     
     def get_user_connection_count(self, user_id: str) -> int:
         """Get number of active connections for a user"""
-        return len(self.active_connections.get(user_id, set()))
+        return len(self.active_connections.get(str(user_id), set()))
     
     def get_total_connections(self) -> int:
-        """Get total number of active connections"""
+        """Get total number of active connections on this worker"""
         return sum(len(connections) for connections in self.active_connections.values())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get fan-out statistics"""
+        return {
+            **self._metrics,
+            "connections": self.get_total_connections(),
+            "rooms": len(self.room_subscriptions),
+            "queued": sum(sender.pending for sender in self.senders.values()),
+            "dropped": sum(sender.metrics["dropped"] for sender in self.senders.values()),
+            "json_encoder": json_encoder_name(),
+            "backplane": self.backplane.get_stats()
+        }
+    
+    async def start(self):
+        """Begin receiving messages published by other workers"""
+        if not self.backplane.started:
+            await self.backplane.start(self._deliver)
+    
+    async def close(self):
+        """Close every connection's writer and leave the backplane"""
+        for sender in self.senders.values():
+            sender.close()
+        await self.backplane.close()
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
@@ -255,6 +349,20 @@ class NotificationService:
         }
         await connection_manager.send_to_user(message, user_id)
     
+    @staticmethod
+    async def send_ai_stream_event(user_id: str, ai_task_id: str, event: str, data: Dict[str, Any]):
+        """Send a streamed AI task event (token, tool step or completion)"""
+        message = {
+            "type": MessageType.AI_PROGRESS,
+            "data": {
+                "task_id": ai_task_id,
+                "event": event,
+                **data
+            },
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        await connection_manager.send_to_user(message, user_id)
+    
     @staticmethod
     async def send_collaboration_update(room_id: str, user_data: Dict[str, Any], action: str):
         """Send collaboration activity update"""
@@ -0,0 +1,322 @@
+"""
+WebSocket Backplane
+Pub/sub routing of user, room and broadcast messages between workers, with cluster-wide presence
+"""
+import abc
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TARGET_USER = "user"
+TARGET_ROOM = "room"
+TARGET_ALL = "all"
+
+# handler(target, key, text, kind) delivers an encoded message to local sockets
+DeliverHandler = Callable[[str, Optional[str], str, str], None]
+
+
+class Backplane(abc.ABC):
+    """
+    Base class for a message bus shared by every WebSocket worker
+
+    A worker delivers a message to its own sockets and then ``publish``es it
+    once, already encoded; every other worker receives it through the
+    handler given to ``start`` and delivers it to whichever of its sockets
+    match. A worker ignores its own publications, so nothing is sent twice.
+    ``track`` and ``untrack`` record which users have at least one socket on
+    this worker, and ``active_users`` returns the union over all workers.
+    User ids and room keys are strings on the bus; other keys are converted
+    with ``str`` so a UUID user id routes to the same sockets as its text.
+    """
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or uuid.uuid4().hex
+        self.local_users: Set[str] = set()
+        self._handler: Optional[DeliverHandler] = None
+        self._metrics = {"published": 0, "received": 0, "errors": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._handler is not None
+
+    async def start(self, handler: DeliverHandler):
+        """Begin receiving messages published by other workers"""
+        self._handler = handler
+
+    @abc.abstractmethod
+    async def publish(self, target: str, key: Optional[str], text: str, kind: str = ""):
+        """Send an encoded message to every other worker"""
+
+    def track(self, user_id: str):
+        """Record that a user has a socket on this worker"""
+        self.local_users.add(str(user_id))
+
+    def untrack(self, user_id: str):
+        """Record that a user's last socket on this worker has gone"""
+        self.local_users.discard(str(user_id))
+
+    @abc.abstractmethod
+    async def active_users(self) -> List[str]:
+        """Get the users connected to any worker"""
+
+    async def close(self):
+        self._handler = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            "backend": type(self).__name__,
+            "node_id": self.node_id,
+            "local_users": len(self.local_users)
+        }
+
+    def _envelope(self, target: str, key: Optional[str], text: str, kind: str) -> Optional[str]:
+        """Encode a message for the bus, or None (counted as an error) if it cannot be"""
+        try:
+            raw = json.dumps({
+                "node": self.node_id,
+                "target": target,
+                "key": None if key is None else str(key),
+                "kind": kind,
+                "text": text
+            })
+        except (TypeError, ValueError) as e:
+            self._metrics["errors"] += 1
+            logger.error(f"WebSocket backplane could not encode a {target} message: {e}")
+            return None
+        self._metrics["published"] += 1
+        return raw
+
+    def _dispatch(self, raw: str):
+        """Hand a message from the bus to the local handler, skipping our own"""
+        try:
+            envelope = json.loads(raw)
+            if envelope["node"] == self.node_id or self._handler is None:
+                return
+            self._metrics["received"] += 1
+            self._handler(envelope["target"], envelope["key"], envelope["text"], envelope["kind"])
+        except Exception as e:
+            self._metrics["errors"] += 1
+            logger.error(f"WebSocket backplane dispatch failed: {e}")
+
+
+class InMemoryHub:
+    """The shared bus for InMemoryBackplane workers living in one process"""
+
+    def __init__(self):
+        self.nodes: Dict[str, "InMemoryBackplane"] = {}
+
+
+class InMemoryBackplane(Backplane):
+    """
+    Backplane for a single process, and a stand-in for Redis in tests
+
+    Workers created with the same ``hub`` see each other's messages and
+    presence; the default is a private hub, i.e. a one-worker cluster.
+    """
+
+    def __init__(self, hub: Optional[InMemoryHub] = None, node_id: Optional[str] = None):
+        super().__init__(node_id)
+        self.hub = hub or InMemoryHub()
+        self.hub.nodes[self.node_id] = self
+
+    async def publish(self, target: str, key: Optional[str], text: str, kind: str = ""):
+        raw = self._envelope(target, key, text, kind)
+        if raw is None:
+            return
+        for node in list(self.hub.nodes.values()):
+            if node is not self:
+                node._dispatch(raw)
+
+    async def active_users(self) -> List[str]:
+        users: Set[str] = set()
+        for node in self.hub.nodes.values():
+            users.update(node.local_users)
+        return list(users)
+
+    async def close(self):
+        await super().close()
+        self.hub.nodes.pop(self.node_id, None)
+
+
+class RedisBackplane(Backplane):
+    """
+    Backplane over Redis pub/sub, for several workers and nodes
+
+    All workers share one channel; a message for a user or room that has no
+    socket on a worker costs that worker a dictionary lookup. Presence is a
+    Redis set per worker holding its connected users. Each worker rewrites
+    its set every third of ``presence_ttl_seconds`` with that TTL, so users
+    of a crashed worker drop out of ``active_users`` on their own.
+    """
+
+    def __init__(
+        self,
+        redis_client: Any,
+        channel: str = "counselflow:ws",
+        presence_ttl_seconds: float = 30.0,
+        node_id: Optional[str] = None
+    ):
+        super().__init__(node_id)
+        self.redis_client = redis_client
+        self.channel = channel
+        self.presence_ttl_seconds = presence_ttl_seconds
+        self._nodes_key = f"{channel}:nodes"
+        self._presence_key = f"{channel}:presence:{self.node_id}"
+        self._tasks: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self, handler: DeliverHandler):
+        await super().start(handler)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+            self._heartbeat = asyncio.create_task(self._refresh_presence())
+
+    async def publish(self, target: str, key: Optional[str], text: str, kind: str = ""):
+        raw = self._envelope(target, key, text, kind)
+        if raw is None:
+            return
+        try:
+            await self.redis_client.publish(self.channel, raw)
+        except Exception as e:
+            self._metrics["errors"] += 1
+            logger.warning(f"WebSocket backplane publish failed: {e}")
+
+    def track(self, user_id: str):
+        super().track(user_id)
+        self._spawn(self._write_presence(add=str(user_id)))
+
+    def untrack(self, user_id: str):
+        super().untrack(user_id)
+        self._spawn(self._write_presence(remove=str(user_id)))
+
+    async def active_users(self) -> List[str]:
+        try:
+            nodes = list(await self.redis_client.smembers(self._nodes_key))
+            if not nodes:
+                return list(self.local_users)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for node in nodes:
+                pipe.smembers(f"{self.channel}:presence:{node}")
+            members = await pipe.execute()
+        except Exception as e:
+            self._metrics["errors"] += 1
+            logger.warning(f"WebSocket backplane presence read failed, using local users: {e}")
+            return list(self.local_users)
+
+        users: Set[str] = set(self.local_users)
+        expired = []
+        for node, node_users in zip(nodes, members):
+            if node_users:
+                users.update(node_users)
+            elif node != self.node_id:
+                expired.append(node)
+        if expired:
+            # Live workers with no users re-register on their next refresh
+            self._spawn(self.redis_client.srem(self._nodes_key, *expired))
+        return list(users)
+
+    async def close(self):
+        await super().close()
+        for task in (self._listener, self._heartbeat, *self._tasks):
+            if task is not None and not task.done():
+                task.cancel()
+        try:
+            await self.redis_client.delete(self._presence_key)
+            await self.redis_client.srem(self._nodes_key, self.node_id)
+            await self.redis_client.close()
+        except Exception as e:
+            logger.warning(f"WebSocket backplane close failed: {e}")
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_presence(self, add: Optional[str] = None, remove: Optional[str] = None):
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            if add is not None:
+                pipe.sadd(self._presence_key, add)
+                pipe.expire(self._presence_key, int(self.presence_ttl_seconds))
+                pipe.sadd(self._nodes_key, self.node_id)
+            if remove is not None:
+                pipe.srem(self._presence_key, remove)
+            await pipe.execute()
+        except Exception as e:
+            self._metrics["errors"] += 1
+            logger.warning(f"WebSocket backplane presence write failed: {e}")
+
+    async def _refresh_presence(self):
+        while True:
+            try:
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.delete(self._presence_key)
+                if self.local_users:
+                    pipe.sadd(self._presence_key, *self.local_users)
+                    pipe.expire(self._presence_key, int(self.presence_ttl_seconds))
+                    pipe.sadd(self._nodes_key, self.node_id)
+                await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["errors"] += 1
+                logger.warning(f"WebSocket backplane presence refresh failed: {e}")
+            await asyncio.sleep(self.presence_ttl_seconds / 3)
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["errors"] += 1
+                logger.warning(f"WebSocket backplane subscription lost, resubscribing: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+
+def create_backplane(
+    redis_url: Optional[str] = None,
+    channel: str = "counselflow:ws",
+    presence_ttl_seconds: float = 30.0
+) -> Backplane:
+    """Build the Redis backplane when a URL is given, else a single-process one"""
+    if redis_url:
+        try:
+            import redis.asyncio as aioredis
+
+            return RedisBackplane(
+                aioredis.from_url(redis_url, decode_responses=True),
+                channel=channel,
+                presence_ttl_seconds=presence_ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"WebSocket Redis backplane unavailable, messages stay on this worker: {e}")
+    return InMemoryBackplane()
+
+
+__all__ = [
+    "TARGET_USER",
+    "TARGET_ROOM",
+    "TARGET_ALL",
+    "Backplane",
+    "InMemoryHub",
+    "InMemoryBackplane",
+    "RedisBackplane",
+    "create_backplane"
+]
@@ -0,0 +1,132 @@
+"""
+WebSocket Fan-out
+Encode-once message serialization and per-connection bounded send queues with writer tasks
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Collection, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# orjson is optional; it is several times faster than json for large payloads
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serialize a message once for every socket it goes to"""
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(message, default=str)
+
+
+def json_encoder_name() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def message_type(message: Dict[str, Any]) -> str:
+    kind = message.get("type", "")
+    return getattr(kind, "value", kind)
+
+
+class OverflowPolicy(str, Enum):
+    """What to do when a connection's send queue is full"""
+    DROP_OLDEST = "drop_oldest"  # presence-like traffic: a newer frame supersedes older ones
+    DISCONNECT = "disconnect"    # critical traffic: evict the consumer so it reconnects and resyncs
+
+
+class ConnectionSender:
+    """
+    Bounded outbound queue for one WebSocket, drained by its own writer task
+
+    ``enqueue`` never waits on the network, so producers are never blocked
+    by a slow browser. When the queue is full, a message whose type is in
+    ``droppable_types`` replaces the oldest queued droppable message (or is
+    itself dropped if there is none); any other message makes the
+    connection overflow, and ``on_failure(websocket)`` is called so the
+    owner can evict it. A send that fails or exceeds ``send_timeout_seconds``
+    also calls ``on_failure`` and stops the writer.
+    """
+
+    def __init__(
+        self,
+        websocket: Any,
+        on_failure: Callable[[Any], None],
+        max_queue: int = 256,
+        send_timeout_seconds: float = 5.0,
+        droppable_types: Collection[str] = ()
+    ):
+        self.websocket = websocket
+        self.on_failure = on_failure
+        self.max_queue = max_queue
+        self.send_timeout_seconds = send_timeout_seconds
+        self.droppable_types = frozenset(droppable_types)
+
+        self._queue: Deque[Tuple[str, str]] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._writer = asyncio.create_task(self._write())
+        self.metrics = {"sent": 0, "dropped": 0}
+
+    def policy_for(self, kind: str) -> OverflowPolicy:
+        return OverflowPolicy.DROP_OLDEST if kind in self.droppable_types else OverflowPolicy.DISCONNECT
+
+    def enqueue(self, text: str, kind: str = "") -> bool:
+        """Queue an encoded message; returns False if the connection overflowed"""
+        if self._closed:
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy_for(kind) is OverflowPolicy.DISCONNECT:
+                logger.warning(f"WebSocket send queue overflow on {kind or 'message'}, disconnecting consumer")
+                self._fail()
+                return False
+            self.metrics["dropped"] += 1
+            oldest = next((index for index, (queued, _) in enumerate(self._queue) if queued in self.droppable_types), None)
+            if oldest is None:
+                return True  # Only critical messages are queued; the new presence frame goes
+            del self._queue[oldest]
+
+        self._queue.append((kind, text))
+        self._ready.set()
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def close(self):
+        """Stop the writer; queued messages are discarded"""
+        self._closed = True
+        self._queue.clear()
+        if not self._writer.done():
+            self._writer.cancel()
+
+    def _fail(self):
+        if not self._closed:
+            self.close()
+            self.on_failure(self.websocket)
+
+    async def _write(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                _, text = self._queue.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=self.send_timeout_seconds)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"WebSocket send failed, disconnecting consumer: {e!r}")
+                    self._fail()
+                    return
+                self.metrics["sent"] += 1
+            self._ready.clear()
+
+
+__all__ = ["encode_message", "json_encoder_name", "message_type", "OverflowPolicy", "ConnectionSender"]
@@ -673,4 +673,4 @@ Index('idx_risk_assessments_category_level', RiskAssessment.risk_category, RiskA
 Index('idx_risk_assessments_matter_status', RiskAssessment.matter_id, RiskAssessment.status)
 
 # Import document versioning models
-from .document_versioning import DocumentVersion, DocumentComment, DocumentLock, DocumentDiff
+from .document_versioning import DocumentVersion, DocumentComment, DocumentLock, DocumentDiff, DocumentEditState
@@ -2,7 +2,7 @@
 Document Version Control and Collaboration System
 Provides comprehensive document versioning, diff tracking, and real-time collaboration
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON, LargeBinary, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -15,13 +15,21 @@ from app.core.database import Base
 class DocumentVersion(Base):
     """Document version tracking model"""
     __tablename__ = "document_versions"
+    __table_args__ = (
+        UniqueConstraint("document_id", "version_number", name="uq_document_versions_document_number"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
     version_number = Column(Integer, nullable=False)
     title = Column(String(500), nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text)  # Plain text when storage_type is "full"; read via DocumentVersionService.get_content
     content_hash = Column(String(64), nullable=False)  # SHA-256 hash for integrity
+    
+    # Delta storage: "full", "keyframe" (compressed text) or "delta" (reverse delta against delta_base_id)
+    storage_type = Column(String(20), nullable=False, default="full")
+    content_blob = Column(LargeBinary)
+    delta_base_id = Column(UUID(as_uuid=True), ForeignKey("document_versions.id"))
     author_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     
     # Version metadata
@@ -78,6 +86,16 @@ class DocumentComment(Base):
 class DocumentLock(Base):
     """Document editing locks for collaboration"""
     __tablename__ = "document_locks"
+    __table_args__ = (
+        # At most one active exclusive lock per document
+        Index(
+            "uq_document_locks_active_exclusive",
+            "document_id",
+            unique=True,
+            postgresql_where=text("is_active AND lock_type = 'exclusive'"),
+            sqlite_where=text("is_active AND lock_type = 'exclusive'")
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
@@ -97,6 +115,18 @@ class DocumentLock(Base):
     document = relationship("Document")
     user = relationship("User")
 
+class DocumentEditState(Base):
+    """Per-document version sequence and lock state, changed only by single conditional writes"""
+    __tablename__ = "document_edit_states"
+    
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
+    last_version_number = Column(Integer, nullable=False, default=0)
+    
+    # Current exclusive holder, and when the last shared or section lock expires
+    exclusive_lock_id = Column(UUID(as_uuid=True))
+    exclusive_expires_at = Column(DateTime(timezone=True))
+    shared_expires_at = Column(DateTime(timezone=True))
+
 class DocumentDiff(Base):
     """Document change tracking and diff storage"""
     __tablename__ = "document_diffs"
@@ -139,7 +169,7 @@ class CollaborationSession(Base):
     
     # Settings
     auto_save_interval = Column(Integer, default=30)  # seconds
-    conflict_resolution = Column(String(50), default="last_writer_wins")
+    conflict_resolution = Column(String(50), default="operational_transform")
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,408 @@
+"""
+Collaborative Editing Engine
+Server-side operational transformation for plain-text documents with periodic version snapshots
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# An operation is a list of components applied left to right over the whole
+# document: a positive int retains that many characters, a string inserts it,
+# a negative int deletes that many characters.
+Component = Union[int, str]
+Operation = List[Component]
+
+
+class InvalidOperationError(ValueError):
+    """Raised when an operation does not fit the document it is applied to"""
+
+
+class StaleRevisionError(ValueError):
+    """Raised when an operation's base revision is older than the retained history"""
+
+
+def _retain(op: Operation, n: int):
+    if n <= 0:
+        return
+    if op and isinstance(op[-1], int) and op[-1] > 0:
+        op[-1] += n
+    else:
+        op.append(n)
+
+
+def _insert(op: Operation, text: str):
+    if not text:
+        return
+    if op and isinstance(op[-1], str):
+        op[-1] += text
+    elif op and isinstance(op[-1], int) and op[-1] < 0:
+        # Canonical form puts an insert before an adjacent delete
+        if len(op) > 1 and isinstance(op[-2], str):
+            op[-2] += text
+        else:
+            op.insert(len(op) - 1, text)
+    else:
+        op.append(text)
+
+
+def _delete(op: Operation, n: int):
+    if n <= 0:
+        return
+    if op and isinstance(op[-1], int) and op[-1] < 0:
+        op[-1] -= n
+    else:
+        op.append(-n)
+
+
+def normalize(components: List[Any]) -> Operation:
+    """Validate and canonicalize an operation received from a client"""
+    op: Operation = []
+    for component in components:
+        if isinstance(component, bool) or not isinstance(component, (int, str)):
+            raise InvalidOperationError(f"Invalid operation component: {component!r}")
+        if isinstance(component, str):
+            _insert(op, component)
+        elif component > 0:
+            _retain(op, component)
+        else:
+            _delete(op, -component)
+    return op
+
+
+def base_length(op: Operation) -> int:
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def apply(text: str, op: Operation) -> str:
+    """Apply an operation to the text it was made against"""
+    if base_length(op) != len(text):
+        raise InvalidOperationError(f"Operation base length {base_length(op)} does not match document length {len(text)}")
+    parts = []
+    index = 0
+    for component in op:
+        if isinstance(component, str):
+            parts.append(component)
+        elif component > 0:
+            parts.append(text[index:index + component])
+            index += component
+        else:
+            index -= component
+    return "".join(parts)
+
+
+def transform(a: Operation, b: Operation) -> Tuple[Operation, Operation]:
+    """
+    Transform two concurrent operations on the same text into (a', b') with
+    apply(apply(s, a), b') == apply(apply(s, b), a'). When both insert at
+    the same place, ``a``'s text ends up first.
+    """
+    if base_length(a) != base_length(b):
+        raise InvalidOperationError("Concurrent operations must share a base length")
+
+    a_prime: Operation = []
+    b_prime: Operation = []
+    ia, ib = iter(a), iter(b)
+    x, y = next(ia, None), next(ib, None)
+    while x is not None or y is not None:
+        if isinstance(x, str):
+            _insert(a_prime, x)
+            _retain(b_prime, len(x))
+            x = next(ia, None)
+            continue
+        if isinstance(y, str):
+            _retain(a_prime, len(y))
+            _insert(b_prime, y)
+            y = next(ib, None)
+            continue
+        if x is None or y is None:
+            raise InvalidOperationError("Operations are not compatible")
+
+        if x > 0 and y > 0:
+            length = min(x, y)
+            _retain(a_prime, length)
+            _retain(b_prime, length)
+        elif x < 0 and y < 0:
+            # Both deleted the same characters; nothing left to do for either
+            length = min(-x, -y)
+        elif x < 0:
+            length = min(-x, y)
+            _delete(a_prime, length)
+        else:
+            length = min(x, -y)
+            _delete(b_prime, length)
+
+        x = x - length if x > 0 else x + length
+        y = y - length if y > 0 else y + length
+        if x == 0:
+            x = next(ia, None)
+        if y == 0:
+            y = next(ib, None)
+    return a_prime, b_prime
+
+
+def operation_from_edit(edit: Dict[str, Any], length: int) -> Operation:
+    """
+    Build an operation from a simple positional edit:
+    {"type": "insert", "position", "text"} or {"type": "delete", "position", "length"}
+    """
+    position = int(edit.get("position", 0))
+    if not 0 <= position <= length:
+        raise InvalidOperationError(f"Edit position {position} outside document of length {length}")
+    op: Operation = []
+    _retain(op, position)
+    if edit.get("type") == "insert":
+        _insert(op, str(edit.get("text", "")))
+        _retain(op, length - position)
+    elif edit.get("type") == "delete":
+        count = int(edit.get("length", 0))
+        if count < 0 or position + count > length:
+            raise InvalidOperationError("Delete runs past the end of the document")
+        _delete(op, count)
+        _retain(op, length - position - count)
+    else:
+        raise InvalidOperationError(f"Unknown edit type: {edit.get('type')!r}")
+    return op
+
+
+class DocumentSession:
+    """
+    Authoritative state of one document being edited
+
+    Holds the current text, its revision and the last ``history_limit``
+    applied operations. A client sends an operation with the revision it was
+    made against; it is transformed over every operation applied since, then
+    applied and given the next revision. Each (client, client_op_id) is
+    applied at most once, so retransmits are acknowledged, not re-applied.
+    """
+
+    def __init__(self, document_id: str, text: str, title: str = "", revision: int = 0, history_limit: int = 1000):
+        self.document_id = document_id
+        self.text = text
+        self.title = title
+        self.revision = revision
+        self.history: Deque[Tuple[int, Operation]] = deque(maxlen=history_limit)
+        self._applied: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._applied_order: Deque[Tuple[str, str]] = deque()
+        self.history_limit = history_limit
+
+        self.snapshot_revision = revision
+        self.last_editor: Optional[str] = None
+        self.last_activity = time.monotonic()
+        self.last_snapshot_at = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return self.revision != self.snapshot_revision
+
+    def receive(self, user_id: str, base_revision: int, op: Operation, client_op_id: Optional[str] = None) -> Dict[str, Any]:
+        """Transform, apply and record an operation; returns the accepted operation"""
+        if client_op_id is not None and (user_id, client_op_id) in self._applied:
+            return {**self._applied[(user_id, client_op_id)], "duplicate": True}
+
+        if base_revision > self.revision:
+            raise InvalidOperationError(f"Unknown revision {base_revision}")
+        oldest = self.history[0][0] - 1 if self.history else self.revision
+        if base_revision < oldest:
+            raise StaleRevisionError(f"Revision {base_revision} is older than retained history ({oldest})")
+
+        for revision, concurrent in self.history:
+            if revision > base_revision:
+                op, _ = transform(op, concurrent)
+
+        self.text = apply(self.text, op)
+        self.revision += 1
+        self.history.append((self.revision, op))
+        self.last_editor = user_id
+        self.last_activity = time.monotonic()
+
+        accepted = {
+            "op_id": f"{self.document_id}:{self.revision}:{uuid.uuid4().hex[:8]}",
+            "revision": self.revision,
+            "operation": op,
+            "user_id": user_id,
+            "client_op_id": client_op_id
+        }
+        if client_op_id is not None:
+            self._remember(user_id, client_op_id, accepted)
+        return accepted
+
+    def _remember(self, user_id: str, client_op_id: str, accepted: Dict[str, Any]):
+        key = (user_id, client_op_id)
+        self._applied[key] = accepted
+        self._applied_order.append(key)
+        while len(self._applied_order) > self.history_limit:
+            self._applied.pop(self._applied_order.popleft(), None)
+
+
+class CollaborationEngine:
+    """
+    Live DocumentSessions for every document being edited in this process
+
+    ``loader(document_id)`` returns the (text, title) to start a session
+    from. Sessions with unsaved edits are written through
+    ``snapshot_writer(document_id, title, text, author_id)`` every
+    ``snapshot_every_ops`` operations or ``snapshot_interval_seconds``,
+    and sessions idle for ``idle_evict_seconds`` are snapshotted and dropped.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Awaitable[Tuple[str, str]]],
+        snapshot_writer: Callable[[str, str, str, Optional[str]], Awaitable[Any]],
+        snapshot_every_ops: int = 200,
+        snapshot_interval_seconds: float = 30.0,
+        idle_evict_seconds: float = 300.0,
+        history_limit: int = 1000
+    ):
+        self.loader = loader
+        self.snapshot_writer = snapshot_writer
+        self.snapshot_every_ops = snapshot_every_ops
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.idle_evict_seconds = idle_evict_seconds
+        self.history_limit = history_limit
+
+        self.sessions: Dict[str, DocumentSession] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._snapshotting: Dict[str, asyncio.Task] = {}
+        self._ticker: Optional[asyncio.Task] = None
+        self._metrics = {"operations": 0, "transformed": 0, "duplicates": 0, "stale": 0, "snapshots": 0}
+
+    async def get_session(self, document_id: str) -> DocumentSession:
+        session = self.sessions.get(document_id)
+        if session is not None:
+            return session
+
+        lock = self._load_locks.setdefault(document_id, asyncio.Lock())
+        async with lock:
+            session = self.sessions.get(document_id)
+            if session is None:
+                text, title = await self.loader(document_id)
+                session = DocumentSession(document_id, text, title, history_limit=self.history_limit)
+                self.sessions[document_id] = session
+        self._ensure_ticker()
+        return session
+
+    async def submit(
+        self,
+        document_id: str,
+        user_id: str,
+        operation: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Apply a client edit. ``operation`` carries ``revision`` (the client's
+        base revision), an optional ``client_op_id``, and either ``ops`` (a
+        retain/insert/delete operation) or a simple positional edit.
+        """
+        session = await self.get_session(document_id)
+        base_revision = int(operation.get("revision", session.revision))
+        if "ops" in operation:
+            op = normalize(operation["ops"])
+        else:
+            # Positional edits are only meaningful against the text they were made on
+            if base_revision != session.revision:
+                raise StaleRevisionError("Positional edits must be made against the latest revision")
+            op = operation_from_edit(operation, len(session.text))
+
+        try:
+            accepted = session.receive(user_id, base_revision, op, operation.get("client_op_id"))
+        except StaleRevisionError:
+            self._metrics["stale"] += 1
+            raise
+
+        if accepted.get("duplicate"):
+            self._metrics["duplicates"] += 1
+        else:
+            self._metrics["operations"] += 1
+            if accepted["revision"] - 1 > base_revision:
+                self._metrics["transformed"] += 1
+            if session.revision - session.snapshot_revision >= self.snapshot_every_ops:
+                self._schedule_snapshot(session)
+        return accepted
+
+    def get_state(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Full text and revision, for clients joining or resyncing"""
+        session = self.sessions.get(document_id)
+        if session is None:
+            return None
+        return {"document_id": document_id, "revision": session.revision, "text": session.text}
+
+    async def snapshot(self, document_id: str):
+        """Write a session's current text as a document version if it has unsaved edits"""
+        session = self.sessions.get(document_id)
+        if session is None or not session.dirty:
+            return
+        revision, text = session.revision, session.text
+        await self.snapshot_writer(document_id, session.title, text, session.last_editor)
+        session.snapshot_revision = max(session.snapshot_revision, revision)
+        session.last_snapshot_at = time.monotonic()
+        self._metrics["snapshots"] += 1
+
+    async def close(self):
+        """Snapshot every dirty session, e.g. on shutdown"""
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        for document_id in list(self.sessions):
+            try:
+                await self.snapshot(document_id)
+            except Exception as e:
+                logger.error(f"Final snapshot of document {document_id} failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            "active_documents": len(self.sessions),
+            "dirty_documents": sum(1 for session in self.sessions.values() if session.dirty)
+        }
+
+    def _schedule_snapshot(self, session: DocumentSession):
+        if session.document_id in self._snapshotting:
+            return
+        task = asyncio.create_task(self.snapshot(session.document_id))
+        self._snapshotting[session.document_id] = task
+        task.add_done_callback(lambda finished, key=session.document_id: self._snapshot_done(key, finished))
+
+    def _snapshot_done(self, document_id: str, task: asyncio.Task):
+        self._snapshotting.pop(document_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Snapshot of document {document_id} failed: {task.exception()}")
+
+    def _ensure_ticker(self):
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        """Periodic snapshots of dirty sessions and eviction of idle ones"""
+        while self.sessions:
+            await asyncio.sleep(min(self.snapshot_interval_seconds, self.idle_evict_seconds))
+            now = time.monotonic()
+            for document_id, session in list(self.sessions.items()):
+                if session.dirty and now - session.last_snapshot_at >= self.snapshot_interval_seconds:
+                    self._schedule_snapshot(session)
+                if now - session.last_activity >= self.idle_evict_seconds and document_id not in self._snapshotting:
+                    try:
+                        await self.snapshot(document_id)
+                    except Exception as e:
+                        logger.error(f"Snapshot of idle document {document_id} failed: {e}")
+                        continue
+                    if session.dirty:
+                        continue  # Edited while the snapshot was being written
+                    self.sessions.pop(document_id, None)
+                    self._load_locks.pop(document_id, None)
+
+
+__all__ = [
+    "InvalidOperationError",
+    "StaleRevisionError",
+    "normalize",
+    "apply",
+    "transform",
+    "operation_from_edit",
+    "DocumentSession",
+    "CollaborationEngine"
+]
@@ -0,0 +1,296 @@
+"""
+Legal Database Connector Base
+Pooled keep-alive HTTP sessions, per-host concurrency limits, token-bucket rate limiting,
+circuit breakers and hedged requests
+"""
+import abc
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """Raised when a provider answers with an error status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a connector whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-connector circuit breaker
+
+    After ``failure_threshold`` consecutive failures or timeouts the circuit
+    opens and the connector is skipped for ``reset_timeout_seconds``. The next
+    call after that is a trial: success closes the circuit, failure re-opens it.
+    While the trial is in flight every other call is rejected, so a burst
+    cannot reach an upstream that may still be failing. A caller that was
+    admitted but gives up without an outcome (e.g. it was cancelled) calls
+    ``release`` so the next call can be the trial.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout_seconds:
+            return "half_open"
+        return "open"
+
+    @property
+    def available(self) -> bool:
+        """Whether ``allow`` would admit a call, without claiming the trial"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def allow(self) -> bool:
+        """Admit a call; in the half-open state only the one trial is admitted"""
+        if not self.available:
+            return False
+        if self.state == "half_open":
+            self.trial_in_flight = True
+        return True
+
+    def release(self):
+        """Give back an admitted call that ended without success or failure"""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.trial_in_flight = False
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.trial_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+async def hedged_call(call: Callable[[], Awaitable[Any]], hedge_after_seconds: float = 0.0) -> Any:
+    """
+    Await ``call()``. With ``hedge_after_seconds`` set, an identical second
+    attempt starts if the first has not finished by then, and whichever
+    succeeds first wins. Attempts still running are cancelled on return,
+    on error and when the caller is cancelled or times out. If every
+    attempt fails, the first error is raised.
+    """
+    attempts = [asyncio.create_task(call())]
+    try:
+        if hedge_after_seconds:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after_seconds)
+            if not done:
+                attempts.append(asyncio.create_task(call()))
+
+        while True:
+            done, _ = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            remaining = [task for task in attempts if task not in done]
+            if not remaining:
+                raise next(iter(done)).exception()
+            attempts = remaining
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+class TokenBucket:
+    """
+    Async token bucket: ``rate`` tokens per second, holding at most ``burst``.
+    acquire() waits until a token is available instead of failing.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HTTPClientPool:
+    """
+    One pooled HTTP client shared by every connector in the process
+
+    Connections are kept alive and reused across searches, so TCP and TLS
+    setup is paid once per host rather than once per request. HTTP/2 is used
+    through httpx when it is installed with h2 support; otherwise an aiohttp
+    session with a keep-alive connection pool is used.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_connections_per_host: int = 20,
+        keepalive_seconds: float = 60.0,
+        timeout_seconds: float = 10.0,
+        http2: bool = True
+    ):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout_seconds = timeout_seconds
+        self.http2 = http2
+        self._client = None
+        self._backend: Optional[str] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_buckets: Dict[str, TokenBucket] = {}
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self._backend
+
+    def host_limits(self, host: str, max_concurrency: int, rate: float, burst: int):
+        """Concurrency semaphore and token bucket for a host, shared by its connectors"""
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(max_concurrency)
+            self._host_buckets[host] = TokenBucket(rate, burst)
+        return self._host_semaphores[host], self._host_buckets[host]
+
+    def _open(self):
+        if self.http2:
+            try:
+                import h2  # noqa: F401 - httpx needs it for HTTP/2
+                import httpx
+
+                self._client = httpx.AsyncClient(
+                    http2=True,
+                    timeout=self.timeout_seconds,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=self.keepalive_seconds
+                    )
+                )
+                self._backend = "httpx-h2"
+                return
+            except ImportError:
+                pass
+
+        import aiohttp
+
+        self._client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_seconds,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+        )
+        self._backend = "aiohttp"
+
+    async def request_json(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Any:
+        """Send a request on a pooled connection and decode the JSON body"""
+        if self._client is None:
+            self._open()
+
+        if self._backend == "aiohttp":
+            async with self._client.request(method, url, params=params, json=json, headers=headers) as response:
+                if response.status >= 400:
+                    raise UpstreamError(response.status, (await response.text())[:200])
+                return await response.json(content_type=None)
+
+        response = await self._client.request(method, url, params=params, json=json, headers=headers)
+        if response.status_code >= 400:
+            raise UpstreamError(response.status_code, response.text[:200])
+        return response.json()
+
+    async def close(self):
+        if self._client is None:
+            return
+        if self._backend == "aiohttp":
+            await self._client.close()
+        else:
+            await self._client.aclose()
+        self._client = None
+
+
+class BaseHTTPConnector(abc.ABC):
+    """
+    Base class for HTTP legal database connectors
+
+    Subclasses set ``base_url`` and the provider quota (``max_concurrency``
+    in-flight requests per host, ``rate_per_second``/``burst`` for the token
+    bucket) and implement ``search``, calling ``_get_json`` for each request.
+    Limits are held by the pool and shared by every connector on a host.
+    ``timeout_seconds`` bounds one search; None uses the service default.
+    """
+
+    base_url: str = ""
+    timeout_seconds: Optional[float] = None
+    max_concurrency: int = 8
+    rate_per_second: float = 10.0
+    burst: int = 10
+
+    def __init__(self, pool: HTTPClientPool, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.pool = pool
+        self.base_url = (base_url or self.base_url).rstrip("/")
+        self.api_key = api_key
+        self.host = urlsplit(self.base_url).netloc
+
+    def auth_headers(self) -> Dict[str, str]:
+        """Provider-specific authentication headers"""
+        return {}
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """GET a provider endpoint within its rate and concurrency limits"""
+        semaphore, bucket = self.pool.host_limits(
+            self.host, self.max_concurrency, self.rate_per_second, self.burst
+        )
+        await bucket.acquire()
+        async with semaphore:
+            return await self.pool.request_json(
+                "GET", f"{self.base_url}{path}", params=params, headers=self.auth_headers()
+            )
+
+    @abc.abstractmethod
+    async def search(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Search the provider and return normalized results"""
+
+
+__all__ = [
+    "UpstreamError",
+    "CircuitOpenError",
+    "CircuitBreaker",
+    "hedged_call",
+    "TokenBucket",
+    "HTTPClientPool",
+    "BaseHTTPConnector"
+]
@@ -4,23 +4,76 @@ Handles document versioning, diff generation, and collaboration management
 """
 import hashlib
 import json
-import difflib
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, case, func, true, update
+from sqlalchemy.exc import IntegrityError
 import asyncio
 import logging
+import uuid
 
 from app.models.document_versioning import (
     DocumentVersion, DocumentComment, DocumentLock, 
-    DocumentDiff, CollaborationSession
+    DocumentDiff, CollaborationSession, DocumentEditState
 )
 from app.core.websocket import ConnectionManager
+from app.core.ai_orchestrator import ai_orchestrator
+from app.models import AuditLog, Document
 from app.core.security import AuditLogger
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.version_storage import (
+    STORAGE_FULL, STORAGE_KEYFRAME, STORAGE_DELTA, MaterializedVersionCache,
+    compress_text, decompress_text, make_delta, apply_delta, is_keyframe
+)
+from app.services.text_diff import compute_diff
+from app.services.post_commit_pipeline import PostCommitPipeline, Step
+from app.services.collaboration_engine import CollaborationEngine, InvalidOperationError, StaleRevisionError
+from app.services.presence_aggregator import PresenceAggregator
 
 logger = logging.getLogger(__name__)
 
+# Recently reconstructed version texts, shared by every service instance in the process
+materialized_versions = MaterializedVersionCache(
+    max_entries=settings.DOCUMENT_VERSION_CACHE_MAX_ENTRIES,
+    max_chars=settings.DOCUMENT_VERSION_CACHE_MAX_CHARS
+)
+
+# Diffs, notifications, audit entries and re-indexing run after the save returns, in order per document
+version_pipeline = PostCommitPipeline(
+    max_concurrency=settings.DOCUMENT_VERSION_PIPELINE_CONCURRENCY,
+    max_attempts=settings.DOCUMENT_VERSION_PIPELINE_MAX_ATTEMPTS
+)
+
+_diff_executor: Optional[Executor] = None
+
+
+def get_diff_executor() -> Executor:
+    """Pool that runs diffs off the event loop; processes are spawned lazily on first use"""
+    global _diff_executor
+    if _diff_executor is None:
+        if settings.DOCUMENT_DIFF_EXECUTOR == "process":
+            _diff_executor = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENT_DIFF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            _diff_executor = ThreadPoolExecutor(
+                max_workers=settings.DOCUMENT_DIFF_WORKERS,
+                thread_name_prefix="document-diff"
+            )
+    return _diff_executor
+
+
+def shutdown_diff_executor():
+    global _diff_executor
+    if _diff_executor is not None:
+        _diff_executor.shutdown(wait=False, cancel_futures=True)
+        _diff_executor = None
+
 class DocumentVersionService:
     """Service for managing document versions and collaboration"""
     
@@ -39,20 +92,53 @@ class DocumentVersionService:
         change_type: str = "minor"
     ) -> DocumentVersion:
         """Create a new document version"""
+        version, latest_version = self._write_version(
+            document_id, title, content, author_id, change_summary, change_type
+        )
+        # The durable audit row was committed with the version; this extends the in-process hash chain
+        self.audit_logger.log_security_event(
+            event_type="document_version_created",
+            user_id=version.author_id,
+            client_id=None,
+            details=self._version_audit_details(version)
+        )
+        
+        # The editor only waits for the database write; the remaining side effects are best effort
+        version_pipeline.submit(
+            str(document_id), self._post_commit_steps(version, latest_version, content)
+        )
+        
+        return version
+    
+    def _write_version(
+        self,
+        document_id: str,
+        title: str,
+        content: str,
+        author_id: str,
+        change_summary: Optional[str] = None,
+        change_type: str = "minor"
+    ) -> Tuple[DocumentVersion, Optional[DocumentVersion]]:
+        """Insert a version under a freshly allocated number; returns it and the version it supersedes"""
         try:
             # Generate content hash for integrity
             content_hash = hashlib.sha256(content.encode()).hexdigest()
             
-            # Get next version number
+            # Taking the number holds the document's sequence row until commit,
+            # so concurrent saves of one document queue here and see each other's rows
+            next_version = self._allocate_version_number(document_id)
             latest_version = self.db.query(DocumentVersion)\
-                .filter(DocumentVersion.document_id == document_id)\
+                .filter(
+                    DocumentVersion.document_id == document_id,
+                    DocumentVersion.version_number < next_version
+                )\
                 .order_by(desc(DocumentVersion.version_number))\
                 .first()
+            previous_content = self.get_content(latest_version) if latest_version else None
             
-            next_version = (latest_version.version_number + 1) if latest_version else 1
-            
-            # Create new version
+            # Create new version; the latest version is always stored in full
             version = DocumentVersion(
+                id=uuid.uuid4(),
                 document_id=document_id,
                 version_number=next_version,
                 title=title,
@@ -60,39 +146,228 @@ class DocumentVersionService:
                 content_hash=content_hash,
                 author_id=author_id,
                 change_summary=change_summary,
-                change_type=change_type
+                change_type=change_type,
+                storage_type=STORAGE_FULL
             )
             
             self.db.add(version)
+            if latest_version and settings.DOCUMENT_VERSION_STORAGE_MODE == "delta":
+                self._store_superseded(latest_version, previous_content, version, content)
+            # The audit record commits or rolls back with the version it describes
+            self.db.add(AuditLog(
+                event_type="document_version_created",
+                event_category="modification",
+                user_id=author_id,
+                resource_type="document",
+                resource_id=str(document_id),
+                action="create_version",
+                details=self._version_audit_details(version),
+                timestamp=datetime.utcnow()
+            ))
             self.db.commit()
             self.db.refresh(version)
+            materialized_versions.put(str(version.id), content)
             
-            # Generate diff if there's a previous version
-            if latest_version:
-                await self._generate_diff(latest_version.id, version.id)
-            
-            # Notify collaborators
-            await self._notify_version_created(version)
+            return version, latest_version
             
-            # Log the action
-            self.audit_logger.log_security_event(
-                event_type="document_version_created",
-                user_id=author_id,
-                details={
-                    "document_id": str(document_id),
-                    "version_id": str(version.id),
-                    "version_number": next_version,
-                    "change_type": change_type
-                }
+        except Exception as e:
+            logger.error(f"Error creating document version: {str(e)}")
+            self.db.rollback()
+            raise
+    
+    def _ensure_edit_state(self, document_id: str):
+        """Create a document's edit state row on first use, seeded from its existing versions and live locks"""
+        exists = self.db.query(DocumentEditState.document_id)\
+            .filter(DocumentEditState.document_id == document_id)\
+            .first()
+        if exists:
+            return
+        
+        last_number = self.db.query(func.max(DocumentVersion.version_number))\
+            .filter(DocumentVersion.document_id == document_id)\
+            .scalar()
+        now = datetime.utcnow()
+        live_locks = self.db.query(DocumentLock)\
+            .filter(
+                DocumentLock.document_id == document_id,
+                DocumentLock.is_active == True,
+                DocumentLock.expires_at > now
+            ).all()
+        exclusive = next((lock for lock in live_locks if lock.lock_type == "exclusive"), None)
+        shared_expiries = [lock.expires_at for lock in live_locks if lock.lock_type != "exclusive"]
+        try:
+            with self.db.begin_nested():
+                self.db.add(DocumentEditState(
+                    document_id=document_id,
+                    last_version_number=last_number or 0,
+                    exclusive_lock_id=exclusive.id if exclusive else None,
+                    exclusive_expires_at=exclusive.expires_at if exclusive else None,
+                    shared_expires_at=max(shared_expiries) if shared_expiries else None
+                ))
+        except IntegrityError:
+            pass  # Created concurrently; the primary key keeps it to one row
+    
+    def _allocate_version_number(self, document_id: str) -> int:
+        """Atomically take the next version number for a document"""
+        self._ensure_edit_state(document_id)
+        return self.db.execute(
+            update(DocumentEditState)
+            .where(DocumentEditState.document_id == document_id)
+            .values(last_version_number=DocumentEditState.last_version_number + 1)
+            .returning(DocumentEditState.last_version_number)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+    
+    def _lock_edit_state(self, document_id: str):
+        """Hold a document's edit state row until commit, queueing behind and ahead of version saves"""
+        self._ensure_edit_state(document_id)
+        self.db.query(DocumentEditState)\
+            .filter(DocumentEditState.document_id == document_id)\
+            .with_for_update()\
+            .one()
+    
+    def get_content(self, version: DocumentVersion) -> str:
+        """
+        Get a version's full text, whichever way it is stored
+        
+        Delta versions are rebuilt by walking their chain of reverse deltas up
+        to the nearest keyframe, full version or cached text (at most one
+        keyframe interval), applying the deltas newest first, and checking the
+        result against ``content_hash``.
+        """
+        if version.storage_type in (None, STORAGE_FULL):
+            return version.content
+        if version.storage_type == STORAGE_KEYFRAME:
+            return decompress_text(version.content_blob)
+        
+        cached = materialized_versions.get(str(version.id))
+        if cached is not None:
+            return cached
+        
+        # The chain only runs upwards to the next keyframe, so load that window at once
+        window = {
+            row.id: row
+            for row in self.db.query(DocumentVersion)
+            .filter(
+                DocumentVersion.document_id == version.document_id,
+                DocumentVersion.version_number > version.version_number,
+                DocumentVersion.version_number <= version.version_number + settings.DOCUMENT_VERSION_KEYFRAME_INTERVAL
             )
+        }
+        chain = [version]
+        text = None
+        while text is None:
+            base = window.get(chain[-1].delta_base_id) or self.db.query(DocumentVersion).get(chain[-1].delta_base_id)
+            if base is None:
+                raise ValueError(f"Missing delta base for document version {chain[-1].id}")
+            if base.storage_type == STORAGE_DELTA:
+                text = materialized_versions.get(str(base.id))
+                if text is None:
+                    chain.append(base)
+            else:
+                text = self.get_content(base)
+        
+        for link in reversed(chain):
+            text = apply_delta(text, link.content_blob)
+        
+        if hashlib.sha256(text.encode()).hexdigest() != version.content_hash:
+            raise ValueError(f"Content hash mismatch reconstructing document version {version.id}")
+        materialized_versions.put(str(version.id), text)
+        return text
+    
+    def _store_superseded(
+        self,
+        previous: DocumentVersion,
+        previous_content: str,
+        latest: DocumentVersion,
+        latest_content: str
+    ):
+        """Re-encode the version a new one supersedes as a keyframe or a reverse delta"""
+        materialized_versions.put(str(previous.id), previous_content)
+        if is_keyframe(previous.version_number, settings.DOCUMENT_VERSION_KEYFRAME_INTERVAL):
+            previous.storage_type = STORAGE_KEYFRAME
+            previous.content_blob = compress_text(previous_content)
+            previous.delta_base_id = None
+        else:
+            previous.storage_type = STORAGE_DELTA
+            previous.content_blob = make_delta(latest_content, previous_content)
+            previous.delta_base_id = latest.id
+        previous.content = None
+    
+    async def compact_versions(self, document_id: str) -> Dict[str, int]:
+        """Re-encode a document's existing full versions into keyframes and reverse deltas"""
+        try:
+            # A version saved mid-compaction would find its predecessor re-encoded under it
+            self._lock_edit_state(document_id)
+            versions = self.db.query(DocumentVersion)\
+                .filter(DocumentVersion.document_id == document_id)\
+                .order_by(desc(DocumentVersion.version_number))\
+                .all()
+            
+            contents = [self.get_content(version) for version in versions]
+            bytes_before = sum(len((v.content or "").encode()) + len(v.content_blob or b"") for v in versions)
+            
+            for newer, version, newer_content, content in zip(versions, versions[1:], contents, contents[1:]):
+                self._store_superseded(version, content, newer, newer_content)
+            self.db.commit()
             
-            return version
+            bytes_after = sum(len((v.content or "").encode()) + len(v.content_blob or b"") for v in versions)
+            return {"versions": len(versions), "bytes_before": bytes_before, "bytes_after": bytes_after}
             
         except Exception as e:
-            logger.error(f"Error creating document version: {str(e)}")
+            logger.error(f"Error compacting document versions: {str(e)}")
             self.db.rollback()
             raise
     
+    def _post_commit_steps(
+        self,
+        version: DocumentVersion,
+        previous: Optional[DocumentVersion],
+        content: str
+    ) -> List[Step]:
+        """
+        Best-effort side effects of a saved version, bound to plain values so
+        they outlive the request session. The audit record is not one of them:
+        it is written in the version's own transaction.
+        """
+        version_id, document_id, title = version.id, version.document_id, version.title
+        message = self._version_created_message(version)
+        
+        steps: List[Step] = []
+        if previous is not None:
+            previous_id = previous.id
+            steps.append(("diff", lambda: self._in_session(
+                lambda service: service._generate_diff(previous_id, version_id)
+            )))
+        steps.append(("notify", lambda: self.connection_manager.broadcast_to_room(
+            message, f"document_{document_id}"
+        )))
+        steps.append(("reindex", lambda: self._in_session(
+            lambda service: service._reindex(document_id, title, content)
+        )))
+        return steps
+    
+    async def _in_session(self, work):
+        """Run background work with its own database session"""
+        db = SessionLocal()
+        try:
+            return await work(DocumentVersionService(db, self.connection_manager))
+        finally:
+            db.close()
+    
+    async def _reindex(self, document_id: str, title: str, content: str):
+        """Re-embed only this document in its matter's retrieval index"""
+        if ai_orchestrator.retrieval_index is None:
+            return
+        
+        document = self.db.query(Document).get(document_id)
+        if document is None:
+            return
+        
+        await ai_orchestrator.retrieval_index.update_document(
+            str(document.matter_id), str(document.id), title, content
+        )
+    
     async def get_version_history(
         self, 
         document_id: str, 
@@ -128,45 +403,36 @@ class DocumentVersionService:
             if not from_version or not to_version:
                 return
             
-            # Generate text diff
-            from_lines = from_version.content.splitlines()
-            to_lines = to_version.content.splitlines()
-            
-            diff = list(difflib.unified_diff(
-                from_lines, to_lines,
-                fromfile=f"Version {from_version.version_number}",
-                tofile=f"Version {to_version.version_number}",
-                lineterm=""
-            ))
-            
-            # Calculate statistics
-            added_lines = sum(1 for line in diff if line.startswith('+') and not line.startswith('+++'))
-            removed_lines = sum(1 for line in diff if line.startswith('-') and not line.startswith('---'))
-            
-            # Calculate similarity score
-            similarity = difflib.SequenceMatcher(None, from_version.content, to_version.content)
-            similarity_score = int(similarity.ratio() * 100)
+            from_content = self.get_content(from_version)
+            to_content = self.get_content(to_version)
+            
+            # Myers diff in the worker pool; the budget bounds it on any document size
+            budget = settings.DOCUMENT_DIFF_TIME_BUDGET_SECONDS
+            result = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    get_diff_executor(),
+                    compute_diff,
+                    from_content,
+                    to_content,
+                    f"Version {from_version.version_number}",
+                    f"Version {to_version.version_number}",
+                    budget
+                ),
+                timeout=budget + 10
+            )
             
             # Store diff
             document_diff = DocumentDiff(
                 from_version_id=from_version_id,
                 to_version_id=to_version_id,
                 diff_data={
-                    "unified_diff": diff,
-                    "changes": {
-                        "added": added_lines,
-                        "removed": removed_lines,
-                        "modified": len([line for line in diff if line.startswith('@@')])
-                    }
+                    "unified_diff": result["unified_diff"],
+                    "changes": result["changes"],
+                    "word_changes": result["word_changes"],
+                    "complete": result["complete"]
                 },
-                statistics={
-                    "lines_added": added_lines,
-                    "lines_removed": removed_lines,
-                    "total_changes": added_lines + removed_lines,
-                    "from_word_count": len(from_version.content.split()),
-                    "to_word_count": len(to_version.content.split())
-                },
-                similarity_score=similarity_score
+                statistics=result["statistics"],
+                similarity_score=result["similarity_score"]
             )
             
             self.db.add(document_diff)
@@ -174,6 +440,8 @@ class DocumentVersionService:
             
         except Exception as e:
             logger.error(f"Error generating diff: {str(e)}")
+            self.db.rollback()
+            raise
     
     async def create_comment(
         self,
@@ -219,23 +487,67 @@ class DocumentVersionService:
         duration_minutes: int = 30
     ) -> Optional[DocumentLock]:
         """Acquire a lock on a document for editing"""
+        lock = self._try_acquire_lock(document_id, user_id, lock_type, duration_minutes)
+        if lock:
+            # Notify other users about the lock
+            await self._notify_lock_acquired(lock)
+        return lock
+    
+    def _try_acquire_lock(
+        self,
+        document_id: str,
+        user_id: str,
+        lock_type: str,
+        duration_minutes: int
+    ) -> Optional[DocumentLock]:
+        """
+        Take a lock with one conditional write on the document's edit state:
+        an exclusive lock needs no live lock of any kind, a shared or section
+        lock needs no live exclusive lock. The row stays locked until commit,
+        so competing writers are decided by the database, not by a prior read.
+        """
         try:
-            # Check for existing locks
-            existing_lock = self.db.query(DocumentLock)\
+            self._ensure_edit_state(document_id)
+            now = datetime.utcnow()
+            expires_at = now + timedelta(minutes=duration_minutes)
+            lock_id = uuid.uuid4()
+            
+            state = DocumentEditState
+            exclusive_free = or_(state.exclusive_expires_at.is_(None), state.exclusive_expires_at <= now)
+            if lock_type == "exclusive":
+                condition = and_(
+                    exclusive_free,
+                    or_(state.shared_expires_at.is_(None), state.shared_expires_at <= now)
+                )
+                values = {"exclusive_lock_id": lock_id, "exclusive_expires_at": expires_at}
+            else:
+                condition = exclusive_free
+                values = {"shared_expires_at": case(
+                    (or_(state.shared_expires_at.is_(None), state.shared_expires_at < expires_at), expires_at),
+                    else_=state.shared_expires_at
+                )}
+            
+            acquired = self.db.execute(
+                update(state)
+                .where(state.document_id == document_id, condition)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not acquired:
+                self.db.rollback()
+                return None  # Cannot acquire lock
+            
+            # Expired locks are retired before ours is recorded, keeping the unique index satisfied
+            self.db.query(DocumentLock)\
                 .filter(
-                    and_(
-                        DocumentLock.document_id == document_id,
-                        DocumentLock.is_active == True,
-                        DocumentLock.expires_at > datetime.utcnow()
-                    )
-                ).first()
-            
-            if existing_lock and lock_type == "exclusive":
-                return None  # Cannot acquire exclusive lock
+                    DocumentLock.document_id == document_id,
+                    DocumentLock.is_active == True,
+                    DocumentLock.expires_at <= now
+                )\
+                .update({"is_active": False}, synchronize_session=False)
             
-            # Create new lock
-            expires_at = datetime.utcnow() + timedelta(minutes=duration_minutes)
             lock = DocumentLock(
+                id=lock_id,
                 document_id=document_id,
                 user_id=user_id,
                 lock_type=lock_type,
@@ -246,9 +558,6 @@ class DocumentVersionService:
             self.db.commit()
             self.db.refresh(lock)
             
-            # Notify other users about the lock
-            await self._notify_lock_acquired(lock)
-            
             return lock
             
         except Exception as e:
@@ -269,7 +578,35 @@ class DocumentVersionService:
                 ).first()
             
             if lock:
+                # Hold the edit state row first, in the same order as acquire_lock
+                state = DocumentEditState
+                self.db.execute(
+                    update(state)
+                    .where(state.document_id == lock.document_id)
+                    .values(shared_expires_at=state.shared_expires_at)
+                    .execution_options(synchronize_session=False)
+                )
                 lock.is_active = False
+                self.db.flush()
+                
+                if lock.lock_type == "exclusive":
+                    values = {"exclusive_lock_id": None, "exclusive_expires_at": None}
+                    condition = state.exclusive_lock_id == lock.id
+                else:
+                    # The remaining shared locks decide when the document is free again
+                    values = {"shared_expires_at": self.db.query(func.max(DocumentLock.expires_at))
+                        .filter(
+                            DocumentLock.document_id == lock.document_id,
+                            DocumentLock.is_active == True,
+                            DocumentLock.lock_type != "exclusive"
+                        ).scalar()}
+                    condition = true()
+                self.db.execute(
+                    update(state)
+                    .where(state.document_id == lock.document_id, condition)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
                 self.db.commit()
                 
                 # Notify about lock release
@@ -280,6 +617,7 @@ class DocumentVersionService:
             
         except Exception as e:
             logger.error(f"Error releasing lock: {str(e)}")
+            self.db.rollback()
             return False
     
     async def start_collaboration_session(
@@ -311,9 +649,18 @@ class DocumentVersionService:
             self.db.rollback()
             raise
     
-    async def _notify_version_created(self, version: DocumentVersion):
-        """Notify collaborators about new version"""
-        message = {
+    @staticmethod
+    def _version_audit_details(version: DocumentVersion) -> Dict[str, Any]:
+        return {
+            "document_id": str(version.document_id),
+            "version_id": str(version.id),
+            "version_number": version.version_number,
+            "change_type": version.change_type
+        }
+    
+    def _version_created_message(self, version: DocumentVersion) -> Dict[str, Any]:
+        """Notification for collaborators about a new version"""
+        return {
             "type": "document_version_created",
             "document_id": str(version.document_id),
             "version_id": str(version.id),
@@ -322,9 +669,6 @@ class DocumentVersionService:
             "change_summary": version.change_summary,
             "timestamp": datetime.utcnow().isoformat()
         }
-        
-        room_name = f"document_{version.document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message)
     
     async def _notify_comment_created(self, comment: DocumentComment):
         """Notify about new comment"""
@@ -342,7 +686,7 @@ class DocumentVersionService:
         version = self.db.query(DocumentVersion).get(comment.version_id)
         if version:
             room_name = f"document_{version.document_id}"
-            await self.connection_manager.broadcast_to_room(room_name, message)
+            await self.connection_manager.broadcast_to_room(message, room_name)
     
     async def _notify_lock_acquired(self, lock: DocumentLock):
         """Notify about lock acquisition"""
@@ -357,7 +701,7 @@ class DocumentVersionService:
         }
         
         room_name = f"document_{lock.document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message)
+        await self.connection_manager.broadcast_to_room(message, room_name)
     
     async def _notify_lock_released(self, lock: DocumentLock):
         """Notify about lock release"""
@@ -370,31 +714,126 @@ class DocumentVersionService:
         }
         
         room_name = f"document_{lock.document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message)
+        await self.connection_manager.broadcast_to_room(message, room_name)
 
 class CollaborationService:
-    """Service for real-time document collaboration"""
+    """
+    Service for real-time document collaboration
+    
+    The engine keeps each document's editing session in this process, so all
+    sockets editing a document must reach the same worker; see the
+    collaboration WebSocket route.
+    """
     
     def __init__(self, connection_manager: ConnectionManager):
         self.connection_manager = connection_manager
+        self.engine = CollaborationEngine(
+            loader=self._load_document,
+            snapshot_writer=self._write_snapshot,
+            snapshot_every_ops=settings.COLLAB_SNAPSHOT_EVERY_OPS,
+            snapshot_interval_seconds=settings.COLLAB_SNAPSHOT_INTERVAL_SECONDS,
+            idle_evict_seconds=settings.COLLAB_IDLE_EVICT_SECONDS,
+            history_limit=settings.COLLAB_HISTORY_LIMIT
+        )
+        # Cursor and selection updates are coalesced and sent as batches at a fixed rate
+        self.presence = PresenceAggregator(
+            send=lambda room, frame: self.connection_manager.broadcast_to_room(frame, room),
+            tick_hz=settings.COLLAB_PRESENCE_TICK_HZ
+        )
+    
+    async def _load_document(self, document_id: str) -> Tuple[str, str]:
+        """Starting text and title of an editing session: the latest version, else the extracted text"""
+        db = SessionLocal()
+        try:
+            service = DocumentVersionService(db, self.connection_manager)
+            latest = db.query(DocumentVersion)\
+                .filter(DocumentVersion.document_id == document_id)\
+                .order_by(desc(DocumentVersion.version_number))\
+                .first()
+            if latest:
+                return service.get_content(latest), latest.title
+            
+            document = db.query(Document).get(document_id)
+            if document is None:
+                raise InvalidOperationError(f"Document {document_id} not found")
+            return document.extracted_text or "", document.title
+        finally:
+            db.close()
+    
+    async def _write_snapshot(self, document_id: str, title: str, text: str, author_id: Optional[str]):
+        """Save a session's text as a new document version, authored by its last editor"""
+        db = SessionLocal()
+        try:
+            await DocumentVersionService(db, self.connection_manager).create_version(
+                document_id=document_id,
+                title=title,
+                content=text,
+                author_id=uuid.UUID(author_id),
+                change_summary="Collaborative editing snapshot",
+                change_type="patch"
+            )
+        finally:
+            db.close()
+    
+    async def get_document_state(self, document_id: str) -> Dict[str, Any]:
+        """Current text and revision for a client joining or resyncing"""
+        await self.engine.get_session(document_id)
+        return {"type": "document_state", **self.engine.get_state(document_id)}
+    
+    def leave_document(self, document_id: str, user_id: str):
+        """Drop a departing user's unsent cursor and selection for a document"""
+        self.presence.remove_user(f"document_{document_id}", user_id)
     
     async def handle_real_time_edit(
         self,
         document_id: str,
         user_id: str,
         operation: Dict[str, Any]
-    ):
-        """Handle real-time editing operations"""
-        message = {
-            "type": "document_edit",
+    ) -> Dict[str, Any]:
+        """
+        Handle real-time editing operations
+        
+        The edit is transformed against concurrent edits and applied by the
+        engine; the room receives only the transformed operation, and the
+        sender gets an acknowledgement (or the full state if its base
+        revision is too old to transform). ``user_id`` must be the
+        authenticated identity of the connection: it becomes the author of
+        the snapshot versions, so anything but a user UUID is rejected.
+        """
+        try:
+            user_id = str(uuid.UUID(str(user_id)))
+            accepted = await self.engine.submit(document_id, user_id, operation)
+        except StaleRevisionError:
+            return {"type": "document_resync", **self.engine.get_state(document_id)}
+        except (InvalidOperationError, ValueError) as e:
+            return {
+                "type": "document_edit_rejected",
+                "document_id": document_id,
+                "client_op_id": operation.get("client_op_id"),
+                "error": str(e)
+            }
+        
+        if not accepted.get("duplicate"):
+            message = {
+                "type": "document_edit",
+                "document_id": document_id,
+                "user_id": user_id,
+                "op_id": accepted["op_id"],
+                "revision": accepted["revision"],
+                "operation": accepted["operation"],
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            
+            room_name = f"document_{document_id}"
+            await self.connection_manager.broadcast_to_room(message, room_name)
+        
+        return {
+            "type": "document_edit_ack",
             "document_id": document_id,
-            "user_id": user_id,
-            "operation": operation,
-            "timestamp": datetime.utcnow().isoformat()
+            "op_id": accepted["op_id"],
+            "revision": accepted["revision"],
+            "client_op_id": accepted["client_op_id"]
         }
-        
-        room_name = f"document_{document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message, exclude_user=user_id)
     
     async def handle_cursor_position(
         self,
@@ -403,16 +842,7 @@ class CollaborationService:
         position: Dict[str, Any]
     ):
         """Handle cursor position updates"""
-        message = {
-            "type": "cursor_position",
-            "document_id": document_id,
-            "user_id": user_id,
-            "position": position,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        room_name = f"document_{document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message, exclude_user=user_id)
+        self.presence.update(f"document_{document_id}", user_id, "cursor", position, document_id=document_id)
     
     async def handle_selection_change(
         self,
@@ -421,13 +851,4 @@ class CollaborationService:
         selection: Dict[str, Any]
     ):
         """Handle text selection changes"""
-        message = {
-            "type": "selection_change",
-            "document_id": document_id,
-            "user_id": user_id,
-            "selection": selection,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        room_name = f"document_{document_id}"
-        await self.connection_manager.broadcast_to_room(room_name, message, exclude_user=user_id)
+        self.presence.update(f"document_{document_id}", user_id, "selection", selection, document_id=document_id)
@@ -4,12 +4,27 @@ External Legal Database Integration Service
 import asyncio
 import aiohttp
 import logging
+import os
+import shutil
 import time
-from typing import Dict, List, Any, Optional
+import uuid
+from typing import AsyncIterator, Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
 import json
 from concurrent.futures import ThreadPoolExecutor
 
+from app.core.config import settings
+from app.services.connector_base import (
+    BaseHTTPConnector,
+    CircuitBreaker,
+    CircuitOpenError,
+    HTTPClientPool,
+    hedged_call
+)
+from app.services.legal_search_cache import LegalSearchCache
+from app.services.legal_search_merge import merge_ranked
+from app.services.local_search_index import LocalSearchIndex
+
 logger = logging.getLogger(__name__)
 
 class LegalDatabaseService:
@@ -17,15 +32,50 @@ class LegalDatabaseService:
     
     def __init__(self):
         self.connectors = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Keep-alive connections and provider rate limits shared by all HTTP connectors
+        self.http_pool = HTTPClientPool(
+            max_connections=settings.LEGAL_DB_HTTP_MAX_CONNECTIONS,
+            max_connections_per_host=settings.LEGAL_DB_HTTP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_seconds=settings.LEGAL_DB_HTTP_KEEPALIVE_SECONDS,
+            http2=settings.LEGAL_DB_HTTP2_ENABLED
+        )
         self._initialize_connectors()
+        
+        self.cache = LegalSearchCache(
+            max_entries=settings.LEGAL_DB_CACHE_MAX_ENTRIES,
+            default_ttl_seconds=settings.LEGAL_DB_CACHE_TTL_SECONDS,
+            connector_ttls=settings.legal_db_cache_connector_ttls,
+            stale_ttl_seconds=settings.LEGAL_DB_CACHE_STALE_TTL_SECONDS,
+            redis_url=settings.REDIS_URL if settings.LEGAL_DB_CACHE_USE_REDIS else None
+        ) if settings.LEGAL_DB_CACHE_ENABLED else None
     
     def _initialize_connectors(self):
         """Initialize database connectors with mock data for demo"""
         # In production, these would use actual API keys
         self.connectors = {
+            "local": LocalIndexConnector(settings.LEGAL_DB_LOCAL_INDEX_DIR),
             "westlaw": MockWestlawConnector(),
             "lexisnexis": MockLexisNexisConnector(), 
-            "courtlistener": MockCourtListenerConnector()
+            "courtlistener": (
+                CourtListenerConnector(
+                    self.http_pool,
+                    base_url=settings.COURTLISTENER_BASE_URL,
+                    api_key=settings.COURTLISTENER_API_TOKEN
+                )
+                if settings.COURTLISTENER_API_TOKEN else MockCourtListenerConnector()
+            )
+        }
+        # Per-connector timeouts; connectors without one use LEGAL_DB_CONNECTOR_TIMEOUT_SECONDS
+        for name, seconds in settings.legal_db_connector_timeouts.items():
+            if name in self.connectors:
+                self.connectors[name].timeout_seconds = seconds
+        self.breakers = {
+            name: CircuitBreaker(
+                failure_threshold=settings.LEGAL_DB_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout_seconds=settings.LEGAL_DB_BREAKER_RESET_SECONDS
+            )
+            for name in self.connectors
         }
     
     async def unified_search(
@@ -33,41 +83,369 @@ class LegalDatabaseService:
         query: str, 
         databases: List[str], 
         filters: Optional[Dict[str, Any]] = None,
-        max_results: int = 50
+        max_results: int = 50,
+        deadline_seconds: Optional[float] = None
     ) -> Dict[str, Any]:
         """
-        Search across multiple legal databases and aggregate results
+        Search across multiple legal databases and aggregate results.
+        
+        Each connector gets its own timeout and the whole search an overall
+        deadline; connectors still running at the deadline are cancelled and
+        the response is flagged ``partial`` with the sources that timed out.
+        Connectors whose circuit is open are skipped without being called.
+        Each connector's answer is served from the search cache when present.
+        Ranked connector results are heap-merged and deduplicated by citation.
         """
         start_time = time.time()
-        all_results = []
-        sources_searched = []
-        
-        search_tasks = []
-        for db_name in databases:
-            if db_name in self.connectors:
-                connector = self.connectors[db_name]
-                search_tasks.append(connector.search(query, filters))
-                sources_searched.append(db_name)
-        
-        # Execute searches concurrently
-        if search_tasks:
-            search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
-            
-            for i, result in enumerate(search_results):
-                if not isinstance(result, Exception):
-                    all_results.extend(result[:max_results // len(databases)])
+        ranked_by_source: Dict[str, List[Dict[str, Any]]] = {}
+        outcomes: Dict[str, List[str]] = {"timed_out": [], "failed": [], "skipped": []}
         
-        # Sort by relevance score
-        all_results.sort(key=lambda x: x.get("relevance_score", 0), reverse=True)
+        async for db_name, results, outcome in self._fan_out(query, databases, filters, deadline_seconds):
+            if results is not None:
+                ranked_by_source[db_name] = results[:max_results]
+            else:
+                outcomes[outcome].append(db_name)
         
         search_time_ms = int((time.time() - start_time) * 1000)
         
         return {
-            "results": all_results[:max_results],
+            "results": list(merge_ranked(ranked_by_source.values(), max_results)),
             "search_time_ms": search_time_ms,
-            "sources_searched": sources_searched
+            "sources_searched": [
+                db_name for db_name in databases
+                if db_name in self.connectors and db_name not in outcomes["skipped"]
+            ],
+            "partial": any(outcomes.values()),
+            "timed_out_sources": outcomes["timed_out"],
+            "failed_sources": outcomes["failed"],
+            "skipped_sources": outcomes["skipped"]
+        }
+    
+    async def stream_search(
+        self,
+        query: str,
+        databases: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        page_size: int = 20,
+        deadline_seconds: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream search results as each connector answers, so the first page
+        renders before slow sources finish. Every "results" event carries
+        only citations not sent before, at most ``page_size`` per source; a
+        final "complete" event reports timing and partial-result flags.
+        """
+        start_time = time.time()
+        seen: Set[str] = set()
+        outcomes: Dict[str, List[str]] = {"timed_out": [], "failed": [], "skipped": []}
+        total = 0
+        
+        async for db_name, results, outcome in self._fan_out(query, databases, filters, deadline_seconds):
+            if results is None:
+                outcomes[outcome].append(db_name)
+                continue
+            
+            fresh = list(merge_ranked([results[:page_size]], page_size, seen))
+            total += len(fresh)
+            yield {"event": "results", "data": {"source": db_name, "results": fresh}}
+        
+        yield {
+            "event": "complete",
+            "data": {
+                "total_results": total,
+                "search_time_ms": int((time.time() - start_time) * 1000),
+                "partial": any(outcomes.values()),
+                "timed_out_sources": outcomes["timed_out"],
+                "failed_sources": outcomes["failed"],
+                "skipped_sources": outcomes["skipped"]
+            }
+        }
+    
+    async def _fan_out(
+        self,
+        query: str,
+        databases: List[str],
+        filters: Optional[Dict[str, Any]],
+        deadline_seconds: Optional[float]
+    ) -> AsyncIterator[Tuple[str, Optional[List[Dict[str, Any]]], Optional[str]]]:
+        """
+        Query connectors concurrently under the overall deadline, yielding
+        ``(db_name, results, None)`` as each answers, or
+        ``(db_name, None, outcome)`` with outcome timed_out, failed or skipped.
+        """
+        deadline = time.monotonic() + (deadline_seconds or settings.LEGAL_DB_SEARCH_DEADLINE_SECONDS)
+        pending: Dict[asyncio.Task, str] = {
+            asyncio.create_task(self._cached_search(db_name, query, filters)): db_name
+            for db_name in dict.fromkeys(databases)
+            if db_name in self.connectors
+        }
+        
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                
+                for task in done:
+                    db_name = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        yield db_name, task.result(), None
+                    elif isinstance(error, CircuitOpenError):
+                        yield db_name, None, "skipped"
+                    elif isinstance(error, asyncio.TimeoutError):
+                        yield db_name, None, "timed_out"
+                    else:
+                        logger.warning(f"{db_name} search failed: {error}")
+                        yield db_name, None, "failed"
+            
+            # Connectors still running at the deadline
+            for task, db_name in list(pending.items()):
+                task.cancel()
+                self.breakers[db_name].record_failure()
+                yield db_name, None, "timed_out"
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _cached_search(
+        self,
+        db_name: str,
+        query: str,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Serve a connector's answer from cache, refreshing stale entries in the background"""
+        if self.cache is None or not getattr(self.connectors[db_name], "cacheable", True):
+            return await self._search_connector(db_name, query, filters)
+        
+        key = self.cache.make_key(db_name, query, filters)
+        cached = await self.cache.get(db_name, key)
+        if cached is not None:
+            results, fresh = cached
+            if not fresh:
+                self._schedule_revalidation(db_name, key, query, filters)
+            return results
+        
+        results = await self._search_connector(db_name, query, filters)
+        await self.cache.set(db_name, key, results)
+        return results
+    
+    def _schedule_revalidation(
+        self,
+        db_name: str,
+        key: str,
+        query: str,
+        filters: Optional[Dict[str, Any]]
+    ):
+        """Refresh a stale cache entry once, in the background"""
+        if not self.breakers[db_name].available:
+            return
+        
+        async def refresh():
+            results = await self._search_connector(db_name, query, filters)
+            await self.cache.set(db_name, key, results)
+        
+        self.cache.revalidate(key, refresh)
+    
+    async def _search_connector(
+        self,
+        db_name: str,
+        query: str,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Search one connector under its own timeout, else the default one.
+        With hedging enabled, a second identical request is started if the
+        first has not answered within the hedge delay, and whichever
+        finishes first wins.
+        """
+        connector = self.connectors[db_name]
+        breaker = self.breakers[db_name]
+        if not breaker.allow():
+            raise CircuitOpenError(db_name)
+        
+        timeout = getattr(connector, "timeout_seconds", None) or settings.LEGAL_DB_CONNECTOR_TIMEOUT_SECONDS
+        try:
+            results = await asyncio.wait_for(
+                hedged_call(
+                    lambda: connector.search(query, filters),
+                    hedge_after_seconds=settings.LEGAL_DB_HEDGE_AFTER_SECONDS
+                ),
+                timeout=timeout
+            )
+        except asyncio.CancelledError:
+            # Cancelled by the caller (e.g. the search deadline) with no verdict on the upstream
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        
+        breaker.record_success()
+        return results
+    
+    async def close(self):
+        """Close pooled upstream connections"""
+        await self.http_pool.close()
+    
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """Search cache hit ratio and saved upstream calls"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.get_metrics()}
+    
+    def get_connector_health(self) -> Dict[str, Dict[str, Any]]:
+        """Circuit breaker state per connector"""
+        return {
+            name: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.consecutive_failures
+            }
+            for name, breaker in self.breakers.items()
         }
 
+class LocalIndexConnector:
+    """
+    Offline connector over a local BM25 index of case law, statutes and
+    knowledge base items already ingested into CounselFlow. Filters support
+    ``jurisdiction`` and ``content_type``; quoted query parts are phrases.
+    The index is shared by every user and firm, so only items marked
+    ``is_public`` go into it, whatever their content type.
+    """
+    
+    # Answers are local and fast, and go stale on rebuild; not worth caching
+    cacheable = False
+    timeout_seconds: Optional[float] = None
+    
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        active = self._active_generation()
+        self.index = LocalSearchIndex.load(active) if active else LocalSearchIndex.empty()
+    
+    def _active_generation(self) -> Optional[str]:
+        """Directory of the current index generation, named by the CURRENT file"""
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT")) as handle:
+                directory = os.path.join(self.index_dir, handle.read().strip())
+        except FileNotFoundError:
+            return None
+        return directory if LocalSearchIndex.exists(directory) else None
+    
+    async def search(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Search the local index"""
+        filters = filters or {}
+        content_types = filters.get("content_type")
+        if isinstance(content_types, str):
+            content_types = [content_types]
+        
+        hits = await asyncio.to_thread(
+            self.index.search, query, 50, filters.get("jurisdiction"), content_types
+        )
+        return [
+            {
+                **entry,
+                "id": f"local_{entry['id']}",
+                # Squash unbounded BM25 scores into the 0-1 range used by the other sources
+                "relevance_score": round(score / (score + settings.LEGAL_DB_LOCAL_SCORE_SCALE), 4),
+                "source": "CounselFlow"
+            }
+            for entry, score in hits
+        ]
+    
+    async def rebuild(self) -> int:
+        """Re-index from the database and swap in the new, memory-mapped index"""
+        documents = await asyncio.to_thread(self._load_documents)
+        
+        def build_and_save():
+            # Each rebuild writes a new generation; files of the live index are
+            # memory-mapped and must never be overwritten in place
+            previous = self._active_generation()
+            generation = f"gen-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+            directory = os.path.join(self.index_dir, generation)
+            LocalSearchIndex.build(documents).save(directory)
+            
+            pointer = os.path.join(self.index_dir, "CURRENT")
+            with open(f"{pointer}.tmp", "w") as handle:
+                handle.write(generation)
+            os.replace(f"{pointer}.tmp", pointer)
+            
+            index = LocalSearchIndex.load(directory)
+            if previous:
+                # Unlinked files stay readable by any search still mapping them
+                shutil.rmtree(previous, ignore_errors=True)
+            return index
+        
+        self.index = await asyncio.to_thread(build_and_save)
+        return len(self.index)
+    
+    def _load_documents(self) -> List[Dict[str, Any]]:
+        from app.core.database import SessionLocal
+        from app.models import KnowledgeItem
+        
+        db = SessionLocal()
+        try:
+            items = db.query(KnowledgeItem)\
+                .filter(KnowledgeItem.is_public.is_(True))\
+                .all()
+            return [
+                {
+                    "id": str(item.id),
+                    "title": item.title,
+                    "citation": item.title,
+                    "date": item.created_at.date().isoformat() if item.created_at else None,
+                    "summary": item.summary or item.content[:300],
+                    "text": item.content,
+                    "jurisdiction": item.jurisdiction,
+                    "content_type": item.content_type
+                }
+                for item in items
+            ]
+        finally:
+            db.close()
+
+class CourtListenerConnector(BaseHTTPConnector):
+    """CourtListener opinion search over the pooled HTTP client"""
+    
+    base_url = "https://www.courtlistener.com"
+    # Authenticated quota is 5,000 requests per hour
+    max_concurrency = 4
+    rate_per_second = 1.35
+    burst = 5
+    
+    def auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Token {self.api_key}"} if self.api_key else {}
+    
+    async def search(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Search CourtListener opinions, best match first"""
+        filters = filters or {}
+        params = {"q": query, "type": "o", "order_by": "score desc"}
+        if filters.get("court"):
+            params["court"] = filters["court"]
+        if filters.get("date_from"):
+            params["filed_after"] = filters["date_from"]
+        
+        data = await self._get_json("/api/rest/v4/search/", params)
+        results = data.get("results", [])
+        return [
+            {
+                "id": f"cl_{item.get('cluster_id')}",
+                "title": item.get("caseName") or "Untitled opinion",
+                "citation": (item.get("citation") or [None])[0],
+                "court": item.get("court"),
+                "date": item.get("dateFiled"),
+                "summary": ((item.get("opinions") or [{}])[0].get("snippet") or "").strip(),
+                "url": f"{self.base_url}{item.get('absolute_url', '')}",
+                # CourtListener scores are not normalised; rank decides relevance
+                "relevance_score": round(1.0 - 0.5 * position / max(len(results), 1), 4),
+                "source": "CourtListener"
+            }
+            for position, item in enumerate(results)
+        ]
+
 class MockWestlawConnector:
     """Mock Westlaw connector for demo purposes"""
     
@@ -152,3 +530,6 @@ class MockCourtListenerConnector:
                 "source": "CourtListener"
             }
         ]
+
+# Shared instance so circuit breaker state survives across requests
+legal_database_service = LegalDatabaseService()
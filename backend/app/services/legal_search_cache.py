@@ -0,0 +1,177 @@
+"""
+Legal Search Result Cache
+Two-tier (in-process LRU + Redis) cache of connector results with stale-while-revalidate
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class LegalSearchCache:
+    """
+    Cache of legal database results, one entry per connector and query
+
+    Entries are keyed by connector, normalized query and filters, so a
+    search over any set of databases reuses each connector's cached answer.
+    An entry is fresh for its connector's TTL and then stale for a further
+    ``stale_ttl_seconds``: stale entries are still served immediately while
+    ``revalidate`` refreshes them in the background, at most once per key at
+    a time. The in-process tier is an LRU; the Redis tier is shared between
+    workers when configured.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        default_ttl_seconds: int = 3600,
+        connector_ttls: Optional[Dict[str, int]] = None,
+        stale_ttl_seconds: int = 86400,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "legal_search"
+    ):
+        self.max_entries = max_entries
+        self.default_ttl_seconds = default_ttl_seconds
+        self.connector_ttls = connector_ttls or {}
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.key_prefix = key_prefix
+
+        # key -> (fetched_at wall-clock time, results)
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._metrics = {
+            "fresh_hits": 0,
+            "stale_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "evictions": 0,
+            "redis_errors": 0
+        }
+
+        # key -> background refresh in flight
+        self._revalidating: Dict[str, asyncio.Task] = {}
+
+        self.redis_client = None
+        if redis_url:
+            self._setup_redis(redis_url)
+
+    def _setup_redis(self, redis_url: str):
+        """Setup the shared Redis tier"""
+        try:
+            import redis.asyncio as aioredis
+
+            self.redis_client = aioredis.from_url(redis_url, decode_responses=True)
+        except Exception as e:
+            logger.warning(f"Legal search cache Redis tier unavailable: {e}")
+            self.redis_client = None
+
+    def ttl_for(self, connector: str) -> int:
+        return self.connector_ttls.get(connector, self.default_ttl_seconds)
+
+    def make_key(self, connector: str, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Build the cache key for one connector's answer to a query"""
+        payload = json.dumps({
+            "query": _WHITESPACE.sub(" ", query).strip().lower(),
+            "filters": filters or {}
+        }, sort_keys=True, default=str)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{self.key_prefix}:{connector}:{digest}"
+
+    async def get(self, connector: str, key: str) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """Look up cached results; returns (results, is_fresh) or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None and self.redis_client is not None:
+            entry = await self._get_redis(key)
+            if entry is not None:
+                self._metrics["redis_hits"] += 1
+                self._store_local(key, entry)
+
+        if entry is not None:
+            fetched_at, results = entry
+            age = time.time() - fetched_at
+            ttl = self.ttl_for(connector)
+            if age < ttl:
+                self._entries.move_to_end(key)
+                self._metrics["fresh_hits"] += 1
+                return results, True
+            if age < ttl + self.stale_ttl_seconds:
+                self._entries.move_to_end(key)
+                self._metrics["stale_hits"] += 1
+                return results, False
+            self._entries.pop(key, None)
+
+        self._metrics["misses"] += 1
+        return None
+
+    async def set(self, connector: str, key: str, results: List[Dict[str, Any]]):
+        """Store a connector's results in both tiers"""
+        entry = (time.time(), results)
+        self._store_local(key, entry)
+
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(
+                    key,
+                    json.dumps({"fetched_at": entry[0], "results": results}, default=str),
+                    ex=self.ttl_for(connector) + self.stale_ttl_seconds
+                )
+            except Exception as e:
+                self._metrics["redis_errors"] += 1
+                logger.warning(f"Legal search cache Redis write failed: {e}")
+
+    def revalidate(self, key: str, refresh: Callable[[], Awaitable[Any]]) -> bool:
+        """Run ``refresh()`` in the background unless one is already running for the key"""
+        if key in self._revalidating:
+            return False
+
+        self._metrics["revalidations"] += 1
+        task = asyncio.create_task(refresh())
+        self._revalidating[key] = task
+        task.add_done_callback(lambda finished: self._revalidation_done(key, finished))
+        return True
+
+    def _revalidation_done(self, key: str, task: asyncio.Task):
+        self._revalidating.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Legal search cache refresh failed: {task.exception()}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit ratio and the upstream calls the cache has saved"""
+        hits = self._metrics["fresh_hits"] + self._metrics["stale_hits"]
+        lookups = hits + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "entries": len(self._entries),
+            "revalidating": len(self._revalidating),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            # Stale hits still cost one background call, fresh hits cost none
+            "saved_upstream_calls": self._metrics["fresh_hits"] + self._metrics["stale_hits"] - self._metrics["revalidations"],
+            "redis_enabled": self.redis_client is not None
+        }
+
+    async def _get_redis(self, key: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        try:
+            raw = await self.redis_client.get(key)
+        except Exception as e:
+            self._metrics["redis_errors"] += 1
+            logger.warning(f"Legal search cache Redis read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        return value["fetched_at"], value["results"]
+
+    def _store_local(self, key: str, entry: Tuple[float, List[Dict[str, Any]]]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._metrics["evictions"] += 1
@@ -0,0 +1,69 @@
+"""
+Legal Search Result Merging
+k-way merge of ranked connector results with cross-source deduplication
+"""
+import heapq
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+
+def normalize_citation(result: Dict[str, Any]) -> str:
+    """
+    Identity of a result across sources: its citation with case, spacing and
+    punctuation removed ("2024 U.S. LEXIS 1111" == "2024 US Lexis 1111"),
+    falling back to title and date when there is no citation.
+    """
+    citation = result.get("citation")
+    if citation:
+        return _NON_ALNUM.sub("", citation.lower())
+    return _NON_ALNUM.sub("", f"{result.get('title', '')}{result.get('date', '')}".lower())
+
+
+def _ranked(results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Connectors return results best first; tolerate ones that do not"""
+    results = list(results)
+    scores = [result.get("relevance_score", 0) for result in results]
+    if any(a < b for a, b in zip(scores, scores[1:])):
+        results.sort(key=lambda result: result.get("relevance_score", 0), reverse=True)
+    return results
+
+
+def merge_ranked(
+    streams: Iterable[Iterable[Dict[str, Any]]],
+    limit: int,
+    seen: Optional[Set[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily merge already-ranked result streams into one ranking, keeping only
+    the best-scored copy of each citation and stopping after ``limit``
+    results. Memory is O(number of streams + limit). Citations already in
+    ``seen`` are skipped, and emitted citations are added to it, so repeated
+    calls can continue one deduplicated result set.
+    """
+    seen = seen if seen is not None else set()
+    merged = heapq.merge(
+        *(_ranked(stream) for stream in streams),
+        key=lambda result: -result.get("relevance_score", 0)
+    )
+    emitted = 0
+    duplicates: Dict[str, Dict[str, Any]] = {}
+    for result in merged:
+        identity = normalize_citation(result)
+        if identity in seen:
+            kept = duplicates.get(identity)
+            if kept is not None and result.get("source") not in kept["also_in"]:
+                kept["also_in"].append(result.get("source"))
+            continue
+        seen.add(identity)
+
+        result = {**result, "also_in": []}
+        duplicates[identity] = result
+        yield result
+        emitted += 1
+        if emitted >= limit:
+            return
+
+
+__all__ = ["normalize_citation", "merge_ranked"]
@@ -0,0 +1,211 @@
+"""
+Local Legal Search Index
+Positional inverted index with BM25 ranking, phrase queries and memory-mapped on-disk storage
+"""
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PHRASE = re.compile(r'"([^"]+)"')
+
+# Stored with each entry and returned in search results
+STORED_FIELDS = ("id", "title", "citation", "court", "date", "summary", "url", "jurisdiction", "content_type")
+
+_ARRAYS = ("term_offsets", "doc_ids", "term_freqs", "position_offsets", "positions", "doc_lengths")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class LocalSearchIndex:
+    """
+    Immutable positional inverted index over legal texts
+
+    Postings are stored column-wise in flat integer arrays: for term ``t``,
+    ``doc_ids``/``term_freqs`` hold its postings in
+    ``term_offsets[t]:term_offsets[t + 1]``, and each posting's token
+    positions sit in ``positions`` at ``position_offsets[p]:position_offsets[p + 1]``.
+    Saved indexes are reopened with ``np.load(mmap_mode="r")``, so startup
+    cost is independent of index size and pages are read on demand. BM25
+    scoring of a term is one vectorized pass over its postings.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        entries: List[Dict[str, Any]],
+        arrays: Dict[str, np.ndarray],
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.vocabulary = vocabulary
+        self.entries = entries
+        self.arrays = arrays
+        self.k1 = k1
+        self.b = b
+        lengths = arrays["doc_lengths"]
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+        self._jurisdictions = np.array([(entry.get("jurisdiction") or "").lower() for entry in entries], dtype=object)
+        self._content_types = np.array([entry.get("content_type") or "" for entry in entries], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, documents: Iterable[Dict[str, Any]]) -> "LocalSearchIndex":
+        """Index documents with a ``text`` field plus any of STORED_FIELDS"""
+        postings: Dict[str, List[Tuple[int, List[int]]]] = defaultdict(list)
+        entries: List[Dict[str, Any]] = []
+        lengths: List[int] = []
+
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(" ".join(filter(None, [document.get("title"), document.get("text")])))
+            term_positions: Dict[str, List[int]] = defaultdict(list)
+            for position, token in enumerate(tokens):
+                term_positions[token].append(position)
+            for term, term_pos in term_positions.items():
+                postings[term].append((doc_id, term_pos))
+
+            entries.append({name: document.get(name) for name in STORED_FIELDS})
+            lengths.append(len(tokens))
+
+        vocabulary: Dict[str, int] = {}
+        term_offsets = [0]
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        position_offsets = [0]
+        positions: List[int] = []
+        for term_id, term in enumerate(sorted(postings)):
+            vocabulary[term] = term_id
+            for doc_id, term_pos in postings[term]:
+                doc_ids.append(doc_id)
+                term_freqs.append(len(term_pos))
+                positions.extend(term_pos)
+                position_offsets.append(len(positions))
+            term_offsets.append(len(doc_ids))
+
+        arrays = {
+            "term_offsets": np.asarray(term_offsets, dtype=np.int64),
+            "doc_ids": np.asarray(doc_ids, dtype=np.int32),
+            "term_freqs": np.asarray(term_freqs, dtype=np.int32),
+            "position_offsets": np.asarray(position_offsets, dtype=np.int64),
+            "positions": np.asarray(positions, dtype=np.int32),
+            "doc_lengths": np.asarray(lengths, dtype=np.int32)
+        }
+        return cls(vocabulary, entries, arrays)
+
+    @classmethod
+    def empty(cls) -> "LocalSearchIndex":
+        return cls.build([])
+
+    def save(self, directory: str):
+        """Persist the index; arrays as .npy so they can be memory-mapped on load"""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), self.arrays[name])
+        with open(os.path.join(directory, "index.json"), "w") as handle:
+            json.dump({"vocabulary": self.vocabulary, "entries": self.entries}, handle)
+
+    @classmethod
+    def load(cls, directory: str) -> "LocalSearchIndex":
+        """Open a saved index with its posting arrays memory-mapped"""
+        with open(os.path.join(directory, "index.json")) as handle:
+            meta = json.load(handle)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in _ARRAYS
+        }
+        return cls(meta["vocabulary"], meta["entries"], arrays)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "index.json"))
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        jurisdiction: Optional[str] = None,
+        content_types: Optional[List[str]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        BM25 search. Quoted parts of the query are phrases that must appear
+        verbatim; results can be restricted by jurisdiction and content type.
+        Returns (entry, score) pairs, best first.
+        """
+        if not self.entries:
+            return []
+
+        phrases = [tokenize(phrase) for phrase in _PHRASE.findall(query)]
+        terms = tokenize(_PHRASE.sub(" ", query)) + [term for phrase in phrases for term in phrase]
+        term_ids = [self.vocabulary.get(term) for term in dict.fromkeys(terms)]
+        if not terms or any(term not in self.vocabulary for phrase in phrases for term in phrase):
+            return []
+
+        scores = np.zeros(len(self.entries), dtype=np.float32)
+        matched = np.zeros(len(self.entries), dtype=bool)
+        lengths = self.arrays["doc_lengths"]
+        for term_id in term_ids:
+            if term_id is None:
+                continue
+            start, end = self.arrays["term_offsets"][term_id], self.arrays["term_offsets"][term_id + 1]
+            docs = self.arrays["doc_ids"][start:end]
+            freqs = self.arrays["term_freqs"][start:end].astype(np.float32)
+            idf = np.log1p((len(self.entries) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / max(self.average_length, 1.0))
+            scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+            matched[docs] = True
+
+        for phrase in phrases:
+            matched &= self._phrase_mask(phrase)
+        if jurisdiction or content_types:
+            matched &= self._filter_mask(jurisdiction, content_types)
+
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+        limit = min(limit, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.entries[doc_id], float(scores[doc_id])) for doc_id in best]
+
+    def _postings(self, term: str) -> Dict[int, np.ndarray]:
+        """Map of doc id -> positions of ``term``"""
+        term_id = self.vocabulary[term]
+        start, end = self.arrays["term_offsets"][term_id], self.arrays["term_offsets"][term_id + 1]
+        offsets = self.arrays["position_offsets"]
+        return {
+            int(doc_id): self.arrays["positions"][offsets[posting]:offsets[posting + 1]]
+            for posting, doc_id in zip(range(start, end), self.arrays["doc_ids"][start:end])
+        }
+
+    def _phrase_mask(self, phrase: List[str]) -> np.ndarray:
+        mask = np.zeros(len(self.entries), dtype=bool)
+        postings = [self._postings(term) for term in phrase]
+        candidates = set(postings[0]).intersection(*postings[1:])
+        for doc_id in candidates:
+            # A phrase starts at p when term i occurs at p + i for every i
+            starts = postings[0][doc_id]
+            for offset, term_postings in enumerate(postings[1:], start=1):
+                starts = np.intersect1d(starts, term_postings[doc_id] - offset, assume_unique=True)
+                if not len(starts):
+                    break
+            mask[doc_id] = bool(len(starts))
+        return mask
+
+    def _filter_mask(self, jurisdiction: Optional[str], content_types: Optional[List[str]]) -> np.ndarray:
+        mask = np.ones(len(self.entries), dtype=bool)
+        if jurisdiction:
+            mask &= self._jurisdictions == jurisdiction.lower()
+        if content_types:
+            mask &= np.isin(self._content_types, list(content_types))
+        return mask
+
+
+__all__ = ["LocalSearchIndex", "tokenize"]
@@ -0,0 +1,134 @@
+"""
+Post-Commit Pipeline
+Background execution of side effects after a database commit, ordered per key with retries
+"""
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A named side effect; the factory is called again for every attempt
+Step = Tuple[str, Callable[[], Awaitable[Any]]]
+
+
+class PostCommitPipeline:
+    """
+    Runs the side effects of committed changes in background workers
+
+    Each ``submit`` is a batch of steps for one key (e.g. a document id).
+    Batches for the same key run strictly in submission order, one at a
+    time, and steps within a batch run in order; different keys run
+    concurrently up to ``max_concurrency``. A failing step is retried with
+    exponential backoff and jitter; once ``max_attempts`` are used up it is
+    recorded as dead and the batch carries on with its next step, so one
+    broken side effect never blocks the others or later batches.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_attempts: int = 4,
+        base_backoff_seconds: float = 0.5,
+        max_backoff_seconds: float = 30.0,
+        max_dead_letters: int = 100
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._queues: Dict[str, Deque[List[Step]]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._dead_letters: Deque[Dict[str, Any]] = deque(maxlen=max_dead_letters)
+        self._metrics = {"submitted": 0, "completed": 0, "retries": 0, "dead": 0}
+
+    def submit(self, key: str, steps: List[Step]):
+        """Queue a batch of steps behind any earlier batches for the same key"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Event()
+
+        self._queues.setdefault(key, deque()).append(steps)
+        self._metrics["submitted"] += 1
+        self._idle.clear()
+        if key not in self._workers:
+            self._start_worker(key)
+
+    def _start_worker(self, key: str):
+        task = asyncio.create_task(self._drain_key(key))
+        self._workers[key] = task
+        task.add_done_callback(lambda finished, key=key: self._worker_done(key, finished))
+
+    async def drain(self):
+        """Wait until every queued batch has been processed"""
+        if self._idle is not None and self._workers:
+            await self._idle.wait()
+
+    async def shutdown(self, timeout_seconds: float = 10.0):
+        """Give queued side effects a chance to finish, then cancel the rest"""
+        try:
+            await asyncio.wait_for(self.drain(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Post-commit pipeline shutdown with {self.pending()} batches pending")
+            for task in list(self._workers.values()):
+                task.cancel()
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            "pending": self.pending(),
+            "active_keys": len(self._workers),
+            "dead_letters": list(self._dead_letters)
+        }
+
+    async def _drain_key(self, key: str):
+        queue = self._queues[key]
+        while queue:
+            steps = queue[0]
+            async with self._semaphore:
+                for name, factory in steps:
+                    await self._run_step(key, name, factory)
+            queue.popleft()
+            self._metrics["completed"] += 1
+
+    async def _run_step(self, key: str, name: str, factory: Callable[[], Awaitable[Any]]):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await factory()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Post-commit step {name} for {key} failed after {attempt} attempts: {e}")
+                    self._metrics["dead"] += 1
+                    self._dead_letters.append({"key": key, "step": name, "error": str(e)})
+                    return
+                backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (attempt - 1))
+                logger.warning(f"Post-commit step {name} for {key} failed (attempt {attempt}), retrying: {e}")
+                self._metrics["retries"] += 1
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+
+    def _worker_done(self, key: str, task: asyncio.Task):
+        self._workers.pop(key, None)
+        if task.cancelled():
+            self._queues.pop(key, None)
+        elif self._queues.get(key):
+            # A batch arrived after the worker saw an empty queue
+            self._start_worker(key)
+            return
+        else:
+            self._queues.pop(key, None)
+        if not self._workers:
+            self._idle.set()
+
+
+__all__ = ["PostCommitPipeline", "Step"]
@@ -0,0 +1,92 @@
+"""
+Presence Aggregator
+Coalesces cursor and selection updates per room and flushes them as batched frames at a fixed tick rate
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceAggregator:
+    """
+    Per-room buffer of the latest presence state of each user
+
+    ``update`` only records the newest cursor or selection for a user,
+    replacing (and counting as superseded) anything not yet sent. A ticker
+    per room flushes the users that changed since the last tick as one
+    ``presence_batch`` frame through ``send(room, frame)``, at most
+    ``tick_hz`` times a second. Egress per room therefore follows the tick
+    rate, not the event rate. A room's ticker stops as soon as a tick has
+    nothing to send.
+    """
+
+    def __init__(self, send: Callable[[str, Dict[str, Any]], Awaitable[Any]], tick_hz: float = 20.0):
+        self.send = send
+        self.interval = 1.0 / tick_hz
+        # room -> user_id -> {"cursor": ..., "selection": ...} changed since the last flush
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._tickers: Dict[str, asyncio.Task] = {}
+        self._metrics = {"updates": 0, "superseded": 0, "frames": 0}
+
+    def update(self, room: str, user_id: str, kind: str, value: Any, **fields: Any):
+        """Record a user's latest ``kind`` ("cursor" or "selection") in a room"""
+        self._metrics["updates"] += 1
+        user_state = self._pending.setdefault(room, {}).setdefault(user_id, {"user_id": user_id})
+        if kind in user_state:
+            self._metrics["superseded"] += 1
+        user_state[kind] = value
+        user_state.update(fields)
+
+        if room not in self._tickers:
+            self._start_ticker(room)
+
+    def remove_user(self, room: str, user_id: str):
+        """Forget unsent presence of a user who left the room"""
+        pending = self._pending.get(room)
+        if pending is not None:
+            pending.pop(user_id, None)
+
+    async def flush(self, room: str) -> Optional[Dict[str, Any]]:
+        """Send the room's pending presence now; returns the frame, or None if nothing changed"""
+        users = self._pending.pop(room, None)
+        if not users:
+            return None
+
+        frame = {
+            "type": "presence_batch",
+            "room": room,
+            "users": list(users.values()),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        self._metrics["frames"] += 1
+        await self.send(room, frame)
+        return frame
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._metrics, "active_rooms": len(self._tickers), "tick_hz": round(1.0 / self.interval, 2)}
+
+    def _start_ticker(self, room: str):
+        task = asyncio.create_task(self._tick(room))
+        self._tickers[room] = task
+        task.add_done_callback(lambda finished, room=room: self._ticker_done(room, finished))
+
+    async def _tick(self, room: str):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self.flush(room) is None:
+                    return
+            except Exception as e:
+                logger.error(f"Presence flush for room {room} failed: {e}")
+
+    def _ticker_done(self, room: str, task: asyncio.Task):
+        self._tickers.pop(room, None)
+        # An update may have arrived between the empty tick and this callback
+        if not task.cancelled() and self._pending.get(room):
+            self._start_ticker(room)
+
+
+__all__ = ["PresenceAggregator"]
@@ -0,0 +1,272 @@
+"""
+Document Text Diff Engine
+Linear-space Myers diff at line and word granularity, with a time budget and line-hash similarity
+"""
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+_WORD = re.compile(r"\S+")
+
+# (tag, i1, i2, j1, j2) with the same meaning as difflib.SequenceMatcher.get_opcodes
+Opcode = Tuple[str, int, int, int, int]
+
+
+class _Budget:
+    """Wall-clock deadline shared by every step of one diff"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.exceeded = False
+
+    def expired(self) -> bool:
+        if not self.exceeded and self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded = True
+        return self.exceeded
+
+
+def _intern(a: Sequence[Hashable], b: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    """Replace tokens by small ints so the inner loops compare ints, not strings"""
+    ids: Dict[Hashable, int] = {}
+    return [ids.setdefault(x, len(ids)) for x in a], [ids.setdefault(x, len(ids)) for x in b]
+
+
+def _middle_snake(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int, budget: _Budget):
+    """
+    Find the middle snake of the shortest edit script of a[alo:ahi] -> b[blo:bhi]
+    by running Myers' search from both ends in O(N + M) space. Returns the
+    snake's start and end relative to (alo, blo), or None if the budget ran out.
+    """
+    n, m = ahi - alo, bhi - blo
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    forward = [0] * (2 * max_d + 3)
+    backward = [0] * (2 * max_d + 3)
+
+    for d in range(max_d + 1):
+        if d % 64 == 63 and budget.expired():
+            return None
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and delta - (d - 1) <= k <= delta + (d - 1):
+                if x + backward[offset + delta - k] >= n:
+                    return start_x, start_y, x, y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d:
+                if x + forward[offset + delta - k] >= n:
+                    return n - x, m - y, n - start_x, m - start_y
+
+    return None
+
+
+def _matching_blocks(
+    a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int,
+    blocks: List[Tuple[int, int, int]], budget: _Budget
+):
+    prefix = 0
+    while alo + prefix < ahi and blo + prefix < bhi and a[alo + prefix] == b[blo + prefix]:
+        prefix += 1
+    if prefix:
+        blocks.append((alo, blo, prefix))
+        alo += prefix
+        blo += prefix
+
+    suffix = 0
+    while alo < ahi - suffix and blo < bhi - suffix and a[ahi - 1 - suffix] == b[bhi - 1 - suffix]:
+        suffix += 1
+    ahi -= suffix
+    bhi -= suffix
+
+    # Out of time: leave what remains as one replaced region
+    if alo < ahi and blo < bhi and not budget.expired():
+        snake = _middle_snake(a, alo, ahi, b, blo, bhi, budget)
+        if snake is not None:
+            x, y, u, v = snake
+            _matching_blocks(a, alo, alo + x, b, blo, blo + y, blocks, budget)
+            if u > x:
+                blocks.append((alo + x, blo + y, u - x))
+            _matching_blocks(a, alo + u, ahi, b, blo + v, bhi, blocks, budget)
+
+    if suffix:
+        blocks.append((ahi, bhi, suffix))
+
+
+def diff_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], budget: Optional[_Budget] = None) -> List[Opcode]:
+    """Minimal edit script between two token sequences as difflib-style opcodes"""
+    budget = budget or _Budget(None)
+    a_ids, b_ids = _intern(a, b)
+    blocks: List[Tuple[int, int, int]] = []
+    _matching_blocks(a_ids, 0, len(a_ids), b_ids, 0, len(b_ids), blocks, budget)
+
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for block_i, block_j, size in blocks + [(len(a_ids), len(b_ids), 0)]:
+        if i < block_i and j < block_j:
+            opcodes.append(("replace", i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(("delete", i, block_i, j, block_j))
+        elif j < block_j:
+            opcodes.append(("insert", i, block_i, j, block_j))
+        if size:
+            if opcodes and opcodes[-1][0] == "equal":
+                opcodes[-1] = ("equal", opcodes[-1][1], block_i + size, opcodes[-1][3], block_j + size)
+            else:
+                opcodes.append(("equal", block_i, block_i + size, block_j, block_j + size))
+        i, j = block_i + size, block_j + size
+    return opcodes
+
+
+def _grouped(opcodes: List[Opcode], context: int) -> List[List[Opcode]]:
+    """Hunks of changes with ``context`` equal lines around them (as difflib)"""
+    if not opcodes:
+        opcodes = [("equal", 0, 1, 0, 1)]
+    codes = list(opcodes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(
+    a: List[str], b: List[str], opcodes: List[Opcode],
+    fromfile: str = "", tofile: str = "", context: int = 3
+) -> List[str]:
+    """Unified diff lines (lineterm="") for precomputed line opcodes"""
+    lines: List[str] = []
+    for group in _grouped(opcodes, context):
+        if not lines:
+            lines.extend([f"--- {fromfile}", f"+++ {tofile}"])
+        first, last = group[0], group[-1]
+        lines.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b[j1:j2])
+    return lines
+
+
+def line_similarity(a: List[str], b: List[str]) -> float:
+    """Share of lines the two texts have in common, from a multiset of line hashes"""
+    if not a and not b:
+        return 1.0
+    common = sum((Counter(map(hash, a)) & Counter(map(hash, b))).values())
+    return 2.0 * common / (len(a) + len(b))
+
+
+def compute_diff(
+    from_text: str,
+    to_text: str,
+    fromfile: str = "",
+    tofile: str = "",
+    time_budget_seconds: Optional[float] = 2.0,
+    max_word_changes: int = 200
+) -> Dict[str, Any]:
+    """
+    Line diff plus word-level changes inside replaced lines, within a time
+    budget. When the budget runs out, unmatched regions are reported as
+    whole-block replacements and ``complete`` is False; the result is still
+    a correct (if not minimal) diff. Plain data in and out, so it can run in
+    a process pool.
+    """
+    budget = _Budget(time_budget_seconds)
+    from_lines, to_lines = from_text.splitlines(), to_text.splitlines()
+    opcodes = diff_opcodes(from_lines, to_lines, budget)
+
+    word_changes: List[Dict[str, Any]] = []
+    words_added = words_removed = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "replace" or budget.expired():
+            continue
+        from_words = _WORD.findall("\n".join(from_lines[i1:i2]))
+        to_words = _WORD.findall("\n".join(to_lines[j1:j2]))
+        for word_tag, w1, w2, v1, v2 in diff_opcodes(from_words, to_words, budget):
+            if word_tag == "equal":
+                continue
+            words_removed += w2 - w1
+            words_added += v2 - v1
+            if len(word_changes) < max_word_changes:
+                word_changes.append({
+                    "line": i1 + 1,
+                    "removed": " ".join(from_words[w1:w2]),
+                    "added": " ".join(to_words[v1:v2])
+                })
+
+    diff = unified_diff(from_lines, to_lines, opcodes, fromfile, tofile)
+    added_lines = sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag in ("replace", "insert"))
+    removed_lines = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag in ("replace", "delete"))
+
+    return {
+        "unified_diff": diff,
+        "changes": {
+            "added": added_lines,
+            "removed": removed_lines,
+            "modified": sum(1 for line in diff if line.startswith("@@"))
+        },
+        "word_changes": word_changes,
+        "statistics": {
+            "lines_added": added_lines,
+            "lines_removed": removed_lines,
+            "total_changes": added_lines + removed_lines,
+            "words_added": words_added,
+            "words_removed": words_removed,
+            "from_word_count": len(from_text.split()),
+            "to_word_count": len(to_text.split())
+        },
+        "similarity_score": int(line_similarity(from_lines, to_lines) * 100),
+        "complete": not budget.exceeded
+    }
+
+
+__all__ = ["diff_opcodes", "unified_diff", "line_similarity", "compute_diff"]
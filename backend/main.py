@@ -48,6 +48,10 @@ from app.core.database import get_db, engine, Base
 from app.core.config import settings
 from app.core.auth import auth_service, get_current_user
 from app.core.security import ClientPrivilegeProtector, EncryptionMiddleware, AuditLogger
+from app.core.ai_orchestrator import ai_orchestrator
+from app.core.websocket import connection_manager
+from app.services.legal_database_service import legal_database_service
+from app.services.document_version_service import shutdown_diff_executor, version_pipeline
 from app.models import User
 
 # Configure logging
@@ -161,6 +165,12 @@ async def startup_event():
         # Initialize security systems
         logger.info("Security systems initialized")
         
+        # Join the WebSocket backplane so messages from other workers arrive
+        await connection_manager.start()
+        
+        # Flush AI usage on a timer, not only when tasks finish
+        await ai_orchestrator.start()
+        
         # Log application startup
         audit_logger.log_security_event(
             event_type="application_startup",
@@ -183,6 +193,14 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on application shutdown"""
     try:
+        # Stop queued and running AI tasks
+        await ai_orchestrator.shutdown()
+        await legal_database_service.close()
+        await document_versions.collaboration_service.engine.close()
+        await version_pipeline.shutdown()
+        shutdown_diff_executor()
+        await connection_manager.close()
+        
         # Log application shutdown
         audit_logger.log_security_event(
             event_type="application_shutdown",
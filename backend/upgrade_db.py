@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Upgrade an existing PostgreSQL database to the current schema
+
+create_all only creates missing tables; it never alters existing ones. Run
+this once after deploying a release that changes columns or constraints on
+existing tables. Every step is idempotent, so running it again is safe.
+
+    python upgrade_db.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import engine, Base
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from sqlalchemy import text
+
+# Delta version storage: content moves to content_blob for keyframes and deltas
+VERSION_STORAGE = [
+    "ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS storage_type VARCHAR(20) NOT NULL DEFAULT 'full'",
+    "ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS content_blob BYTEA",
+    "ALTER TABLE document_versions ADD COLUMN IF NOT EXISTS delta_base_id UUID REFERENCES document_versions(id)",
+    "ALTER TABLE document_versions ALTER COLUMN content DROP NOT NULL",
+]
+
+# Atomic version numbering and locking: unique version numbers per document,
+# at most one active exclusive lock, and a seeded per-document edit state
+EDIT_STATE = [
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM document_versions
+            GROUP BY document_id, version_number HAVING count(*) > 1
+        ) THEN
+            RAISE EXCEPTION 'document_versions has duplicate (document_id, version_number) rows; '
+                'renumber them before upgrading';
+        END IF;
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_document_versions_document_number'
+        ) THEN
+            ALTER TABLE document_versions
+                ADD CONSTRAINT uq_document_versions_document_number UNIQUE (document_id, version_number);
+        END IF;
+    END $$
+    """,
+    # Locks are short-lived: keep only the newest of any competing exclusive locks
+    """
+    UPDATE document_locks SET is_active = false
+    WHERE is_active AND lock_type = 'exclusive' AND id NOT IN (
+        SELECT DISTINCT ON (document_id) id FROM document_locks
+        WHERE is_active AND lock_type = 'exclusive'
+        ORDER BY document_id, acquired_at DESC
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_document_locks_active_exclusive
+        ON document_locks (document_id) WHERE is_active AND lock_type = 'exclusive'
+    """,
+    """
+    INSERT INTO document_edit_states (document_id, last_version_number)
+    SELECT document_id, max(version_number) FROM document_versions GROUP BY document_id
+    ON CONFLICT (document_id) DO UPDATE
+        SET last_version_number = GREATEST(document_edit_states.last_version_number, EXCLUDED.last_version_number)
+    """,
+    # Documents locked before any version was saved still need a state row
+    """
+    INSERT INTO document_edit_states (document_id, last_version_number)
+    SELECT DISTINCT document_id, 0 FROM document_locks WHERE is_active AND expires_at > now()
+    ON CONFLICT (document_id) DO NOTHING
+    """,
+    # Locks held across the upgrade must keep blocking competing writers
+    """
+    UPDATE document_edit_states AS state
+    SET exclusive_lock_id = lock.id, exclusive_expires_at = lock.expires_at
+    FROM document_locks AS lock
+    WHERE lock.document_id = state.document_id
+        AND lock.is_active AND lock.lock_type = 'exclusive' AND lock.expires_at > now()
+    """,
+    """
+    UPDATE document_edit_states AS state
+    SET shared_expires_at = shared.expires_at
+    FROM (
+        SELECT document_id, max(expires_at) AS expires_at FROM document_locks
+        WHERE is_active AND lock_type <> 'exclusive' AND expires_at > now()
+        GROUP BY document_id
+    ) AS shared
+    WHERE shared.document_id = state.document_id
+        AND (state.shared_expires_at IS NULL OR state.shared_expires_at < shared.expires_at)
+    """,
+]
+
+STEPS = [
+    ("document version delta storage", VERSION_STORAGE),
+    ("atomic version numbering and locks", EDIT_STATE),
+]
+
+
+def upgrade():
+    """Create missing tables, then apply each upgrade step in its own transaction"""
+    try:
+        print("Creating missing tables...")
+        Base.metadata.create_all(bind=engine)
+        print("✅ Tables created")
+
+        for name, statements in STEPS:
+            print(f"Applying {name}...")
+            with engine.begin() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+            print(f"✅ {name}")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Upgrade failed: {e}")
+        import traceback
+        print(traceback.format_exc())
+        return False
+
+if __name__ == "__main__":
+    sys.exit(0 if upgrade() else 1)
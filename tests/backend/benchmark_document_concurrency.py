@@ -0,0 +1,124 @@
+"""
+Concurrency stress benchmark for document version numbering and locks
+
+Runs many parallel saves and lock attempts against the configured database
+(DATABASE_URL) and checks that no version number is handed out twice and
+that no two exclusive locks are ever held at once. Needs an existing
+document and user; it adds versions to that document.
+
+    cd backend
+    python ../tests/backend/benchmark_document_concurrency.py --document-id <uuid> --user-id <uuid>
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from app.core.database import SessionLocal  # noqa: E402
+from app.core.websocket import ConnectionManager  # noqa: E402
+from app.models import DocumentVersion  # noqa: E402
+from app.services.document_version_service import DocumentVersionService  # noqa: E402
+
+
+def run_saves(document_id: str, user_id: str, workers: int, saves_per_worker: int):
+    manager = ConnectionManager()
+
+    def worker(worker_id: int):
+        db = SessionLocal()
+        service = DocumentVersionService(db, manager)
+        numbers = []
+        try:
+            for save in range(saves_per_worker):
+                version, _ = service._write_version(
+                    document_id,
+                    title=f"Stress save {worker_id}-{save}",
+                    content=f"Clause 1.\nClause 2 revised by worker {worker_id}, save {save}.\nClause 3.\n",
+                    author_id=user_id
+                )
+                numbers.append(version.version_number)
+        finally:
+            db.close()
+        return numbers
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        allocated = [number for numbers in executor.map(worker, range(workers)) for number in numbers]
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        stored = [
+            number for (number,) in db.query(DocumentVersion.version_number)
+            .filter(DocumentVersion.document_id == document_id)
+        ]
+    finally:
+        db.close()
+
+    duplicates = {number: count for number, count in Counter(stored).items() if count > 1}
+    print(f"saves: {len(allocated)} in {elapsed:.2f}s ({len(allocated) / elapsed:.0f}/s) across {workers} workers")
+    print(f"duplicate version numbers: {len(duplicates)}")
+    print(f"allocated numbers contiguous: {sorted(allocated) == list(range(min(allocated), max(allocated) + 1))}")
+    return not duplicates
+
+
+def run_locks(document_id: str, user_id: str, workers: int, rounds: int):
+    manager = ConnectionManager()
+    holders = 0
+    peak_holders = 0
+    guard = threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def worker(_):
+        nonlocal holders, peak_holders
+        db = SessionLocal()
+        service = DocumentVersionService(db, manager)
+        won = 0
+        try:
+            for _ in range(rounds):
+                barrier.wait()
+                lock = service._try_acquire_lock(document_id, user_id, "exclusive", duration_minutes=5)
+                if lock is not None:
+                    won += 1
+                    with guard:
+                        holders += 1
+                        peak_holders = max(peak_holders, holders)
+                    time.sleep(0.005)
+                    with guard:
+                        holders -= 1
+                    asyncio.run(service.release_lock(str(lock.id), user_id))
+                barrier.wait()
+        finally:
+            db.close()
+        return won
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        wins = sum(executor.map(worker, range(workers)))
+
+    print(f"lock rounds: {rounds}, exclusive grants: {wins}, peak concurrent holders: {peak_holders}")
+    return peak_holders <= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--document-id", required=True)
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--saves", type=int, default=25, help="saves per worker")
+    parser.add_argument("--lock-rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    saves_ok = run_saves(args.document_id, args.user_id, args.workers, args.saves)
+    locks_ok = run_locks(args.document_id, args.user_id, args.workers, args.lock_rounds)
+    print("PASS" if saves_ok and locks_ok else "FAIL")
+    sys.exit(0 if saves_ok and locks_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
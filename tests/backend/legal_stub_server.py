@@ -0,0 +1,65 @@
+"""
+Local stub of a legal database search API for connector tests
+"""
+
+import asyncio
+
+from aiohttp import web
+
+
+class LegalStubServer:
+    """
+    CourtListener-shaped search endpoint on localhost that records how it was
+    called: distinct client connections, peak concurrent requests and
+    request times
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.connections = set()
+        self.request_times = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._runner = None
+        self.base_url = None
+
+    async def _search(self, request: web.Request) -> web.Response:
+        self.connections.add(id(request.transport))
+        self.request_times.append(asyncio.get_running_loop().time())
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        finally:
+            self.in_flight -= 1
+
+        query = request.query.get("q", "")
+        return web.json_response({
+            "count": 2,
+            "results": [
+                {
+                    "cluster_id": index,
+                    "caseName": f"{query.title()} Case {index}",
+                    "citation": [f"{index} F.4th {index * 10}"],
+                    "court": "Court of Appeals for the Second Circuit",
+                    "dateFiled": "2024-01-0{}".format(index),
+                    "absolute_url": f"/opinion/{index}/",
+                    "opinions": [{"snippet": f"Opinion discussing {query}"}]
+                }
+                for index in (1, 2)
+            ]
+        })
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/api/rest/v4/search/", self._search)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        await self._runner.cleanup()
@@ -0,0 +1,64 @@
+"""
+Tests for batch document chunking, packing and response attribution
+"""
+
+from app.core.ai_batch import (
+    build_pack_prompt,
+    chunk_document,
+    estimate_tokens,
+    pack_chunks,
+    split_pack_response
+)
+
+
+class TestAIBatch:
+    """Test that documents are packed under a token budget and answers map back to them"""
+
+    def test_chunks_stay_under_budget_and_keep_all_text(self):
+        """Test that paragraphs are grouped and oversized ones hard-split within the budget"""
+        paragraphs = [f"Clause {index}. " + "The supplier shall indemnify the customer. " * 5 for index in range(20)]
+        paragraphs.append("X" * 2000)
+        text = "\n\n".join(paragraphs)
+
+        chunks = chunk_document("7", text, max_tokens=100)
+        assert len(chunks) > 1
+        assert all(chunk.total == len(chunks) and chunk.document_id == "7" for chunk in chunks)
+        assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+        assert all(len(chunk.text) <= 400 for chunk in chunks)
+        assert "".join("".join(chunk.text for chunk in chunks).split()) == "".join(text.split())
+
+    def test_empty_document_is_one_chunk(self):
+        """Test that an empty document still produces a result slot"""
+        chunks = chunk_document("0", "", max_tokens=100)
+        assert len(chunks) == 1 and chunks[0].text == ""
+
+    def test_packs_respect_budget(self):
+        """Test that small documents share a pack and packs stay under the token budget"""
+        chunks = []
+        for position in range(10):
+            chunks.extend(chunk_document(str(position), "Short lease clause. " * 10, max_tokens=500))
+
+        packs = pack_chunks(chunks, token_budget=200)
+        assert sum(len(pack.chunks) for pack in packs) == 10
+        assert 1 < len(packs) < 10
+        assert all(pack.tokens <= 200 for pack in packs)
+        assert estimate_tokens("") == 1
+
+    def test_response_is_split_back_to_chunks(self):
+        """Test that section headers attribute a pack answer to each chunk"""
+        chunks = chunk_document("0", "Lease A terms.", 100) + chunk_document("1", "Lease B terms.", 100)
+        pack = pack_chunks(chunks, token_budget=1000)[0]
+        prompt = build_pack_prompt(pack, "Review these leases.")
+        assert "### Document 0 part 1/1" in prompt and "### Document 1 part 1/1" in prompt
+
+        response = "### Document 0 part 1/1\nNo break clause.\n\n### Document 1 part 1/1\nRent review in year 5."
+        assert split_pack_response(pack, response) == {
+            ("0", 0): "No break clause.",
+            ("1", 0): "Rent review in year 5."
+        }
+
+        # A model that ignores the headers gives every chunk the whole answer
+        assert split_pack_response(pack, "Both leases are standard.") == {
+            ("0", 0): "Both leases are standard.",
+            ("1", 0): "Both leases are standard."
+        }
@@ -0,0 +1,65 @@
+"""
+Tests for the AI response cache
+"""
+
+import asyncio
+import time
+
+from app.core.ai_cache import AIResponseCache
+
+
+class TestAIResponseCache:
+    """Test keying, namespacing, expiry and metrics of the response cache"""
+
+    def test_key_ignores_whitespace_and_tool_order(self):
+        """Test that normalized prompts and tool sets share one key"""
+        cache = AIResponseCache()
+        key_a = cache.make_key("client:1", "contract_analysis", "gpt", "Analyze  this\ncontract", ["b", "a"])
+        key_b = cache.make_key("client:1", "contract_analysis", "gpt", " Analyze this contract ", ["a", "b"])
+
+        assert key_a == key_b
+
+    def test_keys_are_namespaced_per_client(self):
+        """Test that two clients never share a cache entry"""
+        cache = AIResponseCache()
+        key_a = cache.make_key("client:1", "contract_analysis", "gpt", "same text")
+        key_b = cache.make_key("client:2", "contract_analysis", "gpt", "same text")
+
+        assert key_a != key_b
+        assert key_a.startswith("ai_cache:client:1:")
+
+    def test_hit_miss_and_expiry(self):
+        """Test cache hits, misses and TTL expiry"""
+        async def scenario():
+            cache = AIResponseCache(ttl_seconds=60)
+            key = cache.make_key("client:1", "document_reviewer", "gpt", "doc")
+
+            assert await cache.get(key) is None
+            await cache.set(key, {"response": "ok"})
+            assert await cache.get(key) == {"response": "ok"}
+
+            await cache.set(key, {"response": "stale"}, ttl_seconds=1)
+            cache._entries[key] = (time.monotonic() - 1, {"response": "stale"})
+            assert await cache.get(key) is None
+
+            metrics = cache.get_metrics()
+            assert metrics["memory_hits"] == 1
+            assert metrics["misses"] == 2
+
+        asyncio.run(scenario())
+
+    def test_lru_eviction_and_namespace_invalidation(self):
+        """Test bounded size and per-client invalidation"""
+        async def scenario():
+            cache = AIResponseCache(max_entries=2)
+            keys = [cache.make_key("client:1", "contract_analysis", "gpt", str(i)) for i in range(3)]
+            for key in keys:
+                await cache.set(key, {"response": key})
+
+            assert await cache.get(keys[0]) is None
+            assert cache.get_metrics()["evictions"] == 1
+
+            await cache.invalidate_namespace("client:1")
+            assert cache.get_metrics()["entries"] == 0
+
+        asyncio.run(scenario())
@@ -0,0 +1,66 @@
+"""
+Tests for the local embedding backend
+"""
+
+import numpy as np
+
+from app.core.ai_embeddings import HashingEmbedder, VectorMatrix, top_k
+
+
+class TestHashingEmbedder:
+    """Test the offline feature-hashing embedder"""
+
+    def test_vectors_are_contiguous_unit_float32(self):
+        """Test output layout across several fixed-size batches"""
+        embedder = HashingEmbedder(dim=128, batch_size=2)
+        vectors = embedder.embed(["first clause", "second clause", "third clause", ""])
+
+        assert vectors.shape == (4, 128)
+        assert vectors.dtype == np.float32
+        assert vectors.flags.c_contiguous
+        assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0)
+        assert not vectors[3].any()
+
+    def test_paraphrase_scores_above_unrelated_text(self):
+        """Test that similar text lands closer than unrelated text"""
+        embedder = HashingEmbedder(dim=512)
+        rent, paraphrase, unrelated = embedder.embed([
+            "The tenant shall pay rent monthly in advance.",
+            "The tenant shall pay the rent monthly in advance.",
+            "Damages for patent infringement are trebled."
+        ])
+
+        assert rent @ paraphrase > rent @ unrelated
+
+
+class TestVectorMatrix:
+    """Test storage, vectorized search and persistence"""
+
+    def test_top_k_orders_best_first(self):
+        """Test batched top-k against a brute-force ranking"""
+        rng = np.random.default_rng(0)
+        matrix = rng.standard_normal((50, 16)).astype(np.float32)
+        queries = rng.standard_normal((3, 16)).astype(np.float32)
+
+        indices, scores = top_k(matrix, queries, 5)
+
+        expected = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+        assert np.array_equal(indices, expected)
+        assert np.all(np.diff(scores, axis=1) <= 0)
+
+    def test_delete_groups_and_mmap_round_trip(self, tmp_path):
+        """Test group deletion and reopening a saved matrix memory-mapped"""
+        embedder = HashingEmbedder(dim=64)
+        texts = ["alpha clause", "beta clause", "gamma clause"]
+        matrix = VectorMatrix(64)
+        matrix.add(["a0", "b0", "b1"], embedder.embed(texts), ["doc:a", "doc:b", "doc:b"])
+
+        assert matrix.delete_groups(["doc:b"]) == 2
+        assert matrix.ids == ["a0"]
+
+        matrix.save(str(tmp_path))
+        loaded = VectorMatrix.load(str(tmp_path))
+        assert isinstance(loaded.vectors, np.memmap)
+
+        loaded.add(["c0"], embedder.embed(["gamma clause"]), ["doc:c"])
+        assert [row_id for row_id, _ in loaded.search(embedder.embed(["gamma clause"])[0], 1)] == ["c0"]
@@ -0,0 +1,60 @@
+"""
+Tests for the per-session AI conversation memory store
+"""
+
+from app.core.ai_memory import ConversationMemoryStore
+
+
+class TestConversationMemoryStore:
+    """Test isolation and bounds of conversation memory"""
+
+    def test_histories_are_isolated_per_key(self):
+        """Test that one conversation never sees another's messages"""
+        store = ConversationMemoryStore()
+        store.add_exchange("matter:a", "question a", "answer a")
+        store.add_exchange("matter:b", "question b", "answer b")
+
+        assert store.get_messages("matter:a") == [("human", "question a"), ("ai", "answer a")]
+        assert store.get_messages("matter:b") == [("human", "question b"), ("ai", "answer b")]
+        assert store.get_messages("matter:c") == []
+
+    def test_per_key_history_is_bounded(self):
+        """Test that only the newest messages are kept for a key"""
+        store = ConversationMemoryStore(max_messages_per_key=4)
+        for i in range(5):
+            store.add_exchange("session", f"q{i}", f"a{i}")
+
+        assert store.get_messages("session") == [
+            ("human", "q3"), ("ai", "a3"), ("human", "q4"), ("ai", "a4")
+        ]
+        assert store.get_stats()["total_chars"] == 8
+
+    def test_least_recently_used_key_is_evicted(self):
+        """Test LRU eviction when the key limit is exceeded"""
+        store = ConversationMemoryStore(max_keys=2)
+        store.append("first", "human", "1")
+        store.append("second", "human", "2")
+        store.get_messages("first")
+        store.append("third", "human", "3")
+
+        assert store.get_messages("second") == []
+        assert store.get_messages("first") == [("human", "1")]
+        assert store.get_stats()["evictions"] == 1
+
+    def test_global_character_cap(self):
+        """Test that the total stored text never exceeds the global cap"""
+        store = ConversationMemoryStore(max_total_chars=10)
+        store.append("old", "human", "x" * 6)
+        store.append("new", "human", "y" * 6)
+
+        assert store.get_messages("old") == []
+        assert store.get_stats()["total_chars"] == 6
+
+    def test_clear(self):
+        """Test clearing a conversation releases its memory"""
+        store = ConversationMemoryStore()
+        store.add_exchange("session", "hello", "hi")
+        store.clear("session")
+
+        assert store.get_messages("session") == []
+        assert store.get_stats()["total_chars"] == 0
@@ -0,0 +1,90 @@
+"""
+Tests for AI task cancellation and asynchronous tool execution in the orchestrator
+"""
+
+import asyncio
+import threading
+import time
+
+from app.core.ai_orchestrator import AIAgentOrchestrator, AIAgentType, AITaskPriority
+from app.core.config import settings
+
+
+class TestAIOrchestratorTasks:
+    """Test that cancelled tasks leave the live task set and tools never block the loop"""
+
+    def test_cancelled_running_task_is_finished(self):
+        """Test that cancelling a running task releases it from the active store"""
+        async def main():
+            orchestrator = AIAgentOrchestrator()
+            started = asyncio.Event()
+
+            async def never_answers(*args, **kwargs):
+                started.set()
+                await asyncio.Event().wait()
+
+            orchestrator.get_agent = lambda agent_type, model_name=None: object()
+            orchestrator._execute_agent_query = never_answers
+            task_id = orchestrator.create_task(
+                AIAgentType.LEGAL_RESEARCH, "Limitation period for contract claims?", "user-1",
+                AITaskPriority.MEDIUM, {}
+            )
+            running = asyncio.create_task(orchestrator.execute_task(task_id))
+            await started.wait()
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+            return orchestrator, task_id
+
+        orchestrator, task_id = asyncio.run(main())
+        assert orchestrator.get_task_result(task_id)["status"] == "cancelled"
+        assert orchestrator.active_tasks.get_stats()["finished_entries"] == 1
+
+    def test_sync_tools_run_off_the_event_loop_with_a_timeout(self, monkeypatch):
+        """Test that a blocking tool neither stalls other coroutines nor outlives its timeout"""
+        monkeypatch.setattr(settings, "AI_TOOL_TIMEOUT_SECONDS", 0.2)
+        release = threading.Event()
+
+        def slow_lookup(query):
+            release.wait(2)
+            return f"found {query}"
+
+        async def main():
+            orchestrator = AIAgentOrchestrator()
+            tool = orchestrator._async_tool(slow_lookup)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticking = asyncio.create_task(ticker())
+            started = time.monotonic()
+            timed_out = await tool("Donoghue v Stevenson")
+            elapsed = time.monotonic() - started
+            release.set()
+            answered = await tool("Carlill v Carbolic")
+            ticking.cancel()
+            await orchestrator.shutdown()
+            return timed_out, answered, elapsed, ticks
+
+        timed_out, answered, elapsed, ticks = asyncio.run(main())
+        assert timed_out.startswith("Tool timed out")
+        assert answered == "found Carlill v Carbolic"
+        assert elapsed < 1.0 and ticks >= 10
+
+    def test_matter_memory_is_scoped_to_the_checked_matter_and_firm(self):
+        """Test that matter history keys use the firm and the access-checked matter only"""
+        orchestrator = AIAgentOrchestrator()
+        checked = orchestrator.create_task(
+            AIAgentType.LEGAL_RESEARCH, "Status of discovery?", "user-1", AITaskPriority.MEDIUM,
+            {}, firm_id="firm-1", matter_id="matter-1"
+        )
+        unchecked = orchestrator.create_task(
+            AIAgentType.LEGAL_RESEARCH, "Status of discovery?", "user-2", AITaskPriority.MEDIUM,
+            {"matter_id": "matter-1"}, firm_id="firm-2"
+        )
+
+        assert orchestrator._memory_key(orchestrator.get_task_result(checked)) == "matter:firm-1:matter-1"
+        assert orchestrator._memory_key(orchestrator.get_task_result(unchecked)) is None
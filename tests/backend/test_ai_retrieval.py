@@ -0,0 +1,54 @@
+"""
+Tests for merging retrieval results across matter and knowledge scopes
+"""
+
+import asyncio
+
+from app.core.ai_retrieval import MatterRetrievalIndex
+
+
+class StubScopesIndex(MatterRetrievalIndex):
+    """Index whose per-scope search returns canned chunks instead of querying LlamaIndex"""
+
+    def __init__(self, chunks_by_scope, **kwargs):
+        super().__init__("/nonexistent", **kwargs)
+        self.chunks_by_scope = chunks_by_scope
+        self.queried = []
+
+    def _query_scope(self, scope, query, top_k, firm_id):
+        self.queried.append((scope, top_k, firm_id))
+        chunks = self.chunks_by_scope[scope]
+        if isinstance(chunks, Exception):
+            raise chunks
+        return [{"text": text, "score": score, "scope": scope} for text, score in chunks][:top_k]
+
+
+class TestMatterRetrievalIndex:
+    """Test scope selection, top-k merging and failure isolation"""
+
+    def test_top_k_across_matter_and_firm_knowledge(self):
+        """Test that matter and firm knowledge chunks are merged best first and cut to top-k"""
+        index = StubScopesIndex({
+            "matter:m1": [("Lease clause 4", 0.91), ("Lease clause 9", 0.42)],
+            "knowledge:firm-1": [("Practice note on break clauses", 0.77), ("Old memo", 0.10)]
+        }, top_k=3)
+
+        chunks = asyncio.run(index.retrieve("break clause", matter_id="m1", firm_id="firm-1"))
+        assert [chunk["text"] for chunk in chunks] == ["Lease clause 4", "Practice note on break clauses", "Lease clause 9"]
+        assert sorted(index.queried) == [("knowledge:firm-1", 3, "firm-1"), ("matter:m1", 3, "firm-1")]
+        assert index.get_stats()["queries"] == 1
+
+    def test_failed_scope_does_not_block_the_others(self):
+        """Test that a broken index still lets the other scope answer"""
+        index = StubScopesIndex({
+            "matter:m1": RuntimeError("index corrupted"),
+            "knowledge:public": [("Public statute summary", 0.5)]
+        })
+
+        chunks = asyncio.run(index.retrieve("limitation period", matter_id="m1"))
+        assert [chunk["scope"] for chunk in chunks] == ["knowledge:public"]
+
+    def test_scope_paths_are_filesystem_safe(self):
+        """Test that scope names cannot escape the persist directory"""
+        index = MatterRetrievalIndex("/cache")
+        assert index._persist_dir("matter:../../etc") == "/cache/retrieval/matter_.._.._etc"
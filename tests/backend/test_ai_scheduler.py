@@ -0,0 +1,170 @@
+"""
+Tests for the priority-aware AI task scheduler
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.ai_scheduler import AITaskScheduler, AIQueueFullError
+
+
+class TestAITaskScheduler:
+    """Test priority, fairness, concurrency limits and backpressure"""
+
+    def _scheduler(self, started, release, **kwargs):
+        async def executor(task_id):
+            started.append(task_id)
+            await release.wait()
+
+        return AITaskScheduler(executor, **kwargs)
+
+    def test_urgent_runs_before_lower_priorities(self):
+        """Test that queued urgent work is dispatched before older low priority work"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(started, release, max_workers=2, urgent_reserved_workers=1)
+
+            scheduler.submit("blocker", "u1", "legal_research", "low")
+            scheduler.submit("low", "u1", "legal_research", "low")
+            scheduler.submit("urgent", "u2", "legal_research", "urgent")
+            await asyncio.sleep(0)
+
+            # The reserved slot goes to urgent work even though low work was queued first
+            assert started == ["blocker", "urgent"]
+            release.set()
+            await asyncio.sleep(0.01)
+            assert started[-1] == "low"
+
+        asyncio.run(scenario())
+
+    def test_users_are_served_round_robin(self):
+        """Test that one user's backlog does not starve another user"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(started, release, max_workers=1, urgent_reserved_workers=0)
+
+            scheduler.submit("running", "heavy", "legal_research", "medium")
+            for i in range(3):
+                scheduler.submit(f"heavy-{i}", "heavy", "legal_research", "medium")
+            scheduler.submit("light-0", "light", "legal_research", "medium")
+
+            release.set()
+            await asyncio.sleep(0.01)
+            assert started[:3] == ["running", "heavy-0", "light-0"]
+
+        asyncio.run(scenario())
+
+    def test_per_agent_concurrency_limit(self):
+        """Test that an agent type never exceeds its concurrency limit"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(
+                started, release, max_workers=4, max_concurrency_per_agent=1, urgent_reserved_workers=0
+            )
+
+            scheduler.submit("a1", "u1", "contract_analysis", "medium")
+            scheduler.submit("a2", "u2", "contract_analysis", "medium")
+            scheduler.submit("b1", "u3", "document_reviewer", "medium")
+            await asyncio.sleep(0)
+
+            assert sorted(started) == ["a1", "b1"]
+            assert scheduler.is_queued("a2")
+            release.set()
+
+        asyncio.run(scenario())
+
+    def test_queue_full_raises(self):
+        """Test backpressure when the queue is full"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(
+                started, release, max_workers=1, max_queue_size=1, urgent_reserved_workers=0
+            )
+
+            scheduler.submit("running", "u1", "legal_research", "medium")
+            scheduler.submit("queued", "u2", "legal_research", "medium")
+            with pytest.raises(AIQueueFullError):
+                scheduler.submit("rejected", "u3", "legal_research", "medium")
+            assert scheduler.get_stats()["rejected"] == 1
+            release.set()
+
+        asyncio.run(scenario())
+
+    def test_cancel_queued_and_running(self):
+        """Test cancelling both queued and running tasks"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(started, release, max_workers=1, urgent_reserved_workers=0)
+
+            scheduler.submit("running", "u1", "legal_research", "medium")
+            scheduler.submit("queued", "u1", "legal_research", "medium")
+            await asyncio.sleep(0)
+
+            assert scheduler.cancel("queued")
+            assert scheduler.cancel("running")
+            await asyncio.sleep(0.01)
+
+            assert started == ["running"]
+            assert not scheduler.is_running("running")
+            assert scheduler.get_stats()["cancelled"] == 2
+            assert not scheduler.cancel("unknown")
+
+        asyncio.run(scenario())
+
+    def test_lanes_are_served_strictly_by_priority(self):
+        """Test that queued work starts high, then medium, then low, whatever the submit order"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(started, release, max_workers=1, urgent_reserved_workers=0)
+
+            scheduler.submit("running", "u1", "legal_research", "medium")
+            scheduler.submit("low", "u1", "legal_research", "low")
+            scheduler.submit("medium", "u2", "legal_research", "medium")
+            scheduler.submit("high", "u3", "legal_research", "high")
+            assert scheduler.get_stats()["queued_by_priority"] == {"urgent": 0, "high": 1, "medium": 1, "low": 1}
+
+            release.set()
+            await asyncio.sleep(0.01)
+            assert started == ["running", "high", "medium", "low"]
+            assert scheduler.get_stats()["completed"] == 4
+
+        asyncio.run(scenario())
+
+    def test_reserved_workers_are_kept_for_urgent_work(self):
+        """Test that lower priorities never take the reserved slots, even when idle"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(started, release, max_workers=3, urgent_reserved_workers=2)
+
+            for i in range(3):
+                scheduler.submit(f"high-{i}", f"u{i}", "legal_research", "high")
+            await asyncio.sleep(0)
+            assert started == ["high-0"]
+
+            scheduler.submit("urgent-0", "u9", "legal_research", "urgent")
+            scheduler.submit("urgent-1", "u8", "legal_research", "urgent")
+            await asyncio.sleep(0)
+            assert started == ["high-0", "urgent-0", "urgent-1"]
+            assert scheduler.get_stats()["queued_by_priority"]["high"] == 2
+            release.set()
+
+        asyncio.run(scenario())
+
+    def test_per_user_queue_limit(self):
+        """Test that one user cannot fill the shared queue"""
+        async def scenario():
+            started, release = [], asyncio.Event()
+            scheduler = self._scheduler(
+                started, release, max_workers=1, max_queued_per_user=2, urgent_reserved_workers=0
+            )
+
+            scheduler.submit("running", "heavy", "legal_research", "low")
+            scheduler.submit("q1", "heavy", "legal_research", "low")
+            scheduler.submit("q2", "heavy", "legal_research", "urgent")
+            with pytest.raises(AIQueueFullError):
+                scheduler.submit("q3", "heavy", "legal_research", "low")
+            assert scheduler.submit("other", "light", "legal_research", "low") == 2
+            release.set()
+
+        asyncio.run(scenario())
@@ -0,0 +1,49 @@
+"""
+Tests for streaming AI task events to the owner's WebSocket connections
+"""
+
+import asyncio
+import json
+import uuid
+
+from app.core.ai_orchestrator import ai_orchestrator
+from app.core.websocket import connection_manager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+class TestAIStreaming:
+    """Test that streamed task events reach WebSocket connections"""
+
+    def test_stream_events_reach_socket_of_uuid_owner(self):
+        """Test that a task owned by a UUID user reaches the socket registered under its string id"""
+        user_id = uuid.uuid4()
+
+        async def main():
+            websocket = FakeWebSocket()
+            await connection_manager.connect(websocket, str(user_id))
+            task = {"id": "task-1", "user_id": user_id, "stream": True}
+            try:
+                await ai_orchestrator._emit_event(task, "token", {"text": "The"})
+                await ai_orchestrator._emit_event(task, "done", {"response": "The clause is void."})
+                await asyncio.sleep(0.05)
+            finally:
+                connection_manager.disconnect(websocket)
+            return websocket.sent
+
+        sent = asyncio.run(main())
+        frames = [frame for frame in sent if frame["type"] == "ai_progress"]
+        assert [frame["data"]["event"] for frame in frames] == ["token", "done"]
+        assert frames[0]["data"]["task_id"] == "task-1" and frames[0]["data"]["text"] == "The"
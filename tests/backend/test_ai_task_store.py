@@ -0,0 +1,75 @@
+"""
+Tests for bounded AI task retention and the Redis spill tier
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+
+from app.core.ai_task_store import AITaskStore, is_task_owner
+
+
+class FakeRedis:
+    """In-memory stand-in for the two redis.asyncio calls the store makes"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+
+class TestAITaskStore:
+    """Test expiry, eviction and spill round-trips"""
+
+    def test_finished_tasks_expire_and_are_evicted(self):
+        """Test that finished tasks leave memory by TTL or count while live tasks stay"""
+        async def main():
+            store = AITaskStore(max_entries=3, result_ttl_seconds=3600)
+            store["live"] = {"status": "processing"}
+            for index in range(4):
+                store[f"done-{index}"] = {"status": "completed", "query": "x" * 1000}
+                await store.finish(f"done-{index}")
+            evicted = store.get_stats()["evicted"]
+
+            expiring = AITaskStore(result_ttl_seconds=0)
+            expiring["done"] = {"status": "completed"}
+            await expiring.finish("done")
+            expiring["next"] = {"status": "pending"}
+            return store, evicted, expiring
+
+        store, evicted, expiring = asyncio.run(main())
+        assert "live" in store and evicted >= 2
+        assert "done-3" in store and "query" not in store["done-3"]
+        assert "done" not in expiring and "next" in expiring
+
+    def test_spilled_result_round_trips_to_its_owner(self):
+        """Test that a spilled task loads back and still belongs to the UUID user who created it"""
+        owner = uuid.uuid4()
+
+        async def main():
+            store = AITaskStore(result_ttl_seconds=0)
+            store.redis_client = FakeRedis()
+            store["task-1"] = {
+                "id": "task-1",
+                "user_id": owner,
+                "status": "completed",
+                "response": "Clause 7 caps liability.",
+                "created_at": datetime(2025, 1, 2),
+                "query": "long prompt"
+            }
+            await store.finish("task-1")
+            store["other"] = {"status": "pending"}  # Purges the expired task from memory
+            return store, await store.load("task-1")
+
+        store, loaded = asyncio.run(main())
+        assert "task-1" not in store
+        assert loaded["response"] == "Clause 7 caps liability."
+        assert "query" not in loaded
+        assert loaded["user_id"] == str(owner)
+        assert is_task_owner(loaded, owner)
+        assert not is_task_owner(loaded, uuid.uuid4())
+        assert store.get_stats()["spilled"] == 1 and store.get_stats()["spill_hits"] == 1
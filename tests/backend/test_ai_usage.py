@@ -0,0 +1,130 @@
+"""
+Tests for AI token accounting and per-tenant budgets
+"""
+
+import asyncio
+
+from app.core.ai_usage import AIUsageAccountant, BudgetDecision, StreamedUsage
+
+
+class FakePipeline:
+    def __init__(self, writes):
+        self.writes = writes
+
+    def hincrby(self, key, field, amount):
+        self.writes.append((key, field, amount))
+
+    def hincrbyfloat(self, key, field, amount):
+        self.writes.append((key, field, amount))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        pass
+
+
+class FakeRedis:
+    """In-memory stand-in recording the hash increments a flush makes"""
+
+    def __init__(self):
+        self.writes = []
+
+    def pipeline(self):
+        return FakePipeline(self.writes)
+
+
+def record(accountant, user_id, firm_id, tokens):
+    return accountant.record(user_id, firm_id, prompt_tokens=tokens, completion_tokens=0, cost_usd=0.0, latency_seconds=0.1)
+
+
+class TestAIUsageAccountant:
+    """Test budget decisions, day roll-over and flushes"""
+
+    def test_budget_downgrades_then_throttles(self):
+        """Test that a tenant moves to the cheaper model near its budget and is throttled at it"""
+        accountant = AIUsageAccountant(user_daily_token_budget=1000, firm_daily_token_budget=5000)
+        assert accountant.check_budget("alice", "firm-1") == BudgetDecision.ALLOW
+
+        record(accountant, "alice", "firm-1", 800)
+        assert accountant.check_budget("alice", "firm-1") == BudgetDecision.DOWNGRADE
+        assert accountant.check_budget("bob", "firm-1") == BudgetDecision.ALLOW
+
+        record(accountant, "alice", "firm-1", 200)
+        assert accountant.check_budget("alice", "firm-1") == BudgetDecision.THROTTLE
+
+        # A firm override applies to everyone in the firm
+        accountant.set_firm_budget("firm-1", 1000)
+        assert accountant.check_budget("bob", "firm-1") == BudgetDecision.THROTTLE
+        assert accountant.get_usage("firm", "firm-1")["total_tokens"] == 1000
+
+    def test_unflushed_usage_is_filed_under_its_own_day(self):
+        """Test that usage recorded before midnight is flushed to that day's counters"""
+        async def main():
+            accountant = AIUsageAccountant(user_daily_token_budget=1000)
+            accountant.redis_client = FakeRedis()
+            accountant._today = lambda: "2025-01-01"
+            accountant._day = "2025-01-01"
+            record(accountant, "alice", None, 900)
+
+            accountant._today = lambda: "2025-01-02"
+            decision = accountant.check_budget("alice", None)
+            record(accountant, "alice", None, 50)
+            await accountant.flush()
+            return accountant, decision
+
+        accountant, decision = asyncio.run(main())
+        assert decision == BudgetDecision.ALLOW
+        prompt_writes = {key: amount for key, field, amount in accountant.redis_client.writes if field == "prompt_tokens"}
+        assert prompt_writes == {
+            "ai_usage:2025-01-01:user:alice": 900,
+            "ai_usage:2025-01-02:user:alice": 50
+        }
+
+
+class TestStreamedUsage:
+    """Test token counting for streamed agent runs"""
+
+    def test_estimates_without_reported_usage(self):
+        """Test that streamed calls without provider counts are estimated from their text"""
+        usage = StreamedUsage()
+        usage.start_call("x" * 400)
+        for _ in range(10):
+            usage.add_chunk("abcd")
+        usage.start_call("y" * 40)
+        usage.add_chunk("done")
+
+        totals = usage.totals()
+        assert totals["estimated"] is True
+        assert totals["prompt_tokens"] == 101 + 11
+        assert totals["completion_tokens"] == 11 + 2
+
+    def test_reported_usage_replaces_estimate(self):
+        """Test that usage_metadata on a chunk wins over the estimate for its call"""
+        usage = StreamedUsage()
+        usage.start_call("x" * 400)
+        usage.add_chunk("The clause")
+        usage.add_chunk("", {"input_tokens": 87, "output_tokens": 3, "total_tokens": 90})
+
+        assert usage.totals() == {"prompt_tokens": 87, "completion_tokens": 3, "estimated": False}
+
+    def test_timer_flushes_an_idle_accountant(self):
+        """Test that usage is flushed on the timer with no task activity, and once more on close"""
+        async def main():
+            accountant = AIUsageAccountant(flush_interval_seconds=0.02)
+            accountant.redis_client = FakeRedis()
+            accountant.start()
+            record(accountant, "alice", "firm-1", 120)
+            await asyncio.sleep(0.05)
+            flushed_by_timer = len(accountant.redis_client.writes)
+
+            record(accountant, "alice", "firm-1", 30)
+            await accountant.close()
+            return accountant, flushed_by_timer
+
+        accountant, flushed_by_timer = asyncio.run(main())
+        assert flushed_by_timer > 0
+        prompt_writes = [amount for key, field, amount in accountant.redis_client.writes
+                         if field == "prompt_tokens" and key.endswith(":user:alice")]
+        assert prompt_writes == [120, 30]
+        assert accountant._flusher is None
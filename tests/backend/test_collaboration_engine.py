@@ -0,0 +1,97 @@
+"""
+Tests for the operational transformation collaboration engine
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from app.services.collaboration_engine import (
+    CollaborationEngine, DocumentSession, StaleRevisionError, apply, normalize, transform
+)
+
+
+def random_operation(rng, text):
+    components = []
+    index = 0
+    while index < len(text):
+        length = rng.randint(1, len(text) - index)
+        roll = rng.random()
+        if roll < 0.2:
+            components.append(rng.choice(["x", "yz", "Clause "]))
+        if roll < 0.5:
+            components.append(-length)
+        else:
+            components.append(length)
+        index += length
+    if rng.random() < 0.3:
+        components.append("end")
+    return normalize(components)
+
+
+class TestCollaborationEngine:
+    """Test transformation, server revisions, idempotency and snapshots"""
+
+    def test_transform_converges(self):
+        """Test that both application orders of concurrent edits give the same text"""
+        rng = random.Random(11)
+        for _ in range(2000):
+            text = "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 12)))
+            a, b = random_operation(rng, text), random_operation(rng, text)
+            a_prime, b_prime = transform(a, b)
+            assert apply(apply(text, a), b_prime) == apply(apply(text, b), a_prime)
+
+    def test_concurrent_edits_are_merged_not_clobbered(self):
+        """Test that two editors working from the same revision both keep their edits"""
+        session = DocumentSession("doc-1", "The Seller shall deliver goods.")
+        first = session.receive("alice", 0, normalize([4, -6, "Vendor Ltd", 21]), "a-1")
+        second = session.receive("bob", 0, normalize([25, "promptly ", 6]), "b-1")
+
+        assert session.text == "The Vendor Ltd shall deliver promptly goods."
+        assert (first["revision"], second["revision"]) == (1, 2)
+        assert first["op_id"] != second["op_id"]
+        # Bob's operation was rebased over Alice's before being broadcast
+        assert second["operation"] == [29, "promptly ", 6]
+
+    def test_retransmits_apply_once(self):
+        """Test that a resent client operation is acknowledged, not applied again"""
+        session = DocumentSession("doc-1", "abc")
+        session.receive("alice", 0, normalize([3, "d"]), "a-1")
+        duplicate = session.receive("alice", 0, normalize([3, "d"]), "a-1")
+
+        assert duplicate["duplicate"] and duplicate["revision"] == 1
+        assert session.text == "abcd"
+
+    def test_base_older_than_history_needs_resync(self):
+        """Test that edits older than the retained history are refused"""
+        session = DocumentSession("doc-1", "", history_limit=2)
+        for revision in range(3):
+            session.receive("alice", revision, normalize([revision, "x"]))
+        with pytest.raises(StaleRevisionError):
+            session.receive("bob", 0, normalize(["y"]))
+
+    def test_engine_snapshots_every_n_operations(self):
+        """Test that sessions are loaded once and snapshotted into versions"""
+        async def main():
+            loads, snapshots = [], []
+
+            async def loader(document_id):
+                loads.append(document_id)
+                return "", "Master Services Agreement"
+
+            async def writer(document_id, title, text, author_id):
+                snapshots.append((document_id, title, text, author_id))
+
+            engine = CollaborationEngine(loader, writer, snapshot_every_ops=3, snapshot_interval_seconds=60)
+            for revision in range(7):
+                await engine.submit("doc-1", "alice", {"type": "insert", "position": revision, "text": "a", "revision": revision})
+                await asyncio.sleep(0)
+            await engine.close()
+            return loads, snapshots, engine.get_stats()
+
+        loads, snapshots, stats = asyncio.run(main())
+        assert loads == ["doc-1"]
+        assert [text for _, _, text, _ in snapshots] == ["aaa", "aaaaaa", "aaaaaaa"]
+        assert snapshots[0][1] == "Master Services Agreement" and snapshots[0][3] == "alice"
+        assert stats["operations"] == 7 and stats["dirty_documents"] == 0
@@ -0,0 +1,34 @@
+"""
+Tests for the real-time collaboration service
+"""
+
+import asyncio
+
+from app.core.websocket import ConnectionManager
+from app.core.websocket_backplane import InMemoryBackplane
+from app.services.document_version_service import CollaborationService
+
+
+class TestCollaborationService:
+    """Test presence handling as users come and go"""
+
+    def test_leaving_a_document_drops_unsent_presence(self):
+        """Test that a user who leaves or disconnects is not broadcast in the next presence batch"""
+        async def main():
+            frames = []
+            service = CollaborationService(ConnectionManager(backplane=InMemoryBackplane()))
+
+            async def send(room, frame):
+                frames.append((room, frame))
+
+            service.presence.send = send
+            await service.handle_cursor_position("doc-1", "alice", {"offset": 3})
+            await service.handle_selection_change("doc-1", "bob", {"start": 0, "end": 8})
+            service.leave_document("doc-1", "alice")
+            await service.presence.flush("document_doc-1")
+            return frames
+
+        frames = asyncio.run(main())
+        [(room, frame)] = frames
+        assert room == "document_doc-1"
+        assert [user["user_id"] for user in frame["users"]] == ["bob"]
@@ -0,0 +1,228 @@
+"""
+Tests for the connector base: pooling against a local stub server, circuit breakers and hedged requests
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from app.services.connector_base import BaseHTTPConnector, CircuitBreaker, HTTPClientPool, hedged_call
+
+sys.path.insert(0, os.path.dirname(__file__))
+from legal_stub_server import LegalStubServer  # noqa: E402
+
+
+class StubConnector(BaseHTTPConnector):
+    max_concurrency = 2
+    rate_per_second = 1000.0
+    burst = 1000
+
+    async def search(self, query, filters=None):
+        data = await self._get_json("/api/rest/v4/search/", {"q": query})
+        return data["results"]
+
+
+def run_with_stub(scenario, latency_seconds=0.0):
+    async def main():
+        server = LegalStubServer(latency_seconds=latency_seconds)
+        base_url = await server.start()
+        pool = HTTPClientPool(http2=False)
+        try:
+            await scenario(server, pool, base_url)
+        finally:
+            await pool.close()
+            await server.stop()
+
+    asyncio.run(main())
+
+
+class TestConnectorBase:
+    """Test keep-alive pooling, per-host concurrency limits and rate limiting"""
+
+    def test_sequential_requests_reuse_one_connection(self):
+        """Test that keep-alive avoids a new connection per search"""
+        async def scenario(server, pool, base_url):
+            connector = StubConnector(pool, base_url=base_url)
+            for _ in range(10):
+                assert len(await connector.search("breach")) == 2
+
+            assert len(server.request_times) == 10
+            assert len(server.connections) == 1
+
+        run_with_stub(scenario)
+
+    def test_per_host_concurrency_limit(self):
+        """Test that in-flight requests to one host never exceed the limit"""
+        async def scenario(server, pool, base_url):
+            connectors = [StubConnector(pool, base_url=base_url) for _ in range(2)]
+            await asyncio.gather(*(connectors[i % 2].search("tort") for i in range(8)))
+
+            assert server.peak_in_flight == 2
+
+        run_with_stub(scenario, latency_seconds=0.05)
+
+    def test_token_bucket_spaces_requests(self):
+        """Test that requests beyond the burst wait for tokens"""
+        class RateLimitedConnector(StubConnector):
+            rate_per_second = 20.0
+            burst = 2
+
+        async def scenario(server, pool, base_url):
+            connector = RateLimitedConnector(pool, base_url=base_url)
+            await asyncio.gather(*(connector.search("tort") for _ in range(6)))
+
+            # Two requests ride the burst; the other four wait 1/20s each
+            assert server.request_times[-1] - server.request_times[0] >= 0.18
+
+        run_with_stub(scenario)
+
+
+    def test_connector_must_implement_search(self):
+        """Test that a connector without search cannot be created"""
+        class Incomplete(BaseHTTPConnector):
+            base_url = "https://example.test"
+
+        with pytest.raises(TypeError):
+            Incomplete(HTTPClientPool())
+
+
+class TestCircuitBreaker:
+    """Test closed, open and half-open transitions"""
+
+    def test_opens_after_threshold_and_half_opens_after_reset(self):
+        """Test that consecutive failures open the circuit until the reset timeout passes"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout_seconds=0.05)
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == "closed" and breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+
+        time.sleep(0.06)
+        assert breaker.state == "half_open" and breaker.allow()
+
+    def test_half_open_trial_closes_or_reopens(self):
+        """Test that one failed trial re-opens the circuit and a successful one closes it"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout_seconds=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        time.sleep(0.06)
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        time.sleep(0.06)
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.consecutive_failures == 0
+
+    def test_half_open_admits_one_trial_at_a_time(self):
+        """Test that only one call reaches the upstream while the half-open trial is in flight"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.available and breaker.allow()
+        assert not breaker.available
+        assert [breaker.allow() for _ in range(5)] == [False] * 5
+
+        # A trial that ended without a verdict frees the slot for the next caller
+        breaker.release()
+        assert breaker.allow() and not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed" and all(breaker.allow() for _ in range(3))
+
+    def test_success_resets_the_failure_count(self):
+        """Test that only consecutive failures count towards opening"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+
+class TestHedgedCall:
+    """Test hedged attempts and cancellation of the losers"""
+
+    def test_slow_first_attempt_is_hedged_and_cancelled(self):
+        """Test that a hedge answers for a stalled attempt, which is then cancelled"""
+        async def main():
+            delays = [10.0, 0.01]
+            cancelled = []
+
+            async def search():
+                delay = delays.pop(0)
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    cancelled.append(delay)
+                    raise
+                return f"answered after {delay}"
+
+            started = time.monotonic()
+            result = await hedged_call(search, hedge_after_seconds=0.05)
+            await asyncio.sleep(0)
+            return result, cancelled, time.monotonic() - started
+
+        result, cancelled, elapsed = asyncio.run(main())
+        assert result == "answered after 0.01"
+        assert cancelled == [10.0]
+        assert elapsed < 1.0
+
+    def test_no_hedge_when_first_attempt_is_fast(self):
+        """Test that a prompt answer never starts a second request"""
+        async def main():
+            calls = []
+
+            async def search():
+                calls.append(1)
+                return "ok"
+
+            return await hedged_call(search, hedge_after_seconds=0.05), calls
+
+        assert asyncio.run(main()) == ("ok", [1])
+
+    def test_caller_timeout_cancels_every_attempt(self):
+        """Test that an outer deadline cancels both the original and the hedge"""
+        async def main():
+            cancelled = []
+
+            async def search():
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(1)
+                    raise
+
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(hedged_call(search, hedge_after_seconds=0.01), timeout=0.05)
+            await asyncio.sleep(0)
+            return cancelled
+
+        assert asyncio.run(main()) == [1, 1]
+
+    def test_failed_attempts_raise_the_first_error(self):
+        """Test that the hedge's success wins over a failed attempt, and all failures raise"""
+        async def main():
+            outcomes = [ConnectionError("reset"), "hedge answer"]
+
+            async def flaky():
+                await asyncio.sleep(0.02)
+                outcome = outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+            async def broken():
+                await asyncio.sleep(0.02)
+                raise ConnectionError("down")
+
+            answer = await hedged_call(flaky, hedge_after_seconds=0.01)
+            with pytest.raises(ConnectionError):
+                await hedged_call(broken, hedge_after_seconds=0.01)
+            return answer
+
+        assert asyncio.run(main()) == "hedge answer"
@@ -0,0 +1,120 @@
+"""
+Tests for the two-tier legal search cache with stale-while-revalidate
+"""
+
+import asyncio
+import json
+import time
+
+from app.services.legal_search_cache import LegalSearchCache
+
+
+class FakeRedis:
+    """In-memory stand-in for the get/set calls of the shared tier"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+
+class TestLegalSearchCache:
+    """Test keys, freshness, revalidation counting and the Redis tier"""
+
+    def test_keys_normalize_query_and_separate_connectors(self):
+        """Test that whitespace and case do not split entries but connectors and filters do"""
+        cache = LegalSearchCache()
+        key = cache.make_key("westlaw", "  Breach of  Contract ", {"jurisdiction": "NY"})
+        assert key == cache.make_key("westlaw", "breach of contract", {"jurisdiction": "NY"})
+        assert key != cache.make_key("lexisnexis", "breach of contract", {"jurisdiction": "NY"})
+        assert key != cache.make_key("westlaw", "breach of contract", {"jurisdiction": "CA"})
+
+    def test_fresh_stale_and_expired(self):
+        """Test that entries are fresh within the connector TTL, then stale, then gone"""
+        async def main():
+            cache = LegalSearchCache(connector_ttls={"westlaw": 60}, stale_ttl_seconds=60)
+            key = cache.make_key("westlaw", "estoppel")
+            await cache.set("westlaw", key, [{"id": "w1"}])
+            fresh = await cache.get("westlaw", key)
+
+            cache._entries[key] = (time.time() - 90, [{"id": "w1"}])
+            stale = await cache.get("westlaw", key)
+
+            cache._entries[key] = (time.time() - 130, [{"id": "w1"}])
+            expired = await cache.get("westlaw", key)
+            return fresh, stale, expired, cache.get_metrics()
+
+        fresh, stale, expired, metrics = asyncio.run(main())
+        assert fresh == ([{"id": "w1"}], True)
+        assert stale == ([{"id": "w1"}], False)
+        assert expired is None
+        assert (metrics["fresh_hits"], metrics["stale_hits"], metrics["misses"]) == (1, 1, 1)
+
+    def test_stale_reads_trigger_one_revalidation(self):
+        """Test that concurrent stale hits share one refresh and saved calls account for it"""
+        async def main():
+            cache = LegalSearchCache(connector_ttls={"westlaw": 0}, stale_ttl_seconds=3600)
+            key = cache.make_key("westlaw", "promissory estoppel")
+            await cache.set("westlaw", key, [{"id": "old"}])
+            refreshes = []
+
+            async def refresh():
+                refreshes.append(1)
+                await asyncio.sleep(0.01)
+                await cache.set("westlaw", key, [{"id": "new"}])
+
+            served = []
+            for _ in range(5):
+                results, fresh = await cache.get("westlaw", key)
+                served.append(results[0]["id"])
+                if not fresh:
+                    cache.revalidate(key, refresh)
+            in_flight = cache.get_metrics()["revalidating"]
+            await asyncio.sleep(0.05)
+            return served, refreshes, in_flight, cache.get_metrics()
+
+        served, refreshes, in_flight, metrics = asyncio.run(main())
+        assert served == ["old"] * 5
+        assert refreshes == [1] and in_flight == 1
+        assert metrics["revalidations"] == 1 and metrics["revalidating"] == 0
+        # Five stale hits cost one upstream call instead of five
+        assert metrics["saved_upstream_calls"] == 4
+
+    def test_failed_refresh_allows_a_retry(self):
+        """Test that a refresh that raised does not block the next one"""
+        async def main():
+            cache = LegalSearchCache()
+
+            async def broken():
+                raise ConnectionError("upstream down")
+
+            first = cache.revalidate("key", broken)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            second = cache.revalidate("key", broken)
+            await asyncio.sleep(0)
+            return first, second, cache.get_metrics()["revalidations"]
+
+        assert asyncio.run(main()) == (True, True, 2)
+
+    def test_redis_tier_fills_the_local_tier(self):
+        """Test that another worker's cached answer is served from Redis and kept locally"""
+        async def main():
+            shared = FakeRedis()
+            writer, reader = LegalSearchCache(), LegalSearchCache()
+            writer.redis_client = reader.redis_client = shared
+            key = writer.make_key("courtlistener", "duty of care")
+            await writer.set("courtlistener", key, [{"id": "c1"}])
+
+            first = await reader.get("courtlistener", key)
+            second = await reader.get("courtlistener", key)
+            return shared, key, first, second, reader.get_metrics()
+
+        shared, key, first, second, metrics = asyncio.run(main())
+        assert json.loads(shared.values[key])["results"] == [{"id": "c1"}]
+        assert first == second == ([{"id": "c1"}], True)
+        assert metrics["redis_hits"] == 1 and metrics["fresh_hits"] == 2
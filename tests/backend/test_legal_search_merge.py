@@ -0,0 +1,45 @@
+"""
+Tests for merging legal database search results
+"""
+
+from app.services.legal_search_merge import merge_ranked, normalize_citation
+
+
+def _result(citation, score, source):
+    return {"citation": citation, "relevance_score": score, "source": source, "title": citation}
+
+
+class TestMergeRanked:
+    """Test k-way merging and cross-source deduplication"""
+
+    def test_citation_normalization(self):
+        """Test that formatting differences do not split one case in two"""
+        assert normalize_citation({"citation": "2024 U.S. LEXIS 1111"}) == \
+            normalize_citation({"citation": "2024 US Lexis  1111"})
+
+    def test_merge_orders_and_deduplicates(self):
+        """Test global ordering, best-copy retention and the result limit"""
+        westlaw = [_result("1 F.4th 1", 0.95, "Westlaw"), _result("2 F.4th 2", 0.7, "Westlaw")]
+        courtlistener = [_result("1 F.4th 1", 0.9, "CourtListener"), _result("3 F.4th 3", 0.8, "CourtListener")]
+
+        merged = list(merge_ranked([westlaw, courtlistener], limit=10))
+
+        assert [r["citation"] for r in merged] == ["1 F.4th 1", "3 F.4th 3", "2 F.4th 2"]
+        assert merged[0]["source"] == "Westlaw"
+        assert merged[0]["also_in"] == ["CourtListener"]
+        assert len(list(merge_ranked([westlaw, courtlistener], limit=2))) == 2
+
+    def test_seen_set_continues_across_calls(self):
+        """Test that streamed pages never repeat a citation"""
+        seen = set()
+        first = list(merge_ranked([[_result("A 1", 0.9, "Westlaw")]], 5, seen))
+        second = list(merge_ranked([[_result("a-1", 0.8, "LexisNexis"), _result("B 2", 0.5, "LexisNexis")]], 5, seen))
+
+        assert len(first) == 1
+        assert [r["citation"] for r in second] == ["B 2"]
+
+    def test_unsorted_connector_output_is_tolerated(self):
+        """Test that a connector returning unranked results still merges correctly"""
+        merged = list(merge_ranked([[_result("X 1", 0.2, "A"), _result("Y 2", 0.9, "A")]], 5))
+
+        assert [r["citation"] for r in merged] == ["Y 2", "X 1"]
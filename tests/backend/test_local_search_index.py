@@ -0,0 +1,53 @@
+"""
+Tests for the local legal search index
+"""
+
+import numpy as np
+
+from app.services.local_search_index import LocalSearchIndex
+
+DOCUMENTS = [
+    {"id": "1", "title": "Hadley v Baxendale", "text": "breach of contract and consequential damages for late delivery",
+     "jurisdiction": "UK", "content_type": "case_law"},
+    {"id": "2", "title": "UCC 2-615", "text": "commercial impracticability may excuse late delivery of goods",
+     "jurisdiction": "US", "content_type": "statute"},
+    {"id": "3", "title": "Delay memo", "text": "contract breach delivery damages delivery damages",
+     "jurisdiction": "US", "content_type": "memo"}
+]
+
+
+class TestLocalSearchIndex:
+    """Test BM25 ranking, phrases, filters and memory-mapped persistence"""
+
+    def test_bm25_ranks_by_term_weight(self):
+        """Test that documents matching more, rarer terms rank first"""
+        index = LocalSearchIndex.build(DOCUMENTS)
+        ids = [entry["id"] for entry, _ in index.search("delivery damages")]
+
+        assert ids[0] == "3"
+        assert set(ids) == {"1", "2", "3"}
+
+    def test_phrase_query_requires_adjacent_terms(self):
+        """Test that quoted phrases match only verbatim sequences"""
+        index = LocalSearchIndex.build(DOCUMENTS)
+
+        assert [entry["id"] for entry, _ in index.search('"breach of contract"')] == ["1"]
+        assert sorted(entry["id"] for entry, _ in index.search('"late delivery"')) == ["1", "2"]
+        assert index.search('"delivery late"') == []
+        assert index.search('"unknown phrase"') == []
+
+    def test_jurisdiction_and_content_type_filters(self):
+        """Test filtering by jurisdiction and content type"""
+        index = LocalSearchIndex.build(DOCUMENTS)
+
+        assert [entry["id"] for entry, _ in index.search("delivery", jurisdiction="uk")] == ["1"]
+        assert [entry["id"] for entry, _ in index.search("delivery", content_types=["statute"])] == ["2"]
+
+    def test_saved_index_is_memory_mapped(self, tmp_path):
+        """Test that a reloaded index maps its postings and answers identically"""
+        index = LocalSearchIndex.build(DOCUMENTS)
+        index.save(str(tmp_path))
+        loaded = LocalSearchIndex.load(str(tmp_path))
+
+        assert isinstance(loaded.arrays["positions"], np.memmap)
+        assert loaded.search('"late delivery" goods') == index.search('"late delivery" goods')
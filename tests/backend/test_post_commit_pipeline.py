@@ -0,0 +1,86 @@
+"""
+Tests for the post-commit side effect pipeline
+"""
+
+import asyncio
+
+from app.services.post_commit_pipeline import PostCommitPipeline
+
+
+class TestPostCommitPipeline:
+    """Test per-key ordering, concurrency across keys and retries"""
+
+    def test_batches_for_one_key_run_in_order(self):
+        """Test that steps of consecutive batches for a document never interleave"""
+        async def main():
+            pipeline = PostCommitPipeline()
+            log = []
+
+            def step(label, delay):
+                async def run():
+                    await asyncio.sleep(delay)
+                    log.append(label)
+                return run
+
+            for version in range(1, 6):
+                # Earlier versions take longer, so only ordering keeps them first
+                delay = 0.01 * (6 - version)
+                pipeline.submit("doc-1", [("diff", step(f"diff-{version}", delay)), ("notify", step(f"notify-{version}", 0))])
+            await pipeline.drain()
+            return log
+
+        log = asyncio.run(main())
+        assert log == [f"{name}-{version}" for version in range(1, 6) for name in ("diff", "notify")]
+
+    def test_keys_run_concurrently(self):
+        """Test that documents do not wait on each other"""
+        async def main():
+            pipeline = PostCommitPipeline(max_concurrency=10)
+            running = []
+            peak = 0
+
+            async def step():
+                nonlocal peak
+                running.append(1)
+                peak = max(peak, len(running))
+                await asyncio.sleep(0.05)
+                running.pop()
+
+            for document in range(10):
+                pipeline.submit(f"doc-{document}", [("diff", step)])
+            await pipeline.drain()
+            return peak, pipeline.get_stats()
+
+        peak, stats = asyncio.run(main())
+        assert peak == 10
+        assert stats["completed"] == 10 and stats["pending"] == 0
+
+    def test_failed_steps_are_retried_then_dead_lettered(self):
+        """Test retries with backoff, and that a dead step does not block the rest"""
+        async def main():
+            pipeline = PostCommitPipeline(max_attempts=3, base_backoff_seconds=0.001)
+            attempts = {"flaky": 0, "broken": 0}
+            done = []
+
+            async def flaky():
+                attempts["flaky"] += 1
+                if attempts["flaky"] < 3:
+                    raise ConnectionError("temporarily unavailable")
+                done.append("flaky")
+
+            async def broken():
+                attempts["broken"] += 1
+                raise ValueError("bad diff")
+
+            async def reindex():
+                done.append("reindex")
+
+            pipeline.submit("doc-1", [("notify", flaky), ("diff", broken), ("reindex", reindex)])
+            await pipeline.drain()
+            return attempts, done, pipeline.get_stats()
+
+        attempts, done, stats = asyncio.run(main())
+        assert attempts == {"flaky": 3, "broken": 3}
+        assert done == ["flaky", "reindex"]
+        assert stats["retries"] == 4 and stats["dead"] == 1
+        assert stats["dead_letters"] == [{"key": "doc-1", "step": "diff", "error": "bad diff"}]
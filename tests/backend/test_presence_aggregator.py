@@ -0,0 +1,97 @@
+"""
+Tests for coalesced cursor and selection broadcasts
+"""
+
+import asyncio
+
+from app.services.presence_aggregator import PresenceAggregator
+
+
+class TestPresenceAggregator:
+    """Test coalescing, tick-rate flushing and idle shutdown"""
+
+    def test_bursts_are_coalesced_to_latest_state(self):
+        """Test that a burst of updates becomes one frame with each user's latest state"""
+        async def main():
+            frames = []
+
+            async def send(room, frame):
+                frames.append((room, frame))
+
+            aggregator = PresenceAggregator(send, tick_hz=50)
+            for event in range(100):
+                for user in range(10):
+                    aggregator.update("document_1", f"user-{user}", "cursor", {"offset": event})
+                aggregator.update("document_1", "user-0", "selection", {"start": 0, "end": event})
+            await asyncio.sleep(0.05)
+            return frames, aggregator.get_stats()
+
+        frames, stats = asyncio.run(main())
+        assert len(frames) == 1
+        room, frame = frames[0]
+        assert room == "document_1" and frame["type"] == "presence_batch"
+        users = {user["user_id"]: user for user in frame["users"]}
+        assert len(users) == 10
+        assert users["user-3"]["cursor"] == {"offset": 99}
+        assert users["user-0"]["selection"] == {"start": 0, "end": 99}
+        assert stats["updates"] == 1100 and stats["superseded"] == 1100 - 11
+
+    def test_frames_follow_tick_rate_and_stop_when_idle(self):
+        """Test that steady input is flushed at the tick rate and tickers exit when quiet"""
+        async def main():
+            frames = []
+
+            async def send(room, frame):
+                frames.append(frame)
+
+            aggregator = PresenceAggregator(send, tick_hz=20)
+            loop = asyncio.get_running_loop()
+            end = loop.time() + 0.5
+            while loop.time() < end:
+                aggregator.update("document_1", "user-1", "cursor", {"offset": 1})
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0.15)
+            return frames, aggregator.get_stats()
+
+        frames, stats = asyncio.run(main())
+        # About 0.5s * 20 Hz frames for hundreds of updates
+        assert 5 <= len(frames) <= 12
+        assert stats["updates"] > 100
+        assert stats["active_rooms"] == 0
+
+    def test_removed_user_is_not_flushed(self):
+        """Test that a user who leaves before the tick is dropped from the batch"""
+        async def main():
+            frames = []
+
+            async def send(room, frame):
+                frames.append(frame)
+
+            aggregator = PresenceAggregator(send, tick_hz=50)
+            aggregator.update("document_1", "user-1", "cursor", {"offset": 1})
+            aggregator.update("document_1", "user-2", "cursor", {"offset": 2})
+            aggregator.remove_user("document_1", "user-1")
+            await asyncio.sleep(0.05)
+            return frames
+
+        frames = asyncio.run(main())
+        assert [user["user_id"] for user in frames[0]["users"]] == ["user-2"]
+
+    def test_last_user_leaving_stops_the_room(self):
+        """Test that a room whose only user left sends nothing and its ticker exits"""
+        async def main():
+            frames = []
+
+            async def send(room, frame):
+                frames.append(frame)
+
+            aggregator = PresenceAggregator(send, tick_hz=50)
+            aggregator.update("document_1", "user-1", "selection", {"start": 0, "end": 4})
+            aggregator.remove_user("document_1", "user-1")
+            aggregator.remove_user("document_2", "user-1")
+            await asyncio.sleep(0.05)
+            return frames, aggregator.get_stats()
+
+        frames, stats = asyncio.run(main())
+        assert frames == []
+        assert stats["active_rooms"] == 0
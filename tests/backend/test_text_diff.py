@@ -0,0 +1,79 @@
+"""
+Tests for the bounded Myers diff engine
+"""
+
+import difflib
+import random
+import time
+
+from app.services.text_diff import compute_diff, diff_opcodes, line_similarity, unified_diff
+
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[-1]))
+        previous = current
+    return previous[-1]
+
+
+class TestTextDiff:
+    """Test minimality, output format, word changes and the time budget"""
+
+    def test_opcodes_are_a_minimal_edit_script(self):
+        """Test opcodes rebuild the target and keep a longest common subsequence"""
+        rng = random.Random(3)
+        for _ in range(500):
+            a = [rng.choice("abcd") for _ in range(rng.randint(0, 14))]
+            b = [rng.choice("abcd") for _ in range(rng.randint(0, 14))]
+            opcodes = diff_opcodes(a, b)
+
+            rebuilt = []
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == "equal":
+                    assert a[i1:i2] == b[j1:j2]
+                    rebuilt.extend(a[i1:i2])
+                else:
+                    rebuilt.extend(b[j1:j2])
+            assert rebuilt == b
+            assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == lcs_length(a, b)
+
+    def test_unified_diff_matches_difflib_format(self):
+        """Test hunk headers and context lines against difflib for an unambiguous edit"""
+        a = [f"Clause {i}" for i in range(30)]
+        b = a[:5] + ["Clause 5 (amended)"] + a[6:20] + a[21:] + ["Clause 30"]
+        expected = list(difflib.unified_diff(a, b, "Version 1", "Version 2", lineterm=""))
+        assert unified_diff(a, b, diff_opcodes(a, b), "Version 1", "Version 2") == expected
+        assert unified_diff(a, a, diff_opcodes(a, a)) == []
+
+    def test_compute_diff_reports_word_changes(self):
+        """Test statistics and word-level changes inside modified lines"""
+        result = compute_diff(
+            "The Seller shall deliver the goods.\nPayment is due in 30 days.\n",
+            "The Seller shall promptly deliver the goods.\nPayment is due in 30 days.\n"
+        )
+        assert result["complete"]
+        assert result["statistics"]["lines_added"] == 1
+        assert result["statistics"]["lines_removed"] == 1
+        assert result["word_changes"] == [{"line": 1, "removed": "", "added": "promptly"}]
+        assert result["similarity_score"] == 50
+
+    def test_time_budget_bounds_worst_case(self):
+        """Test that a total rewrite of a long document returns within its budget"""
+        rng = random.Random(5)
+        before = "\n".join(f"Clause {i}: {rng.random()}" for i in range(20000))
+        after = "\n".join(f"Clause {i}: {rng.random()}" for i in range(20000))
+
+        started = time.monotonic()
+        result = compute_diff(before, after, time_budget_seconds=0.2)
+        assert time.monotonic() - started < 2.0
+        assert not result["complete"]
+        assert result["statistics"]["lines_removed"] == 20000
+
+    def test_line_similarity(self):
+        """Test the line-hash similarity estimate"""
+        assert line_similarity([], []) == 1.0
+        assert line_similarity(["a", "b"], ["a", "b"]) == 1.0
+        assert line_similarity(["a", "b", "c", "d"], ["a", "b", "x", "y"]) == 0.5
@@ -0,0 +1,98 @@
+"""
+Tests for delta-compressed document version storage
+"""
+
+import random
+import time
+
+from app.services.version_storage import (
+    MaterializedVersionCache, apply_delta, compress_text, decompress_text, is_keyframe, make_delta
+)
+
+
+def negotiated_revisions(count=80, clauses=2000, seed=7):
+    """A long contract with a few clauses edited, inserted or removed per revision"""
+    rng = random.Random(seed)
+    lines = [f"{i}. The Parties agree to clause {i} with obligation {rng.randint(0, 10 ** 6)}.\n" for i in range(clauses)]
+    revisions = ["".join(lines)]
+    for _ in range(count - 1):
+        for _ in range(3):
+            index = rng.randrange(len(lines))
+            action = rng.choice(("edit", "insert", "delete"))
+            if action == "edit":
+                lines[index] = lines[index].replace("agree", "covenant")
+            elif action == "insert":
+                lines.insert(index, f"New rider {rng.randint(0, 10 ** 6)} negotiated by counsel.\n")
+            elif len(lines) > 1:
+                del lines[index]
+        revisions.append("".join(lines))
+    return revisions
+
+
+class TestVersionStorage:
+    """Test deltas, keyframes and the materialized version cache"""
+
+    def test_delta_round_trip_is_exact(self):
+        """Test that a delta rebuilds the target byte for byte"""
+        base = "Clause 1\r\nClause 2\nClause 3"
+        for target in ("Clause 1\r\nClause 2a\nClause 3\n", "", "Clause 0\n" + base, "a\nb\n"):
+            assert apply_delta(base, make_delta(base, target)) == target
+        assert decompress_text(compress_text(base)) == base
+
+    def test_reverse_delta_chain_reconstructs_every_version(self):
+        """Test rebuilding each version from the nearest newer keyframe"""
+        revisions = negotiated_revisions(count=30, clauses=300)
+        interval = 10
+        stored = {}
+        for number, text in enumerate(revisions, start=1):
+            if number == len(revisions) or is_keyframe(number, interval):
+                stored[number] = ("full", compress_text(text))
+            else:
+                stored[number] = ("delta", make_delta(revisions[number], text))
+
+        for number in range(1, len(revisions) + 1):
+            chain = []
+            cursor = number
+            while stored[cursor][0] == "delta":
+                chain.append(stored[cursor][1])
+                cursor += 1
+            assert len(chain) < interval
+            text = decompress_text(stored[cursor][1])
+            for delta in reversed(chain):
+                text = apply_delta(text, delta)
+            assert text == revisions[number - 1]
+
+    def test_storage_drops_by_an_order_of_magnitude(self):
+        """Test stored size against one full copy per version"""
+        revisions = negotiated_revisions()
+        full_size = sum(len(text.encode()) for text in revisions)
+        stored_size = sum(
+            len(compress_text(text)) if is_keyframe(number, 20) or number == len(revisions)
+            else len(make_delta(revisions[number], text))
+            for number, text in enumerate(revisions, start=1)
+        )
+        assert stored_size * 10 < full_size
+
+    def test_delta_of_a_long_document_is_quick(self):
+        """Test that a delta between two 12,000-line revisions takes well under a second"""
+        revisions = negotiated_revisions(count=2, clauses=12000)
+        started = time.monotonic()
+        delta = make_delta(revisions[1], revisions[0])
+        elapsed = time.monotonic() - started
+        assert apply_delta(revisions[1], delta) == revisions[0]
+        assert elapsed < 1.0
+
+    def test_cache_is_bounded_by_entries_and_chars(self):
+        """Test LRU eviction by count and by total size"""
+        cache = MaterializedVersionCache(max_entries=2, max_chars=10)
+        cache.put("a", "1234")
+        cache.put("b", "1234")
+        assert cache.get("a") == "1234"
+        cache.put("c", "1234")
+        assert cache.get("b") is None
+        cache.put("d", "123456789")
+        assert cache.get("a") is None and cache.get("c") is None
+        assert cache.get("d") == "123456789"
+        cache.put("huge", "x" * 11)
+        assert cache.get("huge") is None
+        assert cache.get_metrics()["chars"] == 9
@@ -0,0 +1,109 @@
+"""
+Tests for cross-worker WebSocket routing and presence
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.core.websocket_backplane import (
+    TARGET_ROOM,
+    TARGET_USER,
+    Backplane,
+    InMemoryBackplane,
+    InMemoryHub,
+    create_backplane
+)
+
+
+class TestWebSocketBackplane:
+    """Test message routing between workers and cluster-wide presence"""
+
+    def test_messages_reach_other_workers_once(self):
+        """Test that a publication is delivered by every other worker and not echoed to its sender"""
+        async def main():
+            hub = InMemoryHub()
+            workers = [InMemoryBackplane(hub) for _ in range(3)]
+            received = {worker.node_id: [] for worker in workers}
+            for worker in workers:
+                await worker.start(
+                    lambda target, key, text, kind, node=worker.node_id: received[node].append((target, key, text, kind))
+                )
+
+            await workers[0].publish(TARGET_USER, "user-1", '{"type":"notification"}', "notification")
+            await workers[2].publish(TARGET_ROOM, "document_1", '{"type":"presence_batch"}', "presence_batch")
+            return workers, received
+
+        workers, received = asyncio.run(main())
+        first, second, third = (received[worker.node_id] for worker in workers)
+        assert first == [(TARGET_ROOM, "document_1", '{"type":"presence_batch"}', "presence_batch")]
+        assert second == [
+            (TARGET_USER, "user-1", '{"type":"notification"}', "notification"),
+            (TARGET_ROOM, "document_1", '{"type":"presence_batch"}', "presence_batch")
+        ]
+        assert third == [(TARGET_USER, "user-1", '{"type":"notification"}', "notification")]
+        assert workers[0].get_stats()["published"] == 1 and workers[0].get_stats()["received"] == 1
+
+    def test_active_users_cover_every_worker(self):
+        """Test that presence is the union over workers and follows disconnects and shutdowns"""
+        async def main():
+            hub = InMemoryHub()
+            first, second = InMemoryBackplane(hub), InMemoryBackplane(hub)
+            first.track("alice")
+            second.track("bob")
+            second.track("alice")
+            both = sorted(await first.active_users())
+
+            first.untrack("alice")
+            still_on_second = sorted(await first.active_users())
+
+            await second.close()
+            after_close = await first.active_users()
+            return both, still_on_second, after_close
+
+        both, still_on_second, after_close = asyncio.run(main())
+        assert both == ["alice", "bob"]
+        assert still_on_second == ["alice", "bob"]
+        assert after_close == []
+
+    def test_without_redis_url_falls_back_to_single_worker(self):
+        """Test that the default backplane keeps messages on this worker"""
+        backplane = create_backplane(None)
+        assert isinstance(backplane, InMemoryBackplane)
+        assert list(backplane.hub.nodes) == [backplane.node_id]
+
+    def test_uuid_keys_are_routed_as_strings(self):
+        """Test that a UUID user id is published and tracked as its string form"""
+        async def main():
+            hub = InMemoryHub()
+            sender, receiver = InMemoryBackplane(hub), InMemoryBackplane(hub)
+            received = []
+            await receiver.start(lambda target, key, text, kind: received.append(key))
+            user_id = uuid.uuid4()
+
+            await sender.publish(TARGET_USER, user_id, '{"type":"ai_progress"}', "ai_progress")
+            sender.track(user_id)
+            return user_id, received, await receiver.active_users()
+
+        user_id, received, active = asyncio.run(main())
+        assert received == [str(user_id)]
+        assert active == [str(user_id)]
+
+    def test_unencodable_message_is_counted_not_raised(self):
+        """Test that a message the bus cannot encode is dropped with an error count"""
+        async def main():
+            backplane = InMemoryBackplane()
+            await backplane.publish(TARGET_USER, "user-1", object(), "notification")
+            return backplane.get_stats()
+
+        stats = asyncio.run(main())
+        assert stats["errors"] == 1 and stats["published"] == 0
+
+    def test_backplane_requires_publish_and_presence(self):
+        """Test that a backend missing the bus operations cannot be created"""
+        class Incomplete(Backplane):
+            pass
+
+        with pytest.raises(TypeError):
+            Incomplete()
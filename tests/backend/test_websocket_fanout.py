@@ -0,0 +1,85 @@
+"""
+Tests for encode-once WebSocket fan-out and per-connection send queues
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from app.core.websocket_fanout import ConnectionSender, encode_message
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        self.sent.append(text)
+
+
+class TestWebSocketFanout:
+    """Test encoding and per-connection bounded send queues"""
+
+    def test_encode_message(self):
+        """Test that messages round-trip and non-JSON values are stringified"""
+        message = {"type": "notification", "data": {"count": 3, "at": datetime(2025, 1, 2)}}
+        decoded = json.loads(encode_message(message))
+        assert decoded["type"] == "notification" and decoded["data"]["count"] == 3
+        assert decoded["data"]["at"].startswith("2025-01-02")
+
+    def test_slow_consumer_does_not_block_producer_or_others(self):
+        """Test that enqueueing never waits and a stalled client is evicted without delaying the rest"""
+        async def main():
+            evicted = []
+            fast, slow, broken = FakeWebSocket(), FakeWebSocket(delay=10), FakeWebSocket(fail=True)
+            senders = [
+                ConnectionSender(socket, evicted.append, send_timeout_seconds=0.1)
+                for socket in (fast, slow, broken)
+            ]
+            started = time.monotonic()
+            for sender in senders:
+                sender.enqueue("payload", "document_update")
+            enqueue_elapsed = time.monotonic() - started
+            await asyncio.sleep(0.01)
+            fast_sent = list(fast.sent)
+            await asyncio.sleep(0.2)
+            for sender in senders:
+                sender.close()
+            return fast_sent, evicted, enqueue_elapsed
+
+        fast_sent, evicted, enqueue_elapsed = asyncio.run(main())
+        assert enqueue_elapsed < 0.01
+        assert fast_sent == ["payload"]
+        assert len(evicted) == 2 and all(socket.sent == [] for socket in evicted)
+
+    def test_overflow_policy_by_message_type(self):
+        """Test that a full queue drops the oldest presence frame but disconnects on critical messages"""
+        async def main():
+            evicted = []
+            socket = FakeWebSocket(delay=10)
+            sender = ConnectionSender(
+                socket, evicted.append, max_queue=3, send_timeout_seconds=30, droppable_types={"presence_batch"}
+            )
+            await asyncio.sleep(0)  # The writer takes the first message and stalls on it
+            sender.enqueue("in-flight", "document_update")
+            await asyncio.sleep(0)
+            sender.enqueue("presence-1", "presence_batch")
+            sender.enqueue("edit-1", "document_edit")
+            sender.enqueue("presence-2", "presence_batch")
+            assert sender.enqueue("presence-3", "presence_batch")
+            queued = [text for _, text in sender._queue]
+            dropped = sender.metrics["dropped"]
+            overflowed = sender.enqueue("edit-2", "document_edit")
+            return queued, dropped, overflowed, evicted, socket
+
+        queued, dropped, overflowed, evicted, socket = asyncio.run(main())
+        assert queued == ["edit-1", "presence-2", "presence-3"]
+        assert dropped == 1
+        assert overflowed is False
+        assert evicted == [socket]